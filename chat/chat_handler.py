@@ -1,18 +1,29 @@
 # chat/chat_handler.py
 
+import asyncio
 import base64
 import os
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Callable, Dict, Any
+from chat.history import ChatEvent, ChatHistory
+from chat.outbox import ChatOutbox
+from chat.sticker_store import StickerStore, file_digest, is_valid_hash
+from chat.sticker_stream import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_WINDOW, IncomingSticker, IncomingStreams, iter_file_chunks,
+)
+from chat.sticker_worker import StickerWorker
 from chat.verbose_mode import VerboseManager
 
 
 class ChatHandler:
     """
     Handles sending and receiving chat messages (plain text or stickers)
-    over a ReliableUDP wrapper.
+    over an AsyncReliableUDP wrapper. The send_* methods are coroutines,
+    but they only queue the message on the outbox (chat.outbox) and
+    return its delivery future; a failed delivery is reported when it
+    happens.
 
-    Message format (all go through ReliableUDP.send_reliable):
+    Message format (all go through AsyncReliableUDP.send_reliable):
 
     TEXT:
         {
@@ -38,6 +49,29 @@ class ChatHandler:
             "sticker_name": "heart",
             "sticker_data_b64": "<base64 bytes>"
         }
+
+    STICKER_FILE is what older versions send; /stickerfile now offers the
+    file by content hash and streams it only if the peer wants it:
+        {
+            "message_type": "CHAT_MESSAGE",
+            "sender_name": "...",
+            "content_type": "STICKER_OFFER",
+            "stream_id": 1,
+            "sticker_name": "heart",
+            "sticker_hash": "<sha256 hex>",
+            "total_size": 123456
+        }
+        answered by STICKER_HAVE / STICKER_WANT / STICKER_REFUSE with the
+        same stream_id, then on STICKER_WANT:
+        {
+            "message_type": "CHAT_MESSAGE",
+            "sender_name": "...",
+            "content_type": "STICKER_STREAM_CHUNK",
+            "stream_id": 1,
+            "offset": 0,
+            "sticker_data_b64": "<base64 of one chunk>"
+        }
+        (see chat.sticker_stream)
     """
 
     def __init__(
@@ -47,15 +81,34 @@ class ChatHandler:
         peer_addr,
         reliable,
         verbose: bool = True,
+        sticker_store: Optional[StickerStore] = None,
+        sticker_worker: Optional[StickerWorker] = None,
+        outbox: Optional[ChatOutbox] = None,
     ):
         self.sock = socket_obj
         self.my_name = my_name
         self.peer_addr = peer_addr  # (ip, port)
-        self.reliable = reliable    # networking.udp.ReliableUDP
-
-        # where to save received sticker files
-        self.sticker_dir = "stickers_received"
-        os.makedirs(self.sticker_dir, exist_ok=True)
+        self.reliable = reliable    # networking.async_udp.AsyncReliableUDP
+        self.outbox = outbox or ChatOutbox(reliable)
+        # recent chat (both directions) for /history, /search and spectator replay
+        self.history = ChatHistory()
+        # called with every ChatEvent recorded (the host forwards them to spectators)
+        self.on_chat: Optional[Callable[[ChatEvent], None]] = None
+
+        # where to save received sticker files (one file per distinct sticker,
+        # least recently used ones deleted beyond the store's quotas)
+        self.stickers = sticker_store or StickerStore("stickers_received")
+        self.sticker_dir = self.stickers.directory
+        # decoding and disk writes of received stickers run off the event loop
+        self.worker = sticker_worker or StickerWorker()
+
+        # chunked sticker streams
+        self.stream_chunk_size = DEFAULT_CHUNK_SIZE
+        self.stream_window = DEFAULT_WINDOW
+        self.offer_timeout = 10.0   # seconds to wait for STICKER_HAVE / WANT
+        self._next_stream_id = 0
+        self._offers: Dict[int, "asyncio.Future[str]"] = {}   # stream_id -> peer's answer
+        self._incoming = IncomingStreams(self.sticker_dir, max_size=self.stickers.max_bytes)
 
     # ---------- logging helper ----------
 
@@ -63,22 +116,38 @@ class ChatHandler:
         if VerboseManager.is_verbose():
             print("[CHAT]", *args)
 
-    # ---------- low-level send via ReliableUDP ----------
+    def _record(self, sender: str, kind: str, text: str) -> ChatEvent:
+        event = self.history.add(sender, kind, text)
+        if self.on_chat is not None:
+            self.on_chat(event)
+        return event
 
-    def _send_raw(self, msg_dict: Dict[str, Any]) -> bool:
+    # ---------- low-level send via AsyncReliableUDP ----------
+
+    async def _send_raw(self, msg_dict: Dict[str, Any]) -> bool:
         """
-        Sends a dict via ReliableUDP. Returns True if ACKed, False otherwise.
-        ReliableUDP will add sequence_number automatically.
+        Sends a dict via AsyncReliableUDP. Returns True if ACKed, False otherwise.
+        AsyncReliableUDP will add sequence_number automatically.
         """
         self.log("Outgoing chat:", msg_dict)
-        ok = self.reliable.send_reliable(msg_dict, self.peer_addr)
+        ok = await self.reliable.send_reliable(msg_dict, self.peer_addr)
         if not ok:
             self.log("reliable send failed (no ACK).")
         return ok
 
+    def _track(self, future: "asyncio.Future[bool]", what: str) -> "asyncio.Future[bool]":
+        """Report the delivery status of an outbox post once it is known."""
+        def done(f):
+            if f.result():
+                self.log("Delivered", what)
+            else:
+                print(f"[CHAT] Could not deliver {what}.")
+        future.add_done_callback(done)
+        return future
+
     # ---------- public send helpers ----------
 
-    def send_text(self, text: str) -> None:
+    async def send_text(self, text: str) -> "asyncio.Future[bool]":
         """
         Send a plain text chat message.
         """
@@ -88,10 +157,11 @@ class ChatHandler:
             "content_type": "TEXT",
             "message_text": text,
         }
-        self._send_raw(msg)
-        self.log("Sent text:", text)
+        self.log("Queued text:", text)
+        self._record(self.my_name, "TEXT", text)
+        return self._track(self.outbox.post(msg, self.peer_addr), f"message '{text}'")
 
-    def send_sticker(self, sticker_name: str) -> None:
+    async def send_sticker(self, sticker_name: str) -> "asyncio.Future[bool]":
         """
         Send a simple named sticker (no file, just the name).
         E.g. /sticker heart
@@ -102,77 +172,251 @@ class ChatHandler:
             "content_type": "STICKER",
             "sticker_name": sticker_name,
         }
-        self._send_raw(msg)
-        self.log("Sent sticker:", sticker_name)
+        self.log("Queued sticker:", sticker_name)
+        self._record(self.my_name, "STICKER", sticker_name)
+        return self._track(self.outbox.post(msg, self.peer_addr), f"sticker [{sticker_name}]")
 
-    def send_sticker_from_file(self, filepath: str, sticker_name: Optional[str] = None) -> None:
+    async def send_sticker_from_file(self, filepath: str, sticker_name: Optional[str] = None) -> Optional["asyncio.Future[bool]"]:
         """
-        Load a file (e.g. PNG / JPG), base64-encode it, and send as STICKER_FILE.
+        Send a file (e.g. PNG / JPG) as a sticker: offered by content hash,
+        and streamed only if the peer does not have it yet (send_sticker_stream).
+        The transfer runs in the background, in order with other chat.
 
         Usage from the game:
             /stickerfile path/to/image.png
             /stickerfile path/to/image.png custom_name
         """
         if not os.path.isfile(filepath):
-            self.log("Sticker file does not exist:", filepath)
-            return
-
-        try:
-            with open(filepath, "rb") as f:
-                data = f.read()
-        except Exception as e:
-            self.log("Failed to read sticker file:", e)
-            return
+            print(f"[CHAT] Sticker file does not exist: {filepath}")
+            return None
+        job = self.outbox.post_call(lambda: self.send_sticker_stream(filepath, sticker_name), self.peer_addr)
+        name = sticker_name or os.path.basename(filepath)
+        self._record(self.my_name, "STICKER_FILE", name)
+        return self._track(job, f"sticker file '{name}'")
 
-        b64 = base64.b64encode(data).decode("ascii")
+    async def send_sticker_stream(self, filepath: str, sticker_name: Optional[str] = None) -> bool:
+        """
+        Offer a file as STICKER_OFFER and, if the peer answers STICKER_WANT,
+        send it as one STICKER_STREAM_CHUNK per stream_chunk_size bytes. The
+        file is read a chunk at a time and at most stream_window chunks are
+        unACKed, so memory use does not depend on the file size. Returns
+        True once the peer has the sticker.
+        """
         if sticker_name is None:
             sticker_name = os.path.basename(filepath)
+        try:
+            total_size = os.path.getsize(filepath)
+            sticker_hash = file_digest(filepath)
+        except OSError as e:
+            self.log("Failed to read sticker file:", e)
+            return False
 
-        msg = {
+        self._next_stream_id += 1
+        stream_id = self._next_stream_id
+        offer = {
             "message_type": "CHAT_MESSAGE",
             "sender_name": self.my_name,
-            "content_type": "STICKER_FILE",
+            "content_type": "STICKER_OFFER",
+            "stream_id": stream_id,
             "sticker_name": sticker_name,
-            "sticker_data_b64": b64,
+            "sticker_hash": sticker_hash,
+            "total_size": total_size,
         }
-        self._send_raw(msg)
-        self.log("Sent sticker file:", sticker_name, f"({len(b64)} base64 chars)")
+        answer = asyncio.get_running_loop().create_future()
+        self._offers[stream_id] = answer
+        try:
+            if not await self._send_raw(offer):
+                return False
+            reply = await asyncio.wait_for(answer, self.offer_timeout)
+        except asyncio.TimeoutError:
+            self.log("No answer to sticker offer:", sticker_name)
+            return False
+        finally:
+            self._offers.pop(stream_id, None)
+
+        if reply == "STICKER_HAVE":
+            self.log("Peer already has sticker:", sticker_name)
+            return True
+        if reply != "STICKER_WANT":
+            self.log("Peer refused sticker:", sticker_name)
+            return False
+        return await self._send_chunks(filepath, stream_id, sticker_name, total_size)
+
+    async def _send_chunks(self, filepath: str, stream_id: int, sticker_name: str, total_size: int) -> bool:
+        pending = set()
+        ok = True
+        try:
+            for offset, chunk in iter_file_chunks(filepath, self.stream_chunk_size):
+                msg = {
+                    "message_type": "CHAT_MESSAGE",
+                    "sender_name": self.my_name,
+                    "content_type": "STICKER_STREAM_CHUNK",
+                    "stream_id": stream_id,
+                    "offset": offset,
+                    "sticker_data_b64": base64.b64encode(chunk).decode("ascii"),
+                }
+                pending.add(self.reliable.send(msg, self.peer_addr))
+                if len(pending) >= self.stream_window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    if not all(f.result() for f in done):
+                        ok = False
+                        break
+            if ok and pending:
+                done, pending = await asyncio.wait(pending)
+                ok = all(f.result() for f in done)
+        except OSError as e:
+            self.log("Failed to read sticker file:", e)
+            ok = False
+
+        if ok:
+            self.log("Sent sticker stream:", sticker_name, f"({total_size} bytes)")
+        else:
+            self.log("Sticker stream failed:", sticker_name)
+        return ok
 
     # ---------- incoming messages ----------
 
+    def can_accept(self, msg: Dict[str, Any]) -> bool:
+        """
+        False if msg needs the sticker worker and its queue is full. The
+        caller should then leave msg unACKed so the peer sends it again later.
+        """
+        return msg.get("content_type") not in ("STICKER_FILE", "STICKER_STREAM_CHUNK") or not self.worker.full
+
     def handle_incoming(self, msg: Dict[str, Any]) -> None:
         """
         Handle an incoming CHAT_MESSAGE dict.
-        This is called by Protocols.recv_non_chat(), host, joiner, spectator, etc.
+        This is called by the Protocols dispatcher task (see Protocols.handle_chat).
         """
         sender = msg.get("sender_name", "Unknown")
         content_type = msg.get("content_type", "TEXT")
 
         if content_type == "TEXT":
-            text = msg.get("message_text", "")
-            print(f"[CHAT] {sender}: {text}")
+            # one line per message the sender's outbox coalesced
+            for text in msg.get("message_text", "").split("\n"):
+                print(f"[CHAT] {sender}: {text}")
+                self._record(sender, "TEXT", text)
 
         elif content_type == "STICKER":
             name = msg.get("sticker_name", "sticker")
             print(f"[CHAT] {sender} sent sticker: [{name}]")
+            self._record(sender, "STICKER", name)
 
         elif content_type == "STICKER_FILE":
-            b64_data = msg.get("sticker_data_b64", "")
             name = msg.get("sticker_name", "sticker")
-            filename = self._save_sticker_file(b64_data, sender, name)
-            if filename:
-                print(f"[CHAT] {sender} sent sticker file '{name}' → saved as {filename}")
-            else:
-                print(f"[CHAT] {sender} sent sticker file '{name}' (failed to save).")
+
+            def saved(filename, error):
+                if filename:
+                    print(f"[CHAT] {sender} sent sticker file '{name}' → saved as {filename}")
+                    self._record(sender, "STICKER_FILE", name)
+                else:
+                    print(f"[CHAT] {sender} sent sticker file '{name}' (failed to save).")
+
+            if not self.worker.submit(self._save_sticker_file, msg.get("sticker_data_b64", ""), on_done=saved):
+                print(f"[CHAT] {sender} sent sticker file '{name}' (dropped: sticker queue full).")
+
+        elif content_type == "STICKER_OFFER":
+            self._answer_sticker_offer(msg, sender)
+
+        elif content_type in ("STICKER_HAVE", "STICKER_WANT", "STICKER_REFUSE"):
+            answer = self._offers.get(msg.get("stream_id"))
+            if answer is not None and not answer.done():
+                answer.set_result(content_type)
+
+        elif content_type == "STICKER_STREAM_CHUNK":
+            self._write_sticker_chunk(msg, sender)
 
         else:
             print(f"[CHAT] {sender} sent unknown content_type={content_type}: {msg}")
 
+    # ---------- helper: sticker streams ----------
+
+    def _answer_sticker_offer(self, msg: Dict[str, Any], sender: str) -> None:
+        """Reply STICKER_HAVE if the offered hash is in the store, else open a stream and reply STICKER_WANT."""
+        stream_id = msg.get("stream_id")
+        name = msg.get("sticker_name", "sticker")
+        sticker_hash = msg.get("sticker_hash")
+        stale = self._incoming.expire()
+        old = self._incoming.pop(sender, stream_id)
+        for incoming in stale + ([old] if old is not None else []):
+            self._abort_stream(incoming)
+        path = self.stickers.path(sticker_hash) if is_valid_hash(sticker_hash) else None
+        if path is not None:
+            print(f"[CHAT] {sender} sent sticker file '{name}' → already saved as {path}")
+            self._record(sender, "STICKER_FILE", name)
+            reply = "STICKER_HAVE"
+        else:
+            try:
+                if not is_valid_hash(sticker_hash):
+                    raise ValueError("missing or malformed sticker_hash")
+                self._incoming.start(sender, stream_id, name, sticker_hash, msg.get("total_size") or 0)
+                self.log(f"Receiving sticker '{name}' ({msg.get('total_size')} bytes) from {sender}")
+                reply = "STICKER_WANT"
+            except (ValueError, OSError) as e:
+                print(f"[CHAT] {sender} sent sticker file '{name}' (refused: {e}).")
+                reply = "STICKER_REFUSE"
+        # answered without waiting: this runs in the receive path
+        self.reliable.send({
+            "message_type": "CHAT_MESSAGE",
+            "sender_name": self.my_name,
+            "content_type": reply,
+            "stream_id": stream_id,
+        }, self.peer_addr)
+
+    def _write_sticker_chunk(self, msg: Dict[str, Any], sender: str) -> None:
+        stream_id = msg.get("stream_id")
+        incoming = self._incoming.get(sender, stream_id)
+        if incoming is None:
+            self.log("Chunk for unknown sticker stream", stream_id, "from", sender)
+            return
+        incoming.last_activity = time.monotonic()
+
+        def written(path, error):
+            if error is None and path is None:
+                return  # more chunks to come
+            if self._incoming.get(sender, stream_id) is not incoming:
+                return  # already failed (or replaced by a newer offer)
+            self._incoming.pop(sender, stream_id)
+            if error is not None:
+                self._abort_stream(incoming)
+                print(f"[CHAT] {sender} sent sticker file '{incoming.sticker_name}' (failed to save: {error}).")
+            else:
+                print(f"[CHAT] {sender} sent sticker file '{incoming.sticker_name}' → saved as {path}")
+                self._record(sender, "STICKER_FILE", incoming.sticker_name)
+
+        if not self.worker.submit(self._store_chunk, incoming, msg.get("offset", -1),
+                                  msg.get("sticker_data_b64", ""), on_done=written):
+            # already ACKed, so this chunk is gone: the stream cannot complete
+            written(None, RuntimeError("sticker queue full"))
+
+    def _store_chunk(self, incoming: IncomingSticker, offset: int, b64_data: str) -> Optional[str]:
+        """Worker thread: write one chunk; for the last one, move the sticker into the store."""
+        if not incoming.write(offset, base64.b64decode(b64_data)):
+            return None
+        _, path = self.stickers.add_file(incoming.tmp_path, incoming.sticker_hash)
+        return path
+
+    def _abort_stream(self, incoming: IncomingSticker) -> None:
+        if not self.worker.submit(incoming.abort):
+            incoming.abort()
+
+    def close(self) -> None:
+        """
+        Stop the outbox, finish queued sticker writes, throw away sticker
+        streams that are still incomplete and save the store's LRU order.
+        """
+        self.outbox.close()
+        self.worker.shutdown(wait=True)
+        for incoming in self._incoming.clear():
+            incoming.abort()
+        self.stickers.flush()
+
     # ---------- helper: save sticker files ----------
 
-    def _save_sticker_file(self, b64_data: str, sender: str, sticker_name: str) -> Optional[str]:
+    def _save_sticker_file(self, b64_data: str) -> Optional[str]:
         """
-        Decode base64 and save to a file in stickers_received/.
+        Decode base64 and save it to the sticker store (stickers_received/).
+        Runs on the sticker worker.
         """
         if not b64_data:
             return None
@@ -183,14 +427,8 @@ class ChatHandler:
             self.log("Failed to base64-decode sticker:", e)
             return None
 
-        ts = int(time.time())
-        safe_name = sticker_name.replace("/", "_").replace("\\", "_")
-        filename = f"{sender}_{safe_name}_{ts}.bin"
-        path = os.path.join(self.sticker_dir, filename)
-
         try:
-            with open(path, "wb") as f:
-                f.write(binary)
+            _, path = self.stickers.add_bytes(binary)
             self.log("Saved sticker to", path)
             return path
         except Exception as e:
@@ -0,0 +1,124 @@
+# chat/history.py
+
+"""
+Recent chat, in fixed memory.
+
+ChatHistory keeps the last `capacity` chat events in a ring buffer (a
+preallocated list indexed by event id % capacity) plus an inverted
+index: lowercase word -> ids of the events containing it, oldest first.
+When the ring overwrites an event, its ids are at the front of their
+posting lists, so un-indexing it is a popleft per word. Texts are cut
+to max_text characters and at most max_terms words are indexed per
+event, so memory stays bounded however long the session runs.
+
+Used for /history N, /search <words> (events containing all the words,
+or sent by someone of that name) and for replaying the last messages to
+a spectator who joins late.
+"""
+
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+_WORD = re.compile(r"\w+")
+
+
+def _terms(text: str, limit: int) -> List[str]:
+    terms = dict.fromkeys(_WORD.findall(text.lower()))
+    return list(terms)[:limit]
+
+
+class ChatEvent:
+    __slots__ = ("id", "timestamp", "sender", "kind", "text", "terms")
+
+    def __init__(self, event_id: int, timestamp: float, sender: str, kind: str, text: str, terms: List[str]):
+        self.id = event_id
+        self.timestamp = timestamp
+        self.sender = sender
+        self.kind = kind        # "TEXT", "STICKER" or "STICKER_FILE"
+        self.text = text        # message text, or the sticker name
+        self.terms = terms      # what the event is indexed under
+
+    def format(self) -> str:
+        when = time.strftime("%H:%M:%S", time.localtime(self.timestamp))
+        if self.kind == "TEXT":
+            return f"{when} {self.sender}: {self.text}"
+        return f"{when} {self.sender} sent sticker [{self.text}]"
+
+    def to_message(self) -> Dict[str, Any]:
+        """As a CHAT_MESSAGE (sticker files as their name only)."""
+        msg = {"message_type": "CHAT_MESSAGE", "sender_name": self.sender}
+        if self.kind == "TEXT":
+            msg.update(content_type="TEXT", message_text=self.text)
+        else:
+            msg.update(content_type="STICKER", sticker_name=self.text)
+        return msg
+
+
+class ChatHistory:
+    def __init__(self, capacity: int = 1000, max_text: int = 500, max_terms: int = 32):
+        self.capacity = max(1, capacity)
+        self.max_text = max_text
+        self.max_terms = max_terms
+        self._ring: List[Optional[ChatEvent]] = [None] * self.capacity
+        self._next_id = 0
+        self._index: Dict[str, Deque[int]] = {}
+
+    def __len__(self) -> int:
+        return min(self._next_id, self.capacity)
+
+    def add(self, sender: str, kind: str, text: str) -> ChatEvent:
+        slot = self._next_id % self.capacity
+        old = self._ring[slot]
+        if old is not None:
+            self._unindex(old)
+
+        text = text[:self.max_text]
+        terms = _terms(f"{sender} {text}", self.max_terms)
+        event = ChatEvent(self._next_id, time.time(), sender, kind, text, terms)
+        self._ring[slot] = event
+        for term in terms:
+            postings = self._index.get(term)
+            if postings is None:
+                postings = self._index[term] = deque()
+            postings.append(event.id)
+        self._next_id += 1
+        return event
+
+    def _unindex(self, event: ChatEvent):
+        for term in event.terms:
+            postings = self._index[term]
+            if postings and postings[0] == event.id:
+                postings.popleft()
+            if not postings:
+                del self._index[term]
+
+    def _get(self, event_id: int) -> ChatEvent:
+        return self._ring[event_id % self.capacity]
+
+    def last(self, n: int) -> List[ChatEvent]:
+        """The last n events, oldest first."""
+        n = max(0, min(n, len(self)))
+        return [self._get(i) for i in range(self._next_id - n, self._next_id)]
+
+    def search(self, query: str, limit: int = 20) -> List[ChatEvent]:
+        """The latest `limit` events containing every word of query, oldest first."""
+        terms = _terms(query, self.max_terms)
+        postings = [self._index.get(term) for term in terms]
+        if not postings or None in postings:
+            return []
+        postings.sort(key=len)
+        others = [set(p) for p in postings[1:]]
+        matches: List[ChatEvent] = []
+        for event_id in reversed(postings[0]):
+            if all(event_id in other for other in others):
+                matches.append(self._get(event_id))
+                if len(matches) >= limit:
+                    break
+        matches.reverse()
+        return matches
+
+    def replay(self, n: int) -> List[Dict[str, Any]]:
+        """The last n events as CHAT_MESSAGE dicts, ready to send to a late joiner."""
+        return [event.to_message() for event in self.last(n)]
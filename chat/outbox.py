@@ -0,0 +1,158 @@
+# chat/outbox.py
+
+"""
+Background chat sender.
+
+ChatHandler.send_* only post to the outbox and return, so typing /chat
+never waits for the network. For every peer a sender task takes posts
+off its queue in order and sends them one at a time, waiting for each
+ACK before the next so chat arrives in the order it was typed:
+
+- rate limit: a token bucket per peer (rate messages per second, up to
+  `burst` at once);
+- coalescing: TEXT messages that piled up while the previous one was in
+  flight (or rate limited) go out as one CHAT_MESSAGE, lines joined with
+  "\\n", up to max_coalesced_chars;
+- delivery status: post() returns a future that becomes True once the
+  peer ACKed the message, or False if it could not be delivered.
+
+post_call() queues a coroutine (e.g. a sticker file transfer) in the
+same order, so it does not block the prompt either.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+_Job = Callable[[], Awaitable[bool]]
+
+
+class _Post:
+    __slots__ = ("msg", "job", "future")
+
+    def __init__(self, msg: Optional[Dict[str, Any]], job: Optional[_Job], future: "asyncio.Future[bool]"):
+        self.msg = msg
+        self.job = job
+        self.future = future
+
+    def coalescable(self) -> bool:
+        return self.msg is not None and self.msg.get("content_type") == "TEXT"
+
+
+class _PeerQueue:
+    def __init__(self, burst: int):
+        self.posts: Deque[_Post] = deque()
+        self.sending: List[_Post] = []
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class ChatOutbox:
+    def __init__(self, reliable, rate: float = 5.0, burst: int = 5, max_coalesced_chars: int = 1000):
+        self.reliable = reliable   # networking.async_udp.AsyncReliableUDP
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_coalesced_chars = max_coalesced_chars
+        self._peers: Dict[Any, _PeerQueue] = {}
+        self.stats: Dict[str, int] = {"posted": 0, "sent": 0, "coalesced": 0, "failed": 0}
+
+    # ---------- posting ----------
+
+    def post(self, msg: Dict[str, Any], addr) -> "asyncio.Future[bool]":
+        """Queue msg for addr; the future is True once it is ACKed."""
+        return self._enqueue(addr, msg, None)
+
+    def post_call(self, job: _Job, addr) -> "asyncio.Future[bool]":
+        """Queue job() (a coroutine function returning bool) behind the messages already posted to addr."""
+        return self._enqueue(addr, None, job)
+
+    def pending(self, addr) -> int:
+        peer = self._peers.get(addr)
+        return len(peer.posts) if peer is not None else 0
+
+    def _enqueue(self, addr, msg, job) -> "asyncio.Future[bool]":
+        loop = asyncio.get_running_loop()
+        peer = self._peers.get(addr)
+        if peer is None:
+            peer = self._peers[addr] = _PeerQueue(self.burst)
+        if peer.task is None:
+            peer.task = loop.create_task(self._drain(addr, peer))
+        future = loop.create_future()
+        peer.posts.append(_Post(msg, job, future))
+        peer.wakeup.set()
+        self.stats["posted"] += 1
+        return future
+
+    # ---------- sending ----------
+
+    async def _take_token(self, peer: _PeerQueue):
+        while True:
+            now = time.monotonic()
+            peer.tokens = min(self.burst, peer.tokens + (now - peer.refilled) * self.rate)
+            peer.refilled = now
+            if peer.tokens >= 1:
+                peer.tokens -= 1
+                return
+            await asyncio.sleep((1 - peer.tokens) / self.rate)
+
+    def _next_batch(self, peer: _PeerQueue) -> List[_Post]:
+        """The next post, plus any TEXT right behind it that can ride along."""
+        batch = [peer.posts.popleft()]
+        if not batch[0].coalescable():
+            return batch
+        first = batch[0].msg
+        size = len(first.get("message_text", ""))
+        while peer.posts and peer.posts[0].coalescable():
+            nxt = peer.posts[0].msg
+            text = nxt.get("message_text", "")
+            if nxt.get("sender_name") != first.get("sender_name") or size + 1 + len(text) > self.max_coalesced_chars:
+                break
+            size += 1 + len(text)
+            batch.append(peer.posts.popleft())
+        return batch
+
+    async def _drain(self, addr, peer: _PeerQueue):
+        while True:
+            if not peer.posts:
+                peer.wakeup.clear()
+                await peer.wakeup.wait()
+                continue
+            await self._take_token(peer)
+            batch = peer.sending = self._next_batch(peer)
+            try:
+                if batch[0].job is not None:
+                    ok = bool(await batch[0].job())
+                else:
+                    msg = batch[0].msg
+                    if len(batch) > 1:
+                        msg = dict(msg, message_text="\n".join(p.msg.get("message_text", "") for p in batch))
+                        self.stats["coalesced"] += len(batch) - 1
+                    ok = await self.reliable.send_reliable(msg, addr)
+            except Exception:
+                ok = False
+            self.stats["sent" if ok else "failed"] += len(batch)
+            peer.sending = []
+            for post in batch:
+                if not post.future.done():
+                    post.future.set_result(ok)
+
+    async def flush(self):
+        """Wait until everything posted so far has been delivered or failed."""
+        pending = [p.future for peer in self._peers.values() for p in (*peer.sending, *peer.posts)]
+        if pending:
+            await asyncio.wait(pending)
+
+    def close(self):
+        """Stop the sender tasks; whatever is still queued is reported as not delivered."""
+        for peer in self._peers.values():
+            if peer.task is not None:
+                peer.task.cancel()
+                peer.task = None
+            for post in (*peer.sending, *peer.posts):
+                if not post.future.done():
+                    post.future.set_result(False)
+            peer.sending = []
+            peer.posts.clear()
@@ -0,0 +1,294 @@
+# chat/sticker_store.py
+
+"""
+Content-addressed, size-bounded store for received stickers.
+
+Every sticker is saved once, as <sha256 hex>.bin in the store directory,
+however often and by whoever it is sent.
+
+The store keeps its own index, index.json in the same directory: every
+sticker's hash and size, least recently used first. It is loaded once
+when the store is created (the directory is only scanned if the index
+is missing or unreadable) and rewritten, via a temp file and rename,
+whenever a sticker is added or evicted. So saving, looking up and
+showing a sticker never lists the directory.
+
+When a new sticker pushes the store past max_bytes or max_files, the
+least recently used stickers are deleted until it fits again. Using a
+sticker (path(), read(), or receiving it again) makes it the most
+recently used. LRU order changes from lookups alone are written out on
+the next add or on flush().
+
+read() keeps the bytes of recently shown stickers in a hot cache of up
+to hot_cache_bytes (0 disables it).
+
+Stickers are added from the sticker worker threads (chat.sticker_worker)
+while the event loop looks them up, so the index is guarded by a lock.
+Only in-memory work, renames and unlinks happen under it: hashing,
+reading and writing index.json do not, so a lookup on the event loop
+never waits for the disk. Evicted files are unlinked under the lock
+because another worker may save the same sticker again as soon as it
+is out of the index, and must not have its fresh file deleted.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+HASH_CHUNK = 64 * 1024
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+_HASH_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def is_valid_hash(value) -> bool:
+    """True for a lowercase SHA-256 hex digest (safe to use as a file name)."""
+    return isinstance(value, str) and _HASH_RE.fullmatch(value) is not None
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StickerStore:
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, max_files: int = 2000,
+                 hot_cache_bytes: int = 4 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max(1, max_files)
+        self.hot_cache_bytes = hot_cache_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._index: "OrderedDict[str, int]" = OrderedDict()   # hash -> size, LRU first
+        self.total_bytes = 0
+        self._hot: "OrderedDict[str, bytes]" = OrderedDict()   # hash -> content, LRU first
+        self._hot_bytes = 0
+        self._dirty = False
+        self.evictions = 0
+        self._lock = threading.RLock()          # guards the index and hot cache
+        self._write_lock = threading.Lock()     # serialises index file writes
+
+        if not self._load_index():
+            self._rebuild_index()
+        with self._lock:
+            evicted = self._evict()
+        if evicted:
+            self.flush()
+
+    def __contains__(self, sticker_hash) -> bool:
+        return sticker_hash in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # ---------- index file ----------
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load_index(self) -> bool:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                return False
+            entries = [(h, size) for h, size in data["entries"]
+                       if is_valid_hash(h) and type(size) is int and size >= 0]
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return False
+        for h, size in entries:
+            self._index[h] = size
+        self.total_bytes = sum(self._index.values())
+        return True
+
+    def _rebuild_index(self):
+        """No usable index file: list the directory once (oldest files first) and write one."""
+        found = []
+        for entry in os.scandir(self.directory):
+            name, ext = os.path.splitext(entry.name)
+            if ext == ".bin" and is_valid_hash(name) and entry.is_file():
+                st = entry.stat()
+                found.append((st.st_mtime, name, st.st_size))
+        for _, h, size in sorted(found):
+            self._index[h] = size
+        self.total_bytes = sum(self._index.values())
+        self.flush(force=True)
+
+    def flush(self, force: bool = False):
+        """Write the index file if it changed (temp file + rename)."""
+        with self._write_lock:
+            with self._lock:
+                if not (self._dirty or force):
+                    return
+                entries = list(self._index.items())
+                self._dirty = False
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".index_", suffix=".part")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": INDEX_VERSION, "entries": entries}, f)
+                os.replace(tmp_path, self._index_path())
+            except OSError:
+                self._dirty = True
+                os.remove(tmp_path)
+                raise
+
+    # ---------- lookups ----------
+
+    def _path(self, sticker_hash: str) -> str:
+        return os.path.join(self.directory, sticker_hash + ".bin")
+
+    def _touch(self, sticker_hash: str):
+        self._index.move_to_end(sticker_hash)
+        self._dirty = True
+
+    def path(self, sticker_hash: str) -> Optional[str]:
+        """Where the sticker is saved (and mark it used), or None if we do not have it."""
+        with self._lock:
+            if sticker_hash not in self._index:
+                return None
+            self._touch(sticker_hash)
+            return self._path(sticker_hash)
+
+    def read(self, sticker_hash: str) -> Optional[bytes]:
+        """The sticker's bytes, from the hot cache if it was shown recently."""
+        with self._lock:
+            data = self._hot.get(sticker_hash)
+            if data is not None:
+                self._hot.move_to_end(sticker_hash)
+                self._touch(sticker_hash)
+                return data
+        path = self.path(sticker_hash)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                if sticker_hash in self._index:
+                    self._forget(sticker_hash)   # deleted behind our back
+            return None
+        with self._lock:
+            self._cache(sticker_hash, data)
+        return data
+
+    # ---------- adding / evicting ----------
+
+    def _cache(self, sticker_hash: str, data: bytes):
+        if len(data) > self.hot_cache_bytes or sticker_hash in self._hot:
+            return
+        self._hot[sticker_hash] = data
+        self._hot_bytes += len(data)
+        while self._hot_bytes > self.hot_cache_bytes:
+            _, old = self._hot.popitem(last=False)
+            self._hot_bytes -= len(old)
+
+    def _forget(self, sticker_hash: str):
+        self.total_bytes -= self._index.pop(sticker_hash)
+        data = self._hot.pop(sticker_hash, None)
+        if data is not None:
+            self._hot_bytes -= len(data)
+        self._dirty = True
+
+    def _evict(self, keep: Optional[str] = None) -> List[str]:
+        """Drop least recently used stickers (never `keep`) until within quota; call with the lock held."""
+        victims = []
+        while (self.total_bytes > self.max_bytes or len(self._index) > self.max_files) and self._index:
+            victim = next(iter(self._index))
+            if victim == keep:
+                if len(self._index) == 1:
+                    break
+                self._index.move_to_end(victim)
+                continue
+            self._forget(victim)
+            self.evictions += 1
+            victims.append(victim)
+        self._delete(victims)
+        return victims
+
+    def _delete(self, victims: List[str]):
+        """Remove evicted files; call with the lock held, before anyone can re-add them."""
+        for victim in victims:
+            try:
+                os.remove(self._path(victim))
+            except FileNotFoundError:
+                pass
+
+    def _added(self, sticker_hash: str, size: int):
+        self._index[sticker_hash] = size
+        self.total_bytes += size
+        self._dirty = True
+        self._evict(keep=sticker_hash)
+
+    def add_file(self, tmp_path: str, expected_hash: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Move a fully written temp file (in the store directory) into the
+        store. Returns (hash, path). Raises ValueError, and removes the temp
+        file, if its content does not match expected_hash or it is larger
+        than the whole store.
+        """
+        sticker_hash = file_digest(tmp_path)
+        size = os.path.getsize(tmp_path)
+        if expected_hash is not None and sticker_hash != expected_hash:
+            os.remove(tmp_path)
+            raise ValueError(f"content hash {sticker_hash[:12]} does not match {expected_hash[:12]}")
+        if size > self.max_bytes:
+            os.remove(tmp_path)
+            raise ValueError(f"sticker of {size} bytes exceeds the {self.max_bytes} byte store")
+        with self._lock:
+            known = sticker_hash in self._index
+            if not known:
+                os.replace(tmp_path, self._path(sticker_hash))
+                self._added(sticker_hash, size)
+        if known:
+            os.remove(tmp_path)   # already have it
+            return sticker_hash, self.path(sticker_hash)
+        self.flush()
+        return sticker_hash, self._path(sticker_hash)
+
+    def add_bytes(self, data: bytes, expected_hash: Optional[str] = None) -> Tuple[str, str]:
+        """Save data (written to a temp file and renamed into place). Returns (hash, path)."""
+        sticker_hash = hashlib.sha256(data).hexdigest()
+        if expected_hash is not None and sticker_hash != expected_hash:
+            raise ValueError(f"content hash {sticker_hash[:12]} does not match {expected_hash[:12]}")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"sticker of {len(data)} bytes exceeds the {self.max_bytes} byte store")
+        if sticker_hash in self:
+            return sticker_hash, self.path(sticker_hash)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".incoming_", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+        with self._lock:
+            known = sticker_hash in self._index   # saved meanwhile by another worker?
+            if not known:
+                os.replace(tmp_path, self._path(sticker_hash))
+                self._cache(sticker_hash, data)   # just shown
+                self._added(sticker_hash, len(data))
+        if known:
+            os.remove(tmp_path)
+            return sticker_hash, self.path(sticker_hash)
+        self.flush()
+        return sticker_hash, self._path(sticker_hash)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "stickers": len(self._index),
+                "bytes": self.total_bytes,
+                "evictions": self.evictions,
+                "hot_cache_bytes": self._hot_bytes,
+            }
@@ -0,0 +1,160 @@
+# chat/sticker_stream.py
+
+"""
+Chunked sticker transfer.
+
+A sticker file is offered by its content hash first, and its bytes are
+sent as a stream of CHAT_MESSAGEs only if the receiver wants them:
+
+    -> STICKER_OFFER         stream_id, sticker_name, sticker_hash, total_size
+    <- STICKER_HAVE          stream_id   (already in the receiver's store: done)
+     | STICKER_WANT          stream_id   (stream opened, send the chunks)
+     | STICKER_REFUSE        stream_id   (e.g. too big)
+    -> STICKER_STREAM_CHUNK  stream_id, offset, sticker_data_b64 (one chunk)
+
+The sender reads the file one chunk at a time and keeps at most a
+window of chunks unACKed (ChatHandler.send_sticker_stream), so neither
+side ever holds more than that in memory. The receiver writes each
+chunk at its offset into a temp file in the store directory; once
+total_size bytes have arrived the file is checked against the offered
+hash and renamed into the store (chat.sticker_store). Chunks may arrive
+in any order. A stream that stops receiving chunks is thrown away after
+IncomingStreams.idle_timeout seconds.
+
+IncomingStreams is bookkeeping only and lives on the event loop; the
+file work of an IncomingSticker (write, abort) runs on the sticker
+worker pool (chat.sticker_worker), so it is locked per sticker.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+DEFAULT_CHUNK_SIZE = 1024   # raw bytes: a chunk fits one datagram with the binary codec
+DEFAULT_WINDOW = 16         # chunks the sender keeps unACKed
+
+
+def iter_file_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """(offset, bytes) for each chunk of the file, read as they are needed."""
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield offset, chunk
+            offset += len(chunk)
+
+
+class IncomingSticker:
+    """
+    One sticker being received: chunks go straight into a temp file,
+    created by the first write().
+    """
+
+    def __init__(self, directory: str, sender: str, sticker_name: str, sticker_hash: str,
+                 total_size: int):
+        self.sender = sender
+        self.sticker_name = sticker_name
+        self.sticker_hash = sticker_hash
+        self.total_size = total_size
+        self.directory = directory
+        self.received = 0
+        self._offsets: Set[int] = set()
+        self.tmp_path: Optional[str] = None
+        self._file = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.last_activity = time.monotonic()
+
+    @property
+    def complete(self) -> bool:
+        return self.received >= self.total_size
+
+    def write(self, offset: int, data: bytes) -> bool:
+        """
+        Write one chunk. Returns True for the chunk that completes the
+        sticker: the temp file (tmp_path) is then closed and left in place.
+        Raises ValueError if the chunk does not fit the sticker.
+        """
+        if offset < 0 or offset + len(data) > self.total_size:
+            raise ValueError(f"chunk at {offset} (+{len(data)}) is outside {self.total_size} bytes")
+        with self._lock:
+            if self._closed or offset in self._offsets:
+                return False  # already written
+            if self._file is None:
+                fd, self.tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".incoming_", suffix=".part")
+                self._file = os.fdopen(fd, "wb")
+            self._file.seek(offset)
+            self._file.write(data)
+            self._offsets.add(offset)
+            self.received += len(data)
+            if not self.complete:
+                return False
+            self._file.close()
+            self._closed = True
+            return True
+
+    def abort(self):
+        """Close and delete the temp file (if any)."""
+        with self._lock:
+            self._closed = True
+            if self._file is None:
+                return
+            self._file.close()
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+
+
+class IncomingStreams:
+    """Sticker streams being received, keyed by (sender_name, stream_id)."""
+
+    def __init__(self, directory: str, idle_timeout: float = 30.0,
+                 max_size: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        self._streams: Dict[Tuple[str, int], IncomingSticker] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def start(self, sender: str, stream_id: int, sticker_name: str, sticker_hash: str,
+              total_size: int) -> IncomingSticker:
+        """
+        Track a new stream. Raises ValueError if total_size is not acceptable.
+        An earlier stream with the same key must be abort()ed by the caller
+        (see expire()).
+        """
+        if not 0 < total_size <= self.max_size:
+            raise ValueError(f"sticker size {total_size} not in 1..{self.max_size}")
+        incoming = IncomingSticker(self.directory, sender, sticker_name, sticker_hash, total_size)
+        self._streams[(sender, stream_id)] = incoming
+        return incoming
+
+    def get(self, sender: str, stream_id: int) -> Optional[IncomingSticker]:
+        return self._streams.get((sender, stream_id))
+
+    def pop(self, sender: str, stream_id: int) -> Optional[IncomingSticker]:
+        """Stop tracking a stream (finished or failed)."""
+        return self._streams.pop((sender, stream_id), None)
+
+    def expire(self, now: Optional[float] = None) -> List[IncomingSticker]:
+        """Stop tracking streams that have not seen a chunk for idle_timeout seconds; returns them."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        for key, incoming in list(self._streams.items()):
+            if now - incoming.last_activity > self.idle_timeout:
+                del self._streams[key]
+                expired.append(incoming)
+        return expired
+
+    def clear(self) -> List[IncomingSticker]:
+        """Stop tracking every stream; returns them."""
+        streams = list(self._streams.values())
+        self._streams.clear()
+        return streams
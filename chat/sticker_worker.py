@@ -0,0 +1,70 @@
+# chat/sticker_worker.py
+
+"""
+Background sticker work (base64 decoding, hashing, disk writes).
+
+ChatHandler.handle_incoming runs in the receive path: anything slow
+there delays battle messages and the ACKs the peer is waiting for. So
+sticker jobs run on a small thread pool, and their completion callback
+(printing where the sticker was saved) runs back on the event loop.
+
+At most max_pending jobs are queued or running. When the pool is full,
+submit() refuses the job and Protocols.handle_chat leaves the message
+unACKed, so the peer resends it after its retransmission timeout
+instead of us queueing without bound.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Set
+
+# on_done(result, error): exactly one of them is None
+DoneCallback = Callable[[Any, Optional[BaseException]], None]
+
+
+class StickerWorker:
+    def __init__(self, max_workers: int = 2, max_pending: int = 64):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sticker-io")
+        self._pending: Set["asyncio.Future[Any]"] = set()
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self.max_pending
+
+    def submit(self, fn: Callable[..., Any], *args, on_done: Optional[DoneCallback] = None) -> bool:
+        """
+        Run fn(*args) on the pool; on_done gets its result on the event
+        loop. Returns False (and does nothing) if the pool is full.
+        Must be called from the event loop thread.
+        """
+        if self.full:
+            self.rejected += 1
+            return False
+        future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        self._pending.add(future)
+        future.add_done_callback(lambda f: self._done(f, on_done))
+        return True
+
+    def _done(self, future: "asyncio.Future[Any]", on_done: Optional[DoneCallback]):
+        self._pending.discard(future)
+        self.completed += 1
+        if future.cancelled():
+            return
+        error = future.exception()
+        if on_done is not None:
+            on_done(None if error is not None else future.result(), error)
+
+    async def join(self):
+        """Wait until every submitted job (and its callback) has finished."""
+        while self._pending:
+            await asyncio.wait(set(self._pending))
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
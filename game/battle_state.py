@@ -1,6 +1,8 @@
 # imports
 from enum import Enum
 from chat.verbose_mode import VerboseManager
+from game.damage_table import DamageTable
+from game.pokemon_table import get_pokemon_table
 import random
 
 """
@@ -34,6 +36,8 @@ class BattleState:
         self.my_pokemon = None 
         self.opponent_pokemon = None
         self.stat_boosts = None
+        self.damage_table = None                    # DamageTable, built by set_pokemon_data
+        self.damage_table_agreed = None             # peer's digest matched ours? None: not compared
 
         #game state
         self.last_attack = None                     # attack data received
@@ -60,11 +64,47 @@ class BattleState:
 
     #pokemon stats
     #call this after BATTLE_SETUP exchange is sent
-    def set_pokemon_data(self, my_pokemon: dict, opponent_pokemon: dict, my_stat_boosts):
+    #peer_digest: the damage_table digest from the peer's BATTLE_SETUP, if it sent one
+    #returns False if it differs from ours (the peers would not agree on damage)
+    def set_pokemon_data(self, my_pokemon: dict, opponent_pokemon: dict, my_stat_boosts=None, peer_digest=None) -> bool:
         self.my_pokemon = my_pokemon
         self.opponent_pokemon = opponent_pokemon
         self.stat_boosts = my_stat_boosts
         self.log("Pokemon data set: Mine HP:", self.my_pokemon.get('hp'), "Opponent HP:", self.opponent_pokemon.get('hp'), "My stat boosts", self.stat_boosts)
+        self.damage_table = self.build_damage_table()
+        if peer_digest is None:
+            return True
+        mine = self.damage_table.digest if self.damage_table else None
+        self.damage_table_agreed = mine == peer_digest
+        if self.damage_table_agreed:
+            self.log("Damage table matches the peer's:", mine)
+        else:
+            role = "HOST" if self.is_host else "JOINER"
+            print(f"[{role}] WARNING: damage table mismatch (ours {mine}, peer's {peer_digest}):"
+                  " the peers have different Pokemon data and will disagree on damage")
+        return self.damage_table_agreed
+
+    #both pokemon are fixed from here on, so their damage is worked out once
+    def build_damage_table(self):
+        mine = self.my_pokemon.get('pokemon') or self.my_pokemon.get('name')
+        theirs = self.opponent_pokemon.get('pokemon') or self.opponent_pokemon.get('name')
+        if not mine or not theirs:
+            return None
+        host, joiner = (mine, theirs) if self.is_host else (theirs, mine)
+        table = DamageTable.build(get_pokemon_table(), host, joiner)
+        if table is None:
+            self.log("No damage table: Pokemon not found in CSV:", host, joiner)
+        else:
+            self.log("Damage table built:", table.as_dict(), "digest", table.digest)
+        return table
+
+    #final damage of this turn's attack: a damage table lookup and one variance draw
+    def roll_damage(self, stat_mode, your_turn) -> int:
+        mine = "host" if self.is_host else "joiner"
+        theirs = "joiner" if self.is_host else "host"
+        damage = self.damage_table.roll(mine if your_turn else theirs, stat_mode, self.rng)
+        self.log("Rolled damage:", damage, "mode", stat_mode)
+        return damage
     
     #generate next sequence number
     def next_sequence_number(self) -> int:
@@ -213,6 +253,8 @@ class BattleState:
             "opponent_confirm_received": self.opponent_confirm_received,
             "winner": self.winner,
             "stat_boosts": self.stat_boosts,
+            "damage_table": self.damage_table.digest if self.damage_table else None,
+            "damage_table_agreed": self.damage_table_agreed,
             "my_pokemon": str(self.my_pokemon) if self.my_pokemon else None,
             "opponent_pokemon": str(self.opponent_pokemon) if self.opponent_pokemon else None,
         }
@@ -4,9 +4,25 @@
 """ Not yet integrated into battle_state.py"""
 
 
+from bisect import bisect_right
+from typing import NamedTuple, Sequence, Union
+
 from game.battle_state import BattleState
 from chat.verbose_mode import VerboseManager
 from game.pokemon_stats import get_by_name, pokemon_to_dict
+from game.damage_table import BASE_POWER, MODE_STATS, STAT_MODES, VARIANCE, base_damage, stat_mode_code
+from game.pokemon_table import PokemonRow, PokemonTable
+from game.stats_cache import INT_MISSING
+from game.type_chart import AGAINST_FIELDS, NO_TYPE, dual_multipliers, type_index
+
+try:
+    import numpy as np
+except ImportError:   # optional: calculate_damage_batch() falls back to plain Python
+    np = None
+
+# damage / defender HP thresholds of each effect, weakest first
+EFFECT_THRESHOLDS = (0.3, 0.6, 0.9)
+DAMAGE_EFFECTS = ("not very effective", "effective", "very effective", "super effective")
 
 #------------------------ Damage Calculation -----------------------------------------------
 def calculate_damage(state: BattleState, stat_confirm, your_turn):
@@ -22,9 +38,15 @@ def calculate_damage(state: BattleState, stat_confirm, your_turn):
         attacker = state.opponent_pokemon
         defender = state.my_pokemon
 
-    # fixed base power because the csv doesnt have this
+    # Battle's damage table (built at setup): a lookup and one variance draw
+    if state.damage_table is not None:
+        final_damage = state.roll_damage(stat_confirm, your_turn)
+        if VerboseManager.is_verbose():
+            print(f"[DAMAGE_CALC] Final damage from damage table: {final_damage}")
+        return final_damage, get_damage_effect(defender['hp'], final_damage)
+
     # what does it mean that it has to be editable
-    base_power = 20
+    base_power = BASE_POWER
     if VerboseManager.is_verbose():
         print(f"[DAMAGE_CALC] Attacker: {attacker.get('name', '?')}, Defender: {defender.get('name', '?')}")
 
@@ -53,7 +75,7 @@ def calculate_damage(state: BattleState, stat_confirm, your_turn):
     
     # Actual damage calculation
     damage = (base_power * atk_stat * type1_eff * type2_eff) / max(def_stat, 1)
-    variance = state.rng.uniform(0.85, 1.0)
+    variance = state.rng.uniform(*VARIANCE)
     final_damage = max(1, int(damage * variance))
     if VerboseManager.is_verbose():
         print(f"[DAMAGE_CALC] Base damage: {damage:.2f}, Type effectiveness: {type1_eff} x {type2_eff}, Variance: {variance:.2f}")
@@ -66,22 +88,130 @@ def calculate_damage(state: BattleState, stat_confirm, your_turn):
 
 
 def get_type_effectiveness(defense_stats, attacker_type):
-    atk_type_fixed = attacker_type.lower()
-
-    return defense_stats[f'against_{atk_type_fixed}']
+    """
+    Multiplier of an attack of attacker_type (a name or a type_chart
+    index) against the defender: a pokemon_to_dict() dict or a
+    PokemonRow, which reads it straight from its defensive vector.
+    """
+    if not isinstance(attacker_type, int):
+        attacker_type = type_index(attacker_type)
+    if attacker_type == NO_TYPE:
+        return 1.0
+    if isinstance(defense_stats, PokemonRow):
+        return defense_stats.effectiveness(attacker_type)
+    return defense_stats[AGAINST_FIELDS[attacker_type]]
+
+
+def get_type_effectiveness_batch(table, defenders, attacker_type1s, attacker_type2s):
+    """
+    Combined (type1 x type2) multipliers for many attacks at once:
+    attack k is by a Pokemon of types attacker_type1s[k] /
+    attacker_type2s[k] (type indexes, NO_TYPE for none) on the table's
+    Pokemon defenders[k]. An ndarray with NumPy, else a list.
+    """
+    return dual_multipliers(table.defense, defenders, attacker_type1s, attacker_type2s)
 
 def get_damage_effect(orig_hp, damage):
     ratio = damage/orig_hp
     if VerboseManager.is_verbose():
         print(f"[DAMAGE_CALC] Damage ratio: {ratio:.2f} (damage={damage}, orig_hp={orig_hp})")
 
-    if ratio >= 0.9:
-        effect = "super effective"
-    elif ratio < 0.9 and ratio >= 0.6:
-        effect = "very effective"
-    elif ratio < 0.6 and ratio >= 0.3:
-        effect = "effective"
+    return DAMAGE_EFFECTS[bisect_right(EFFECT_THRESHOLDS, ratio)]
+
+
+#------------------------ Batch Damage Calculation -----------------------------------------
+class DamageBatch(NamedTuple):
+    """
+    Damage of many attacks at once (see calculate_damage_batch), one
+    entry per attack: ndarrays with NumPy, else lists.
+    """
+    expected: object   # mean final damage over the variance
+    minimum: object    # final damage at the lowest variance
+    maximum: object    # ... and at the highest
+    effect: object     # index into DAMAGE_EFFECTS of the expected damage
+
+    def effect_names(self):
+        return [DAMAGE_EFFECTS[e] for e in self.effect]
+
+
+def _expected_final(damage: float) -> float:
+    """E[max(1, int(damage * v))] for v uniform in VARIANCE."""
+    lo, hi = damage * VARIANCE[0], damage * VARIANCE[1]
+    if hi <= lo:
+        return float(max(1, int(hi)))
+    # the integral of floor(x) is k*x - k*(k+1)/2 with k = floor(x); below 1 it counts as 1
+    k_lo, k_hi = int(lo), int(hi)
+    integral = (k_hi * hi - k_hi * (k_hi + 1) / 2) - (k_lo * lo - k_lo * (k_lo + 1) / 2)
+    return integral / (hi - lo) + min(max((1 - lo) / (hi - lo), 0.0), 1.0)
+
+
+def calculate_damage_batch(table: PokemonTable, attackers: Sequence[int], defenders: Sequence[int],
+                           stat_modes: Union[str, Sequence] = "normal", base_power: float = BASE_POWER) -> DamageBatch:
+    """
+    calculate_damage() for many attacker/defender pairs of a
+    PokemonTable at once, without drawing from any RNG: attack k is by
+    attackers[k] on defenders[k] (row indexes) in stat_modes[k] (or one
+    mode for all). Returns the expected, minimum and maximum final damage
+    over the variance, and the effect class of the expected damage
+    against the defender's full HP. Missing stats count as 0.
+    """
+    if np is None:
+        return _calculate_damage_batch_py(table, attackers, defenders, stat_modes, base_power)
+    attackers = np.asarray(attackers, dtype=np.intp)
+    defenders = np.asarray(defenders, dtype=np.intp)
+    if isinstance(stat_modes, (str, int)) or stat_modes is None:
+        modes = np.full(attackers.shape, stat_mode_code(stat_modes), dtype=np.intp)
     else:
-        effect = "not very effective"
-
-    return effect
\ No newline at end of file
+        modes = np.fromiter((stat_mode_code(m) for m in stat_modes), dtype=np.intp, count=len(stat_modes))
+
+    def column(field):
+        values = table.stat_array(field)
+        return np.where(values == INT_MISSING, 0, values).astype(np.float64)
+
+    # per mode, the stat columns; pick each attack's value by its mode
+    atk_stat = np.choose(modes, [column(a)[attackers] for a, _ in MODE_STATS])
+    def_stat = np.choose(modes, [column(d)[defenders] for _, d in MODE_STATS])
+    type1, type2 = table.type_arrays()
+    multiplier = dual_multipliers(table.defense, defenders, type1[attackers], type2[attackers])
+
+    damage = (base_power * atk_stat * multiplier) / np.maximum(def_stat, 1)
+    lo, hi = damage * VARIANCE[0], damage * VARIANCE[1]
+    k_lo, k_hi = np.floor(lo), np.floor(hi)
+    width = hi - lo
+    integral = (k_hi * hi - k_hi * (k_hi + 1) / 2) - (k_lo * lo - k_lo * (k_lo + 1) / 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = integral / width + np.clip((1 - lo) / width, 0.0, 1.0)
+    minimum = np.maximum(1, k_lo).astype(np.int64)
+    maximum = np.maximum(1, k_hi).astype(np.int64)
+    expected = np.where(width > 0, mean, maximum)
+
+    hp = np.maximum(column("hp")[defenders], 1)
+    effect = np.searchsorted(np.asarray(EFFECT_THRESHOLDS), expected / hp, side="right")
+    return DamageBatch(expected, minimum, maximum, effect)
+
+
+def _calculate_damage_batch_py(table, attackers, defenders, stat_modes, base_power) -> DamageBatch:
+    if isinstance(stat_modes, (str, int)) or stat_modes is None:
+        stat_modes = [stat_modes] * len(attackers)
+    expected, minimum, maximum, effect = [], [], [], []
+    for attacker, defender, mode in zip(attackers, defenders, stat_modes):
+        damage = base_damage(table, attacker, defender, mode, base_power)
+        expected.append(_expected_final(damage))
+        minimum.append(max(1, int(damage * VARIANCE[0])))
+        maximum.append(max(1, int(damage * VARIANCE[1])))
+        hp = max(table.stat("hp", defender) or 0, 1)
+        effect.append(bisect_right(EFFECT_THRESHOLDS, expected[-1] / hp))
+    return DamageBatch(expected, minimum, maximum, effect)
+
+
+def matchup_table(table: PokemonTable, stat_mode: Union[str, int] = "normal",
+                  base_power: float = BASE_POWER) -> DamageBatch:
+    """Every Pokemon against every Pokemon: entry [a * N + d] is a attacking d (reshape to N x N with NumPy)."""
+    count = len(table)
+    if np is None:
+        attackers = [a for a in range(count) for _ in range(count)]
+        defenders = list(range(count)) * count
+    else:
+        attackers = np.repeat(np.arange(count), count)
+        defenders = np.tile(np.arange(count), count)
+    return calculate_damage_batch(table, attackers, defenders, stat_mode, base_power)
\ No newline at end of file
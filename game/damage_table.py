@@ -0,0 +1,111 @@
+# game/damage_table.py
+
+"""
+A battle's damage, worked out once at BATTLE_SETUP.
+
+After the setup exchange the two Pokemon (and so their stats and types)
+are fixed for the whole match. DamageTable holds the base damage (the
+damage before the random variance) of each side's attack in each stat
+mode, keyed by (attacking role, mode) with roles "host" and "joiner".
+A turn is then one lookup and one draw from the battle's seeded RNG
+(roll()).
+
+The table is immutable, and keyed by role rather than by "mine" and
+"theirs", so both peers build the very same table. digest (SHA-256 of
+its exact contents) lets them check that with a single value.
+"""
+
+import hashlib
+import json
+from typing import Dict, Optional, Tuple, Union
+
+from game.pokemon_table import PokemonTable
+from game.type_chart import NUM_TYPES, dual_multiplier
+
+# fixed base power because the csv doesnt have this
+BASE_POWER = 20
+VARIANCE = (0.85, 1.0)   # damage is scaled by rng.uniform(*VARIANCE)
+
+# stat modes: "atk" (special attack boost), "def" (special defense boost), anything else is normal
+STAT_MODES = ("atk", "def", "normal")
+# (attacker stat, defender stat) per mode
+MODE_STATS = (("sp_attack", "defense"), ("attack", "sp_defense"), ("attack", "defense"))
+
+ROLES = ("host", "joiner")
+
+
+def stat_mode_code(mode: Union[str, int, None]) -> int:
+    """Index into STAT_MODES of a stat_confirm value ("atk", "def", anything else: normal)."""
+    if isinstance(mode, int):
+        return mode
+    return STAT_MODES.index(mode) if mode in ("atk", "def") else 2
+
+
+def base_damage(table: PokemonTable, attacker: int, defender: int, mode: Union[str, int, None],
+                base_power: float = BASE_POWER) -> float:
+    """Damage of attacker on defender (table row indexes) before the variance; missing stats count as 0."""
+    atk_field, def_field = MODE_STATS[stat_mode_code(mode)]
+    atk_stat = table.stat(atk_field, attacker) or 0
+    def_stat = table.stat(def_field, defender) or 0
+    multiplier = dual_multiplier(table.defense, table.type1[attacker], table.type2[attacker], defender * NUM_TYPES)
+    return (base_power * atk_stat * multiplier) / max(def_stat, 1)
+
+
+class DamageTable:
+    __slots__ = ("host", "joiner", "base_power", "_base", "digest")
+
+    def __init__(self, host: str, joiner: str, base: Dict[Tuple[str, str], float], base_power: float = BASE_POWER):
+        set_ = object.__setattr__
+        set_(self, "host", host)
+        set_(self, "joiner", joiner)
+        set_(self, "base_power", base_power)
+        set_(self, "_base", dict(base))
+        set_(self, "digest", hashlib.sha256(self._canonical()).hexdigest())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DamageTable is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("DamageTable is immutable")
+
+    @classmethod
+    def build(cls, table: PokemonTable, host: str, joiner: str,
+              base_power: float = BASE_POWER) -> Optional["DamageTable"]:
+        """The table for host's Pokemon against joiner's (names, any case); None if either is unknown."""
+        indexes = {"host": table.index_of(host), "joiner": table.index_of(joiner)}
+        if None in indexes.values():
+            return None
+        base = {}
+        for attacker, defender in (("host", "joiner"), ("joiner", "host")):
+            for mode in STAT_MODES:
+                base[attacker, mode] = base_damage(table, indexes[attacker], indexes[defender], mode, base_power)
+        return cls(table.names[indexes["host"]], table.names[indexes["joiner"]], base, base_power)
+
+    def _canonical(self) -> bytes:
+        # float.hex: exact, so equal digests mean equal tables
+        return json.dumps({
+            "host": self.host,
+            "joiner": self.joiner,
+            "base_power": float(self.base_power).hex(),
+            "base": {f"{role}/{mode}": value.hex() for (role, mode), value in sorted(self._base.items())},
+        }, sort_keys=True).encode("utf-8")
+
+    def base(self, attacker: str, mode: Union[str, int, None]) -> float:
+        """Base damage of attacker's ("host" or "joiner") attack in a stat mode."""
+        return self._base[attacker, STAT_MODES[stat_mode_code(mode)]]
+
+    def roll(self, attacker: str, mode: Union[str, int, None], rng) -> int:
+        """Final damage of one attack: the base damage with one variance draw from rng."""
+        return max(1, int(self.base(attacker, mode) * rng.uniform(*VARIANCE)))
+
+    def as_dict(self) -> Dict[str, float]:
+        return {f"{role}/{mode}": value for (role, mode), value in self._base.items()}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DamageTable) and other.digest == self.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f"DamageTable({self.host!r} vs {self.joiner!r}, digest={self.digest[:12]})"
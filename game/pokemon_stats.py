@@ -5,14 +5,22 @@
 # game/pokemon_stats.py
 from chat.verbose_mode import VerboseManager
 from dataclasses import dataclass
+from array import array
 import csv
 from typing import Dict, Optional
 import os
 import ast
+import threading
 from typing import List
+from game import stats_cache
+from game.stats_cache import INT_MISSING, Columns
+from game.type_chart import AGAINST_FIELDS
 
-print(os.getcwd())
+DEFAULT_CSV = os.path.join(os.path.dirname(__file__), "pokemon.csv")
 
+# the columns kept from the CSV (and in the compiled cache, see game.stats_cache)
+STAT_FIELDS = ("hp", "attack", "defense", "sp_attack", "sp_defense")
+# AGAINST_FIELDS (game.type_chart): one multiplier column per type, in type index order
 
 
 @dataclass
@@ -47,6 +55,7 @@ class Pokemon:
     against_water: float = 1.0
     
     raw: Dict[str, str] = None        #for debugging :), this will diplay other stats that will not be used for damage calculation
+                                      #(only filled in by load_pokemon_stats(use_cache=False))
 
 
 
@@ -66,6 +75,11 @@ def _to_float(s: str) -> Optional[float]:
     except ValueError:
         return None
 
+def _to_multiplier(s: str) -> float:
+    # 0.5, 0.25 and 0 (immune) are all real multipliers; only a missing one means neutral
+    value = _to_float(s)
+    return 1.0 if value is None else value
+
 def _to_bool_from_int_str(s: str) -> bool:
     # expects '0' or '1'
     if s is None:
@@ -83,12 +97,37 @@ def _to_list(s: str) -> list:
 
 
 
-def load_pokemon_stats(csv_path: str = None) -> Dict[str, Pokemon]:   #Loading of .csv file
-    """Load CSV and return dict keyed by lowercase name -> Pokemon dataclass."""
+def load_pokemon_stats(csv_path: str = None, use_cache: bool = True) -> Dict[str, Pokemon]:   #Loading of .csv file
+    """
+    Load CSV and return dict keyed by lowercase name -> Pokemon dataclass.
+
+    With use_cache the parsed columns come from the compiled cache next to
+    the CSV (game.stats_cache), which is rebuilt only when the CSV changed.
+    Most callers want get_pokemon_stats(), which also shares the result
+    across the process.
+    """
     if csv_path is None:
         # Resolve CSV path relative to this file's location
-        csv_path = os.path.join(os.path.dirname(__file__), "pokemon.csv")
-    
+        csv_path = DEFAULT_CSV
+    if not use_cache:
+        return _parse_csv(csv_path)
+    return _from_columns(load_pokemon_columns(csv_path))
+
+
+def load_pokemon_columns(csv_path: str = None) -> Columns:
+    """The CSV's columns from the compiled cache, compiling it first if it is missing or stale."""
+    csv_path = csv_path or DEFAULT_CSV
+    cache_path = stats_cache.cache_path_for(csv_path)
+    columns = stats_cache.read_cache(cache_path, csv_path, STAT_FIELDS, AGAINST_FIELDS)
+    if columns is None:
+        columns = _to_columns(_parse_csv(csv_path).values())
+        stats_cache.write_cache(cache_path, csv_path, columns)
+        if VerboseManager.is_verbose():
+            print(f"[POKEMON_STATS] Compiled {len(columns)} Pokemon into {cache_path}")
+    return columns
+
+
+def _parse_csv(csv_path: str) -> Dict[str, Pokemon]:
     stats: Dict[str, Pokemon] = {}
     with open(csv_path, newline="", encoding="utf-8") as fh:
         reader = csv.DictReader(fh, delimiter=",")
@@ -109,24 +148,24 @@ def load_pokemon_stats(csv_path: str = None) -> Dict[str, Pokemon]:   #Loading o
                 sp_defense=_to_int(row.get("sp_defense")),
 
                 # Type effectiveness columns
-                against_bug=_to_int(row.get("against_bug")) or 1.0,
-                against_dark=_to_int(row.get("against_dark")) or 1.0,
-                against_dragon=_to_int(row.get("against_dragon")) or 1.0,
-                against_electric=_to_int(row.get("against_electric")) or 1.0,
-                against_fairy=_to_int(row.get("against_fairy")) or 1.0,
-                against_fight=_to_int(row.get("against_fight")) or 1.0,
-                against_fire=_to_int(row.get("against_fire")) or 1.0,
-                against_flying=_to_int(row.get("against_flying")) or 1.0,
-                against_ghost=_to_int(row.get("against_ghost")) or 1.0,
-                against_grass=_to_int(row.get("against_grass")) or 1.0,
-                against_ground=_to_int(row.get("against_ground")) or 1.0,
-                against_ice=_to_int(row.get("against_ice")) or 1.0,
-                against_normal=_to_int(row.get("against_normal")) or 1.0,
-                against_poison=_to_int(row.get("against_poison")) or 1.0,
-                against_psychic=_to_int(row.get("against_psychic")) or 1.0,
-                against_rock=_to_int(row.get("against_rock")) or 1.0,
-                against_steel=_to_int(row.get("against_steel")) or 1.0,
-                against_water=_to_int(row.get("against_water")) or 1.0,
+                against_bug=_to_multiplier(row.get("against_bug")),
+                against_dark=_to_multiplier(row.get("against_dark")),
+                against_dragon=_to_multiplier(row.get("against_dragon")),
+                against_electric=_to_multiplier(row.get("against_electric")),
+                against_fairy=_to_multiplier(row.get("against_fairy")),
+                against_fight=_to_multiplier(row.get("against_fight")),
+                against_fire=_to_multiplier(row.get("against_fire")),
+                against_flying=_to_multiplier(row.get("against_flying")),
+                against_ghost=_to_multiplier(row.get("against_ghost")),
+                against_grass=_to_multiplier(row.get("against_grass")),
+                against_ground=_to_multiplier(row.get("against_ground")),
+                against_ice=_to_multiplier(row.get("against_ice")),
+                against_normal=_to_multiplier(row.get("against_normal")),
+                against_poison=_to_multiplier(row.get("against_poison")),
+                against_psychic=_to_multiplier(row.get("against_psychic")),
+                against_rock=_to_multiplier(row.get("against_rock")),
+                against_steel=_to_multiplier(row.get("against_steel")),
+                against_water=_to_multiplier(row.get("against_water")),
 
                 raw=row
             )
@@ -134,6 +173,52 @@ def load_pokemon_stats(csv_path: str = None) -> Dict[str, Pokemon]:   #Loading o
     return stats
 
 
+def _to_columns(pokemon: List[Pokemon]) -> Columns:
+    pokemon = list(pokemon)
+    ints = {}
+    for field in STAT_FIELDS:
+        values = (getattr(p, field) for p in pokemon)
+        ints[field] = array("i", (INT_MISSING if v is None else v for v in values))
+    floats = {field: array("d", (getattr(p, field) for p in pokemon)) for field in AGAINST_FIELDS}
+    return Columns(
+        [p.name for p in pokemon],
+        [p.type1 or "" for p in pokemon],
+        [p.type2 or "" for p in pokemon],
+        ints,
+        floats,
+    )
+
+
+def _from_columns(columns: Columns) -> Dict[str, Pokemon]:
+    stats: Dict[str, Pokemon] = {}
+    ints = [[None if v == INT_MISSING else v for v in columns.ints[f]] for f in STAT_FIELDS]
+    floats = [columns.floats[f] for f in AGAINST_FIELDS]
+    for i, name in enumerate(columns.names):
+        p = Pokemon(name, columns.type1[i] or None, columns.type2[i] or None, *(col[i] for col in ints))
+        for field, col in zip(AGAINST_FIELDS, floats):
+            setattr(p, field, col[i])
+        stats[name.lower()] = p
+    return stats
+
+
+_shared: Dict[str, Dict[str, Pokemon]] = {}
+_shared_lock = threading.Lock()
+
+
+def get_pokemon_stats(csv_path: str = None) -> Dict[str, Pokemon]:
+    """
+    The stats of csv_path (default: the bundled CSV), loaded once per
+    process and shared by every caller, e.g. every Protocols instance.
+    Treat the result as read-only.
+    """
+    key = os.path.abspath(csv_path or DEFAULT_CSV)
+    with _shared_lock:
+        stats = _shared.get(key)
+        if stats is None:
+            stats = _shared[key] = load_pokemon_stats(key)
+    return stats
+
+
 
 def get_by_name(name: str, stats: Dict[str, Pokemon]) -> Optional[Pokemon]:
     if not name:
@@ -0,0 +1,252 @@
+# game/pokemon_table.py
+
+"""
+Pokemon stats as a column store.
+
+PokemonTable keeps one typed array per stat (array("i")), the 18
+against_* multipliers in a single array("d") of defensive vectors
+(Pokemon i's multiplier against type t is defense[i * 18 + t], t being
+the game.type_chart index), the types as one-byte type indexes and the
+names in a list. A Pokemon costs about
+170 bytes of arrays plus its name, instead of a dataclass with 26
+attributes and the 41-string CSV row.
+
+Rows are PokemonRow views: two slots (table, index) and properties that
+read the columns, so looking one up allocates nothing per field. They
+also answer row["sp_attack"] / row["against_fire"] like the dicts the
+damage calculator takes. The full CSV row (PokemonRow.raw) is read from
+the CSV only when asked for.
+
+The columns come straight from the compiled stats cache
+(game.stats_cache): loading is a few array copies, no per-row Python.
+With NumPy installed, stat_array() and defense_array() are zero-copy
+ndarray views of the same memory for vectorized work.
+"""
+
+import csv
+import sys
+import os
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from game.pokemon_stats import DEFAULT_CSV, STAT_FIELDS, load_pokemon_columns
+from game.stats_cache import INT_MISSING, Columns
+from game.type_chart import AGAINST_FIELDS, NO_TYPE, NUM_TYPES, TYPE_NAMES, dual_multiplier, type_index
+
+try:
+    import numpy as np
+except ImportError:   # optional: only the *_array() views need it
+    np = None
+
+
+class PokemonTable:
+    def __init__(self, columns: Columns, csv_path: Optional[str] = None):
+        count = len(columns)
+        self.csv_path = csv_path
+        self.names: List[str] = columns.names
+        self._index: Dict[str, int] = {name.lower(): i for i, name in enumerate(columns.names)}
+
+        self.type1 = array("b", map(type_index, columns.type1))   # NO_TYPE when missing
+        self.type2 = array("b", map(type_index, columns.type2))
+
+        self.stats: Dict[str, array] = {field: columns.ints[field] for field in STAT_FIELDS}
+        self.defense = array("d", [1.0]) * (count * NUM_TYPES)
+        for t, field in enumerate(AGAINST_FIELDS):
+            self.defense[t::NUM_TYPES] = columns.floats[field]
+        self._type_of_field = {field: t for t, field in enumerate(AGAINST_FIELDS)}
+
+    @classmethod
+    def load(cls, csv_path: Optional[str] = None) -> "PokemonTable":
+        csv_path = csv_path or DEFAULT_CSV
+        return cls(load_pokemon_columns(csv_path), csv_path)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator["PokemonRow"]:
+        return (PokemonRow(self, i) for i in range(len(self.names)))
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and name.strip().lower() in self._index
+
+    # ---------- lookups ----------
+
+    def index_of(self, name: str) -> Optional[int]:
+        index = self._index.get(name)
+        if index is None and name:
+            index = self._index.get(name.strip().lower())
+        return index
+
+    def get(self, name: str, default=None) -> Optional["PokemonRow"]:
+        """The row for name (any case), like dict.get, so pokemon_stats.get_by_name() works on a table."""
+        index = self.index_of(name)
+        return default if index is None else PokemonRow(self, index)
+
+    def row(self, index: int) -> "PokemonRow":
+        if not 0 <= index < len(self.names):
+            raise IndexError(index)
+        return PokemonRow(self, index)
+
+    def stat(self, field: str, index: int) -> Optional[int]:
+        value = self.stats[field][index]
+        return None if value == INT_MISSING else value
+
+    def multiplier(self, field: str, index: int) -> float:
+        """Pokemon index's against_* value, e.g. multiplier("against_fire", i)."""
+        return self.defense[index * NUM_TYPES + self._type_of_field[field]]
+
+    def effectiveness(self, index: int, type1: int, type2: int = NO_TYPE) -> float:
+        """Multiplier of a type1/type2 attack (type indexes) against Pokemon index."""
+        return dual_multiplier(self.defense, type1, type2, index * NUM_TYPES)
+
+    def defense_vector(self, index: int) -> array:
+        start = index * NUM_TYPES
+        return self.defense[start:start + NUM_TYPES]
+
+    def type_name(self, code: int) -> Optional[str]:
+        return TYPE_NAMES[code] if code != NO_TYPE else None
+
+    def raw(self, index: int) -> Dict[str, str]:
+        """The Pokemon's full CSV row, read from the CSV now (for debugging)."""
+        if self.csv_path is None:
+            raise ValueError("table was not loaded from a CSV")
+        name = self.names[index]
+        with open(self.csv_path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                if row.get("name", "").strip() == name:
+                    return row
+        raise KeyError(name)
+
+    # ---------- NumPy views ----------
+
+    def stat_array(self, field: str):
+        """stats[field] as an int32 ndarray sharing the table's memory (missing values are INT_MISSING)."""
+        _require_numpy()
+        return np.frombuffer(self.stats[field], dtype=np.int32)
+
+    def defense_array(self):
+        """The defensive vectors as an (N, 18) float64 ndarray view, [Pokemon, attacking type]."""
+        _require_numpy()
+        return np.frombuffer(self.defense, dtype=np.float64).reshape(len(self.names), NUM_TYPES)
+
+    def type_arrays(self):
+        """type1 and type2 as int8 ndarrays (NO_TYPE when missing)."""
+        _require_numpy()
+        return np.frombuffer(self.type1, dtype=np.int8), np.frombuffer(self.type2, dtype=np.int8)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the columns (arrays, name strings and the name index)."""
+        arrays = [self.type1, self.type2, self.defense, *self.stats.values()]
+        total = sum(a.itemsize * len(a) for a in arrays)
+        total += sys.getsizeof(self.names) + sum(sys.getsizeof(n) for n in self.names)
+        total += sys.getsizeof(self._index)
+        return total
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is not installed")
+
+
+class PokemonRow:
+    """One Pokemon of a PokemonTable (a view: reads the table's columns)."""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: PokemonTable, index: int):
+        self.table = table
+        self.index = index
+
+    def __repr__(self) -> str:
+        return f"PokemonRow({self.name!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PokemonRow) and other.table is self.table and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.table), self.index))
+
+    @property
+    def name(self) -> str:
+        return self.table.names[self.index]
+
+    @property
+    def type1(self) -> Optional[str]:
+        return self.table.type_name(self.table.type1[self.index])
+
+    @property
+    def type2(self) -> Optional[str]:
+        return self.table.type_name(self.table.type2[self.index])
+
+    @property
+    def hp(self) -> Optional[int]:
+        return self.table.stat("hp", self.index)
+
+    @property
+    def attack(self) -> Optional[int]:
+        return self.table.stat("attack", self.index)
+
+    @property
+    def defense(self) -> Optional[int]:
+        return self.table.stat("defense", self.index)
+
+    @property
+    def sp_attack(self) -> Optional[int]:
+        return self.table.stat("sp_attack", self.index)
+
+    @property
+    def sp_defense(self) -> Optional[int]:
+        return self.table.stat("sp_defense", self.index)
+
+    @property
+    def raw(self) -> Dict[str, str]:
+        return self.table.raw(self.index)
+
+    @property
+    def types(self) -> Tuple[int, int]:
+        """(type1, type2) as type indexes."""
+        return self.table.type1[self.index], self.table.type2[self.index]
+
+    @property
+    def defense_vector(self) -> array:
+        return self.table.defense_vector(self.index)
+
+    def effectiveness(self, type1: int, type2: int = NO_TYPE) -> float:
+        return self.table.effectiveness(self.index, type1, type2)
+
+    def __getitem__(self, key: str):
+        """row["hp"], row["type1"], row["against_fire"], ... as in pokemon_to_dict()."""
+        if key.startswith("against_"):
+            return self.table.multiplier(key, self.index)
+        if key in STAT_FIELDS:
+            return self.table.stat(key, self.index)
+        if key in ("name", "type1", "type2"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> dict:
+        d = {"name": self.name, "type1": self.type1, "type2": self.type2}
+        d.update((field, self.table.stat(field, self.index)) for field in STAT_FIELDS)
+        d.update((field, self.table.multiplier(field, self.index)) for field in AGAINST_FIELDS)
+        return d
+
+
+_shared: Dict[str, PokemonTable] = {}
+_shared_lock = threading.Lock()
+
+
+def get_pokemon_table(csv_path: Optional[str] = None) -> PokemonTable:
+    """The table of csv_path (default: the bundled CSV), loaded once per process."""
+    key = os.path.abspath(csv_path or DEFAULT_CSV)
+    with _shared_lock:
+        table = _shared.get(key)
+        if table is None:
+            table = _shared[key] = PokemonTable.load(key)
+    return table
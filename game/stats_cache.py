@@ -0,0 +1,162 @@
+# game/stats_cache.py
+
+"""
+Compiled, column-oriented cache of a parsed stats CSV.
+
+Parsing game/pokemon.csv with csv.DictReader and converting every field
+takes tens of milliseconds; this file lets later starts skip it. The
+cache sits next to the CSV (pokemon.csv -> pokemon.csv.cache) and is
+laid out so it can be read with a handful of array.frombytes() calls
+(or memory-mapped and viewed in place):
+
+    header      magic "PKSC", format version, the CSV's mtime_ns, size
+                and SHA-256, row count
+    layout      JSON: the int and float column names, in file order
+    strings     names, type1s and type2s, NUL-separated UTF-8
+    columns     one little-endian int32 array per int column (None is
+                stored as INT_MISSING), then one float64 array per
+                float column, each `count` items long
+
+A cache is used if the CSV's mtime and size still match; if they do not
+(e.g. after a fresh checkout) the CSV is hashed and the cache is still
+used when the content is unchanged. Otherwise, or if the column layout
+or format version differs, the caller re-parses the CSV and writes a new
+cache (via a temp file and rename, so readers never see half a file).
+A cache that cannot be written (read-only install) is simply skipped.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from chat.verbose_mode import VerboseManager
+
+MAGIC = b"PKSC"
+CACHE_VERSION = 2
+INT_MISSING = -2 ** 31
+_HEADER = struct.Struct("<4sHxxqq32sI")
+_U32 = struct.Struct("<I")
+
+
+class Columns:
+    """Parsed CSV data, one list/array per column."""
+
+    def __init__(self, names: List[str], type1: List[str], type2: List[str],
+                 ints: Dict[str, array], floats: Dict[str, array]):
+        self.names = names
+        self.type1 = type1      # "" when missing
+        self.type2 = type2
+        self.ints = ints        # column -> array("i"), INT_MISSING for missing
+        self.floats = floats    # column -> array("d")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def cache_path_for(csv_path: str) -> str:
+    return csv_path + ".cache"
+
+
+def _log(*args):
+    if VerboseManager.is_verbose():
+        print("[STATS_CACHE]", *args)
+
+
+def file_sha256(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def write_cache(cache_path: str, csv_path: str, columns: Columns, digest: Optional[bytes] = None) -> bool:
+    """Write columns as the cache of csv_path. Returns False if the cache could not be written."""
+    st = os.stat(csv_path)
+    digest = digest or file_sha256(csv_path)
+    layout = json.dumps({"ints": list(columns.ints), "floats": list(columns.floats)}).encode("utf-8")
+    strings = "\0".join(columns.names + columns.type1 + columns.type2).encode("utf-8")
+    parts = [
+        _HEADER.pack(MAGIC, CACHE_VERSION, st.st_mtime_ns, st.st_size, digest, len(columns)),
+        _U32.pack(len(layout)), layout,
+        _U32.pack(len(strings)), strings,
+    ]
+    parts += [_little_endian(values) for values in columns.ints.values()]
+    parts += [_little_endian(values) for values in columns.floats.values()]
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".", prefix=".stats_", suffix=".part")
+    except OSError as e:
+        _log("Not writing cache:", e)
+        return False
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.writelines(parts)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        _log("Not writing cache:", e)
+        os.remove(tmp_path)
+        return False
+    return True
+
+
+def read_cache(cache_path: str, csv_path: str, int_fields: Sequence[str],
+               float_fields: Sequence[str]) -> Optional[Columns]:
+    """The cached columns if the cache exists and still matches csv_path, else None."""
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+        st = os.stat(csv_path)
+    except OSError:
+        return None
+    view = memoryview(data)
+    try:
+        magic, version, mtime_ns, size, digest, count = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != CACHE_VERSION:
+            return None
+        if (mtime_ns, size) != (st.st_mtime_ns, st.st_size):
+            # touched (or checked out again) but maybe not changed
+            if size != st.st_size or file_sha256(csv_path) != digest:
+                _log("CSV changed, cache is stale")
+                return None
+        offset = _HEADER.size
+        (length,) = _U32.unpack_from(view, offset)
+        layout = json.loads(bytes(view[offset + 4:offset + 4 + length]))
+        if layout != {"ints": list(int_fields), "floats": list(float_fields)}:
+            return None
+        offset += 4 + length
+        (length,) = _U32.unpack_from(view, offset)
+        strings = str(view[offset + 4:offset + 4 + length], "utf-8").split("\0") if count else []
+        offset += 4 + length
+        if len(strings) != 3 * count:
+            return None
+        ints, floats = {}, {}
+        for fields, out, typecode, width in ((int_fields, ints, "i", 4), (float_fields, floats, "d", 8)):
+            for field in fields:
+                end = offset + count * width
+                if end > len(view):
+                    return None
+                out[field] = _from_little_endian(typecode, view[offset:end])
+                offset = end
+    except (struct.error, ValueError, UnicodeDecodeError):
+        return None
+    return Columns(strings[:count], strings[count:2 * count], strings[2 * count:], ints, floats)
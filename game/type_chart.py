@@ -0,0 +1,140 @@
+# game/type_chart.py
+
+"""
+Type registry and type-effectiveness engine.
+
+Every type has a small integer index (TYPE_INDEX, in the order of the
+CSV's against_* columns); NO_TYPE (-1) stands for "no second type".
+Effectiveness is then plain integer indexing into flat float arrays:
+
+    CHART[attacking * NUM_TYPES + defending]
+        the standard single-type chart (18 x 18, row-major)
+    vector[offset + attacking]
+        a Pokemon's defensive vector: the multipliers of attacks of
+        each type against it, as its against_* columns give them
+        (see PokemonTable.defense), or defense_vector() for a type pair
+
+A dual-type attacker's multiplier is the product of its two types'
+entries (dual_multiplier). dual_multipliers() does the same for whole
+arrays of attackers and defenders, with NumPy when it is installed.
+
+The defensive vectors come from the CSV rather than from the chart: the
+bundled data has forms whose multipliers differ from what their types
+alone would give, and the game follows the data.
+"""
+
+from array import array
+from typing import Dict, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:   # optional: the batch functions fall back to plain Python
+    np = None
+
+TYPE_NAMES = (
+    "bug", "dark", "dragon", "electric", "fairy", "fighting", "fire", "flying", "ghost",
+    "grass", "ground", "ice", "normal", "poison", "psychic", "rock", "steel", "water",
+)
+NUM_TYPES = len(TYPE_NAMES)
+NO_TYPE = -1
+
+TYPE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(TYPE_NAMES)}
+TYPE_INDEX["fight"] = TYPE_INDEX["fighting"]   # as in the CSV's against_fight
+
+# the CSV column holding the multiplier against each type, by index
+AGAINST_FIELDS = tuple("against_fight" if name == "fighting" else f"against_{name}" for name in TYPE_NAMES)
+
+# attacking type -> {defending type: multiplier} for every entry that is not 1
+_NOT_NEUTRAL = {
+    "normal": {"rock": 0.5, "ghost": 0.0, "steel": 0.5},
+    "fire": {"fire": 0.5, "water": 0.5, "grass": 2.0, "ice": 2.0, "bug": 2.0, "rock": 0.5, "dragon": 0.5,
+             "steel": 2.0},
+    "water": {"fire": 2.0, "water": 0.5, "grass": 0.5, "ground": 2.0, "rock": 2.0, "dragon": 0.5},
+    "electric": {"water": 2.0, "electric": 0.5, "grass": 0.5, "ground": 0.0, "flying": 2.0, "dragon": 0.5},
+    "grass": {"fire": 0.5, "water": 2.0, "grass": 0.5, "poison": 0.5, "ground": 2.0, "flying": 0.5, "bug": 0.5,
+              "rock": 2.0, "dragon": 0.5, "steel": 0.5},
+    "ice": {"fire": 0.5, "water": 0.5, "grass": 2.0, "ice": 0.5, "ground": 2.0, "flying": 2.0, "dragon": 2.0,
+            "steel": 0.5},
+    "fighting": {"normal": 2.0, "ice": 2.0, "poison": 0.5, "flying": 0.5, "psychic": 0.5, "bug": 0.5,
+                 "rock": 2.0, "ghost": 0.0, "dark": 2.0, "steel": 2.0, "fairy": 0.5},
+    "poison": {"grass": 2.0, "poison": 0.5, "ground": 0.5, "rock": 0.5, "ghost": 0.5, "steel": 0.0, "fairy": 2.0},
+    "ground": {"fire": 2.0, "electric": 2.0, "grass": 0.5, "poison": 2.0, "flying": 0.0, "bug": 0.5, "rock": 2.0,
+               "steel": 2.0},
+    "flying": {"electric": 0.5, "grass": 2.0, "fighting": 2.0, "bug": 2.0, "rock": 0.5, "steel": 0.5},
+    "psychic": {"fighting": 2.0, "poison": 2.0, "psychic": 0.5, "dark": 0.0, "steel": 0.5},
+    "bug": {"fire": 0.5, "grass": 2.0, "fighting": 0.5, "poison": 0.5, "flying": 0.5, "psychic": 2.0,
+            "ghost": 0.5, "dark": 2.0, "steel": 0.5, "fairy": 0.5},
+    "rock": {"fire": 2.0, "ice": 2.0, "fighting": 0.5, "ground": 0.5, "flying": 2.0, "bug": 2.0, "steel": 0.5},
+    "ghost": {"normal": 0.0, "psychic": 2.0, "ghost": 2.0, "dark": 0.5},
+    "dragon": {"dragon": 2.0, "steel": 0.5, "fairy": 0.0},
+    "dark": {"fighting": 0.5, "psychic": 2.0, "ghost": 2.0, "dark": 0.5, "fairy": 0.5},
+    "steel": {"fire": 0.5, "water": 0.5, "electric": 0.5, "ice": 2.0, "rock": 2.0, "steel": 0.5, "fairy": 2.0},
+    "fairy": {"fire": 0.5, "fighting": 2.0, "poison": 0.5, "dragon": 2.0, "dark": 2.0, "steel": 0.5},
+}
+
+
+def _build_chart() -> array:
+    chart = array("d", [1.0]) * (NUM_TYPES * NUM_TYPES)
+    for attacking, row in _NOT_NEUTRAL.items():
+        for defending, multiplier in row.items():
+            chart[TYPE_INDEX[attacking] * NUM_TYPES + TYPE_INDEX[defending]] = multiplier
+    return chart
+
+
+CHART = _build_chart()
+
+
+def type_index(name: Optional[str]) -> int:
+    """The index of a type name (any case); NO_TYPE for None or ""."""
+    if not name:
+        return NO_TYPE
+    try:
+        return TYPE_INDEX[name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown type: {name!r}") from None
+
+
+def effectiveness(attacking: int, defending: int) -> float:
+    """Chart multiplier of one attacking type against one defending type (NO_TYPE: 1.0)."""
+    if attacking == NO_TYPE or defending == NO_TYPE:
+        return 1.0
+    return CHART[attacking * NUM_TYPES + defending]
+
+
+def defense_vector(type1: int, type2: int = NO_TYPE) -> array:
+    """The chart's multipliers of every attacking type against a type1/type2 Pokemon."""
+    return array("d", (effectiveness(t, type1) * effectiveness(t, type2) for t in range(NUM_TYPES)))
+
+
+def dual_multiplier(vector: Sequence[float], type1: int, type2: int = NO_TYPE, offset: int = 0) -> float:
+    """Multiplier of a type1/type2 attacker against the defensive vector at vector[offset:offset + 18]."""
+    multiplier = vector[offset + type1] if type1 != NO_TYPE else 1.0
+    if type2 != NO_TYPE:
+        multiplier *= vector[offset + type2]
+    return multiplier
+
+
+def dual_multipliers(vectors, defenders, type1s, type2s):
+    """
+    dual_multiplier() for many pairs at once: the multiplier of attacker
+    types (type1s[k], type2s[k]) against defender defenders[k], where
+    vectors holds the defensive vectors row by row (N * 18 floats, e.g.
+    PokemonTable.defense). Returns an ndarray with NumPy, else a list.
+    """
+    if np is not None:
+        matrix = np.asarray(vectors, dtype=np.float64).reshape(-1, NUM_TYPES)
+        defenders = np.asarray(defenders, dtype=np.intp)
+        type1s = np.asarray(type1s, dtype=np.intp)
+        type2s = np.asarray(type2s, dtype=np.intp)
+        first = np.where(type1s >= 0, matrix[defenders, np.maximum(type1s, 0)], 1.0)
+        second = np.where(type2s >= 0, matrix[defenders, np.maximum(type2s, 0)], 1.0)
+        return first * second
+    return [dual_multiplier(vectors, t1, t2, d * NUM_TYPES) for d, t1, t2 in zip(defenders, type1s, type2s)]
+
+
+def chart_array():
+    """CHART as an (18, 18) ndarray, [attacking, defending]."""
+    if np is None:
+        raise RuntimeError("NumPy is not installed")
+    return np.frombuffer(CHART, dtype=np.float64).reshape(NUM_TYPES, NUM_TYPES)
+
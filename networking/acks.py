@@ -0,0 +1,81 @@
+# networking/acks.py
+
+"""
+ACK bookkeeping for delayed, coalesced and piggybacked acknowledgements.
+
+Instead of one {"message_type": "ACK"} datagram per message, the
+receiver remembers what it owes each peer and sends it as three fields:
+
+    ack       largest sequence number received
+    ack_cum   every sequence number <= ack_cum was received (cumulative)
+    ack_bits  bitmap below `ack` (SACK): bit n set -> ack - n received
+
+These ride on the next data message to that peer, or go out as one pure
+ACK after a short delay. A pure ACK also carries "sequence_number" (the
+same value as ack) so a peer that only understands single-message ACKs
+still gets the newest one.
+"""
+
+from typing import Any, Dict, Optional
+
+from networking.replay_window import ReplayWindow
+
+ACK_FIELDS = ("ack", "ack_cum", "ack_bits")
+
+
+class AckState:
+    """What we have received from one peer, and whether we still owe an ACK."""
+
+    def __init__(self, bits: int = 64):
+        self.window = ReplayWindow(bits)
+        self.cumulative = 0
+        self.pending = 0                   # ACKs requested since the last one went out
+        self.deadline: Optional[float] = None
+
+    def record(self, seq: int) -> bool:
+        """
+        Note that seq must be acknowledged. Returns False if seq is so far
+        ahead of / behind the window that the bitmap cannot describe it;
+        the caller should then ACK it on its own right away.
+        """
+        if seq <= self.cumulative:
+            self.pending += 1              # retransmission: our earlier ACK was lost
+            return True
+        if seq < self.window.highest - self.window.size + 1:
+            return False
+        self.window.check_and_update(seq)
+        while self._has(self.cumulative + 1):
+            self.cumulative += 1
+        self.pending += 1
+        return True
+
+    def _has(self, seq: int) -> bool:
+        offset = self.window.highest - seq
+        if offset < 0 or offset >= self.window.size:
+            return False
+        return bool(self.window.bitmap >> offset & 1)
+
+    def fields(self) -> Dict[str, int]:
+        return {
+            "ack": self.window.highest,
+            "ack_cum": self.cumulative,
+            "ack_bits": self.window.bitmap,
+        }
+
+    def clear_pending(self):
+        self.pending = 0
+        self.deadline = None
+
+
+def acked_by(seq: int, fields: Dict[str, Any], bits: int = 64) -> bool:
+    """True if the ACK fields (see module docstring) cover seq."""
+    return covers(seq, int(fields.get("ack", -1)), int(fields.get("ack_cum", 0)),
+                  int(fields.get("ack_bits", 0)), bits)
+
+
+def covers(seq: int, largest: int, cumulative: int, bitmap: int, bits: int = 64) -> bool:
+    """acked_by() on already extracted ack / ack_cum / ack_bits values."""
+    if seq == largest or seq <= cumulative:
+        return True
+    offset = largest - seq
+    return 0 < offset < bits and bool(bitmap >> offset & 1)
@@ -0,0 +1,179 @@
+# networking/async_udp.py
+
+import asyncio
+import socket
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from networking.udp import ReliableUDP
+
+
+class _ReliableDatagramProtocol(asyncio.DatagramProtocol):
+    """Feeds datagrams from the event loop into an AsyncReliableUDP."""
+
+    def __init__(self, owner: "AsyncReliableUDP"):
+        self.owner = owner
+
+    def connection_made(self, transport):
+        self.owner.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        self.owner.stats["rx_bytes_allocated"] += len(data)  # the loop's own copy
+        self.owner._handle_datagram(data, addr)
+
+    def error_received(self, exc: Exception):
+        # e.g. ICMP port unreachable when the peer is not up yet; the
+        # retransmission timer deals with it, so just note it.
+        self.owner.log("Socket error:", exc)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.owner._fail_pending()
+
+
+class AsyncReliableUDP(ReliableUDP):
+    """
+    ReliableUDP running on an asyncio.DatagramProtocol.
+
+    Same reliability as ReliableUDP (sliding window, adaptive RTO,
+    per-peer duplicate windows) but event-driven instead of blocking:
+
+    - ACKs complete the matching send() future as soon as they arrive.
+    - Every other message is queued for `await recv()`, so nothing that
+      arrives while we wait for an ACK is thrown away.
+    - Retransmissions are driven by a timer task on the same loop.
+
+    API differences from ReliableUDP:
+        send()            -> returns an asyncio.Future[bool]
+        send_reliable()   -> coroutine, `await` it for the bool
+        recv()            -> coroutine returning (msg_dict, addr) or None
+        send_ack(), send_unreliable(), is_duplicate(), rtt_stats() are
+        unchanged (they never block).
+
+    Create with:
+        reliable = await AsyncReliableUDP.create(sock, parser, ...)
+
+    With recv_into=True the socket is read directly with a loop reader
+    and recvfrom_into() into the pooled buffers, instead of through the
+    DatagramProtocol (which hands over a fresh bytes object for every
+    datagram). Sending is then a plain non-blocking sendto().
+    """
+
+    def __init__(self, socket_obj: socket.socket, parser, **kwargs):
+        super().__init__(socket_obj, parser, **kwargs)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._loop = asyncio.get_running_loop()
+        self._queue: "asyncio.Queue[Tuple[Dict[str, Any], Any]]" = asyncio.Queue()
+        self._timer_wakeup = asyncio.Event()
+        self._timer_task: Optional[asyncio.Task] = None
+        self._reading = False
+
+    @classmethod
+    async def create(cls, socket_obj: socket.socket, parser, recv_into: bool = False,
+                     **kwargs) -> "AsyncReliableUDP":
+        """Wrap an already created (and, for servers, bound) UDP socket."""
+        self = cls(socket_obj, parser, **kwargs)
+        socket_obj.setblocking(False)
+        if recv_into:
+            try:
+                self._loop.add_reader(socket_obj.fileno(), self._on_readable)
+                self._reading = True
+            except NotImplementedError:
+                pass  # e.g. the Windows proactor loop has no add_reader()
+        if not self._reading:
+            await self._loop.create_datagram_endpoint(
+                lambda: _ReliableDatagramProtocol(self),
+                sock=socket_obj,
+            )
+        self._timer_task = self._loop.create_task(self._timer_loop())
+        return self
+
+    def close(self):
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            self._timer_task = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        if self._reading:
+            self._loop.remove_reader(self.sock.fileno())
+            self._reading = False
+            self.sock.close()
+        self._fail_pending()
+
+    # ---------- I/O hooks ----------
+
+    def _new_future(self):
+        return self._loop.create_future()
+
+    def _sendto(self, payload: bytes, addr):
+        if self._reading:
+            try:
+                self.sock.sendto(payload, addr)
+            except OSError as e:
+                # full send buffer or ICMP error: same as a lost datagram
+                self.log("Socket error:", e)
+            return
+        if self.transport is None:
+            self.log("Transport closed; dropping datagram to", addr)
+            return
+        self.transport.sendto(payload, addr)
+
+    def _on_readable(self):
+        """Loop reader callback: drain every queued datagram."""
+        while self._reading:
+            try:
+                self._receive_into()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.log("Socket error:", e)
+
+    def _deliver(self, msg: Dict[str, Any], addr):
+        self._queue.put_nowait((msg, addr))
+
+    def _timers_changed(self):
+        self._timer_wakeup.set()
+
+    def _fail_pending(self):
+        """Resolve every send() future to False: nothing more will be sent or ACKed."""
+        # empty the backlogs first, or _finish() would start them on the closed transport
+        backlog = [entry for entries in self._backlog.values() for entry in entries]
+        self._backlog.clear()
+        for key in list(self._in_flight):
+            self._finish(key, False)
+        for entry in backlog:
+            if not entry.future.done():
+                entry.future.set_result(False)
+
+    # ---------- coroutine API ----------
+
+    async def send_reliable(self, message_dict: Dict[str, Any], addr, urgent: bool = False) -> bool:
+        """Send message_dict reliably and wait (without blocking the loop) for its ACK."""
+        return await self.send(message_dict, addr, urgent=urgent)
+
+    async def recv(self, timeout: Optional[float] = None):
+        """Next non-ACK message as (msg_dict, addr), or None after timeout seconds."""
+        if timeout is None:
+            return await self._queue.get()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def poll(self, timeout: Optional[float] = None):
+        raise NotImplementedError("AsyncReliableUDP is event-driven; await recv() instead.")
+
+    # ---------- retransmission timer ----------
+
+    async def _timer_loop(self):
+        while True:
+            wait = None
+            next_deadline = self._next_deadline()
+            if next_deadline is not None:
+                wait = max(0.0, next_deadline - time.monotonic())
+            self._timer_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._timer_wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            self._service_timers()
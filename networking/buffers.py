@@ -0,0 +1,36 @@
+# networking/buffers.py
+
+from typing import List
+
+MAX_DATAGRAM = 65535
+
+
+class BufferPool:
+    """
+    Preallocated receive buffers for socket.recvfrom_into().
+
+    The receive path borrows a bytearray, reads a datagram into it and
+    hands a memoryview slice of it to the parser, then gives it back.
+    No per-datagram buffer is allocated unless more than `count`
+    datagrams are being processed at once (e.g. re-entrant callbacks);
+    that is counted in `misses`, and `allocated` is the total bytes the
+    pool has ever allocated.
+    """
+
+    def __init__(self, count: int = 4, size: int = MAX_DATAGRAM):
+        self.count = count
+        self.size = size
+        self._free: List[bytearray] = [bytearray(size) for _ in range(count)]
+        self.allocated = count * size
+        self.misses = 0
+
+    def acquire(self) -> bytearray:
+        if self._free:
+            return self._free.pop()
+        self.misses += 1
+        self.allocated += self.size
+        return bytearray(self.size)
+
+    def release(self, buf: bytearray):
+        if len(self._free) < self.count:
+            self._free.append(buf)
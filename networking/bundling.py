@@ -0,0 +1,141 @@
+# networking/bundling.py
+
+"""
+Packs several small JSON messages for the same peer into one datagram.
+
+A bundle is the magic prefix followed by the encoded messages separated
+by newlines. json.dumps never emits a raw newline, so splitting is a
+plain bytes.split() with no JSON parsing:
+
+    b"PB\\n" + b'{"message_type": "ACK", ...}' + b"\\n" + b'{"message_type": "CHAT_MESSAGE", ...}'
+
+Binary-codec messages may contain newline bytes, so a bundle holding
+any of them uses a length-prefixed layout instead (u16 length per part):
+
+    b"PL" + b"\x00\x2a" + <42 bytes> + b"\x01\x07" + <263 bytes> ...
+
+A bundle holding a single message is sent as that message alone, so a
+quiet link sees exactly the same datagrams as without bundling.
+"""
+
+import re
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from networking.codecs import BINARY_MARKER
+
+BUNDLE_MAGIC = b"PB\n"
+SEPARATOR = b"\n"
+PREFIXED_MAGIC = b"PL"
+_LENGTH = struct.Struct("!H")
+_SEPARATOR_RE = re.compile(re.escape(SEPARATOR))
+
+
+def is_bundle(data) -> bool:
+    return data[:3] == BUNDLE_MAGIC or data[:2] == PREFIXED_MAGIC
+
+
+def split_bundle(data) -> List[memoryview]:
+    """The messages in a bundle, as memoryview slices of data (no copies)."""
+    if data[:2] == PREFIXED_MAGIC:
+        return _split_prefixed(memoryview(data))
+    view = memoryview(data)[len(BUNDLE_MAGIC):]
+    parts, start = [], 0
+    for match in _SEPARATOR_RE.finditer(view):
+        parts.append(view[start:match.start()])
+        start = match.end()
+    parts.append(view[start:])
+    return parts
+
+
+def _split_prefixed(view: memoryview) -> List[memoryview]:
+    parts, offset = [], len(PREFIXED_MAGIC)
+    while offset + _LENGTH.size <= len(view):
+        (length,) = _LENGTH.unpack_from(view, offset)
+        offset += _LENGTH.size
+        if offset + length > len(view):
+            break  # truncated: keep the complete parts
+        parts.append(view[offset:offset + length])
+        offset += length
+    return parts
+
+
+def message_count(datagram: bytes) -> int:
+    """How many messages a datagram carries (1 unless it is a bundle)."""
+    if datagram[:3] == BUNDLE_MAGIC:
+        # magic ends in a newline and parts are newline-separated: one per part
+        return datagram.count(SEPARATOR)
+    if datagram[:2] == PREFIXED_MAGIC:
+        return len(_split_prefixed(memoryview(datagram)))
+    return 1
+
+
+def can_bundle(payload: bytes) -> bool:
+    """Only whole messages (JSON or binary codec) go in a bundle, not fragments."""
+    return payload[:1] == b"{" or payload[:1] == bytes((BINARY_MARKER,))
+
+
+@dataclass
+class _Bundle:
+    deadline: float
+    parts: List[bytes] = field(default_factory=list)
+    size: int = len(BUNDLE_MAGIC)
+
+
+class Bundler:
+    """
+    Nagle-style coalescing of outgoing messages per peer.
+
+    add() returns the datagrams that must go out now: a bundle is sent
+    when the next message would push it past mtu, when an urgent message
+    is added (it goes out together with whatever was waiting), or when
+    its flush deadline (`delay` seconds after the first message) passes.
+    """
+
+    def __init__(self, mtu: int = 1200, delay: float = 0.005):
+        self.mtu = mtu
+        self.delay = delay
+        self._pending: Dict[Any, _Bundle] = {}
+
+    def add(self, addr, payload: bytes, urgent: bool = False,
+            now: Optional[float] = None) -> List[bytes]:
+        if now is None:
+            now = time.monotonic()
+        ready = []
+        bundle = self._pending.get(addr)
+        if bundle is not None and bundle.size + len(payload) + _LENGTH.size > self.mtu:
+            ready.append(self._take(addr))
+            bundle = None
+        if bundle is None:
+            bundle = _Bundle(deadline=now + self.delay)
+            self._pending[addr] = bundle
+
+        bundle.parts.append(payload)
+        bundle.size += len(payload) + _LENGTH.size    # worst case: length-prefixed
+        if urgent or self.delay <= 0 or bundle.size >= self.mtu:
+            ready.append(self._take(addr))
+        return ready
+
+    def next_deadline(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        return min(b.deadline for b in self._pending.values())
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[Any, bytes]]:
+        """Bundles whose flush deadline has passed, as (addr, datagram)."""
+        if now is None:
+            now = time.monotonic()
+        return [(addr, self._take(addr)) for addr, b in list(self._pending.items()) if b.deadline <= now]
+
+    def flush(self, addr=None) -> List[Tuple[Any, bytes]]:
+        return [(a, self._take(a)) for a in list(self._pending) if addr is None or a == addr]
+
+    def _take(self, addr) -> bytes:
+        parts = self._pending.pop(addr).parts
+        if len(parts) == 1:
+            return parts[0]
+        if all(part[:1] == b"{" for part in parts):
+            return BUNDLE_MAGIC + SEPARATOR.join(parts)
+        return PREFIXED_MAGIC + b"".join(_LENGTH.pack(len(part)) + part for part in parts)
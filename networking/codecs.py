@@ -0,0 +1,297 @@
+# networking/codecs.py
+
+"""
+Wire codecs for MessageParser.
+
+A codec turns a message dict into the bytes of one datagram and back.
+Every codec starts its output with a different first byte, so the
+receiver can decode without knowing which codec the peer picked:
+
+    "{"   JsonCodec    the original JSON text (always available)
+    0xB1  BinaryCodec  compact binary, chosen at handshake
+
+Binary layout (network byte order):
+
+    marker   B   0xB1
+    type     B   message type id (networking.schema), 0 = unknown type
+    present  H   bit n set -> field n of the layout is in the message,
+                 bit 15 -> a JSON object with any leftover fields follows
+    fields       in schema order; sequence_number is always field 0 so
+                 it sits at a fixed offset (4) whenever it is present
+
+Field kinds:
+
+    u32 / i32 / u64   fixed-size integers
+    str               u16 length + UTF-8
+    b64               attachment: the dict holds base64 text, the wire
+                      holds the raw bytes (u32 length + bytes)
+    json              u32 length + compact JSON (nested data)
+    (sub-fields)      nested dict with exactly those keys, packed inline
+
+Both codecs put message_type and sequence_number where peek() can read
+them without decoding the rest (JSON: ReliableUDP writes
+sequence_number as the first key), so the transport can handle ACKs
+and duplicates from the header alone.
+
+A value that does not fit its kind (a bool, a float, an out of range
+int, an unexpected nested shape...) is not an error: it simply travels
+in the trailing JSON object, so every dict round-trips unchanged.
+"""
+
+import base64
+import json
+import re
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from networking.schema import REGISTRY, SchemaRegistry
+
+BINARY_MARKER = 0xB1
+_EXTRA_BIT = 1 << 15
+
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_INTS = {"u32": struct.Struct("!I"), "i32": struct.Struct("!i"), "u64": struct.Struct("!Q")}
+_HEADER = struct.Struct("!BBH")
+
+# pure ACKs exactly as ReliableUDP writes them (ACK fields absent on single-message ACKs)
+_JSON_ACK = re.compile(
+    rb'\{"message_type": "ACK", "sequence_number": (\d+)'
+    rb'(?:, "ack": (\d+), "ack_cum": (\d+), "ack_bits": (\d+))?\}'
+)
+_JSON_SEQ_FIRST = re.compile(rb'\{"sequence_number": (\d+), "message_type": "([A-Z_]+)"')
+
+# binary pure ACK: presence bits 0-3 (sequence_number, ack, ack_cum, ack_bits) only
+_ACK_BITS = 0b1111
+_ACK_STRUCTS = {
+    present: struct.Struct("!" + "".join(c for bit, c in enumerate("IIIQ") if present >> bit & 1))
+    for present in range(_ACK_BITS + 1)
+}
+
+
+class Header(NamedTuple):
+    """What peek() could read without a full decode."""
+    message_type: str
+    sequence_number: Optional[int]
+    ack: Optional[Tuple[int, int, int]]   # (ack, ack_cum, ack_bits) if this is a pure ACK
+
+
+def _ack_header(seq: Optional[int], largest: Optional[int], cumulative: Optional[int],
+                bitmap: Optional[int]) -> Optional[Header]:
+    if largest is None:
+        if seq is None:
+            return None
+        largest = seq  # single-message ACK
+    return Header("ACK", seq, (largest, cumulative or 0, bitmap or 0))
+
+
+class Codec:
+    """Interface: encode(dict) -> bytes and decode(bytes-like) -> dict."""
+
+    name = ""
+    marker = -1   # first byte of everything this codec produces
+
+    def matches(self, data) -> bool:
+        """True if data (bytes-like) was produced by this codec."""
+        return len(data) > 0 and data[0] == self.marker
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def peek(self, data) -> Optional[Header]:
+        """Header fields read without decoding the message, or None if unsure."""
+        return None
+
+
+class JsonCodec(Codec):
+    """The original format: json.dumps text, UTF-8 encoded."""
+
+    name = "json"
+    marker = ord("{")
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return json.dumps(message).encode("utf-8")
+
+    def decode(self, data) -> Dict[str, Any]:
+        # str() decodes straight out of a bytes / memoryview buffer
+        return json.loads(data if isinstance(data, str) else str(data, "utf-8"))
+
+    def peek(self, data) -> Optional[Header]:
+        match = _JSON_ACK.fullmatch(data)
+        if match is not None:
+            seq, largest, cumulative, bitmap = match.groups()
+            seq = int(seq)
+            if largest is None:
+                return Header("ACK", seq, (seq, 0, 0))  # single-message ACK
+            return Header("ACK", seq, (int(largest), int(cumulative), int(bitmap)))
+        match = _JSON_SEQ_FIRST.match(data)
+        if match is not None:
+            return Header(match.group(2).decode("ascii"), int(match.group(1)), None)
+        return None
+
+
+class BinaryCodec(Codec):
+    """Compact tagged binary format described in the module docstring."""
+
+    name = "bin1"
+    marker = BINARY_MARKER
+
+    def __init__(self, registry: SchemaRegistry = REGISTRY):
+        self._layouts: Dict[int, Tuple] = {}
+        self._names: Dict[int, str] = {}
+        self._ids: Dict[str, int] = {}
+        for schema in registry:
+            self._layouts[schema.type_id] = schema.layout()
+            self._names[schema.type_id] = schema.message_type
+            self._ids[schema.message_type] = schema.type_id
+        # unknown types: sequence/ACK fields, then the type name itself
+        self._layouts[0] = self._layouts[self._ids["ACK"]] + (("message_type", "str"),)
+        self._ack_id = self._ids["ACK"]
+        for layout in self._layouts.values():
+            assert len(layout) < 15, "presence bitmap holds 15 fields"
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        type_id = self._ids.get(message.get("message_type"), 0)
+        layout = self._layouts[type_id]
+        extra = dict(message)
+        if type_id:
+            del extra["message_type"]
+
+        present = 0
+        parts: List[bytes] = []
+        for bit, (field, kind) in enumerate(layout):
+            if field not in extra:
+                continue
+            packed = _pack(kind, extra[field])
+            if packed is None:
+                continue  # does not fit the layout: goes in the JSON tail
+            del extra[field]
+            present |= 1 << bit
+            parts.append(packed)
+        if extra:
+            present |= _EXTRA_BIT
+            parts.append(_pack_blob(json.dumps(extra, separators=(",", ":")).encode("utf-8")))
+        return _HEADER.pack(BINARY_MARKER, type_id, present) + b"".join(parts)
+
+    def peek(self, data) -> Optional[Header]:
+        if len(data) < _HEADER.size:
+            return None
+        _, type_id, present = _HEADER.unpack_from(data)
+        message_type = self._names.get(type_id)
+        if message_type is None:
+            return None
+        if type_id == self._ack_id and not present & ~_ACK_BITS:
+            packer = _ACK_STRUCTS[present]
+            if len(data) != _HEADER.size + packer.size:
+                return None
+            values = packer.unpack_from(data, _HEADER.size)
+            if present == _ACK_BITS:  # what ReliableUDP sends
+                return Header("ACK", values[0], values[1:])
+            values = iter(values)
+            seq, largest, cumulative, bitmap = (next(values) if present >> bit & 1 else None for bit in range(4))
+            return _ack_header(seq, largest, cumulative, bitmap)
+        seq = None
+        if present & 1 and len(data) >= _HEADER.size + _U32.size:
+            (seq,) = _U32.unpack_from(data, _HEADER.size)
+        return Header(message_type, seq, None)
+
+    def decode(self, data) -> Dict[str, Any]:
+        """Raises ValueError on truncated or malformed input."""
+        try:
+            _, type_id, present = _HEADER.unpack_from(data)
+            layout = self._layouts.get(type_id)
+            if layout is None:
+                raise ValueError(f"unknown binary message type {type_id}")
+            message: Dict[str, Any] = {}
+            if type_id:
+                message["message_type"] = self._names[type_id]
+            offset = _HEADER.size
+            for bit, (field, kind) in enumerate(layout):
+                if present >> bit & 1:
+                    message[field], offset = _unpack(kind, data, offset)
+            if present & _EXTRA_BIT:
+                blob, offset = _unpack_blob(data, offset)
+                message.update(json.loads(str(blob, "utf-8")))
+        except (struct.error, UnicodeDecodeError, TypeError) as e:
+            raise ValueError(f"malformed binary message: {e}") from None
+        if offset != len(data):
+            raise ValueError("trailing bytes after binary message")
+        return message
+
+
+def _pack(kind, value) -> Optional[bytes]:
+    """Pack value as kind, or None if it does not fit."""
+    if isinstance(kind, tuple):
+        if not isinstance(value, dict) or set(value) != {name for name, _ in kind}:
+            return None
+        parts = [_pack(sub_kind, value[name]) for name, sub_kind in kind]
+        return None if None in parts else b"".join(parts)
+    if kind in _INTS:
+        if type(value) is not int:
+            return None
+        try:
+            return _INTS[kind].pack(value)
+        except struct.error:
+            return None
+    if kind == "str":
+        if not isinstance(value, str):
+            return None
+        try:
+            raw = value.encode("utf-8")
+        except UnicodeEncodeError:
+            return None
+        return _U16.pack(len(raw)) + raw if len(raw) <= 0xFFFF else None
+    if kind == "b64":
+        if not isinstance(value, str):
+            return None
+        try:
+            raw = base64.b64decode(value, validate=True)
+        except ValueError:  # binascii.Error, or non-ASCII text
+            return None
+        if base64.b64encode(raw) != value.encode("ascii"):
+            return None  # non-canonical base64 would not round-trip
+        return _pack_blob(raw)
+    if kind == "json":
+        try:
+            return _pack_blob(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        except (TypeError, ValueError):
+            return None
+    raise ValueError(f"unknown field kind {kind!r}")
+
+
+def _unpack(kind, data, offset: int) -> Tuple[Any, int]:
+    if isinstance(kind, tuple):
+        value = {}
+        for name, sub_kind in kind:
+            value[name], offset = _unpack(sub_kind, data, offset)
+        return value, offset
+    if kind in _INTS:
+        packer = _INTS[kind]
+        return packer.unpack_from(data, offset)[0], offset + packer.size
+    if kind == "str":
+        (length,) = _U16.unpack_from(data, offset)
+        offset += _U16.size
+        return str(_slice(data, offset, length), "utf-8"), offset + length
+    blob, offset = _unpack_blob(data, offset)
+    if kind == "b64":
+        return base64.b64encode(blob).decode("ascii"), offset
+    return json.loads(str(blob, "utf-8")), offset
+
+
+def _pack_blob(raw: bytes) -> bytes:
+    return _U32.pack(len(raw)) + raw
+
+
+def _unpack_blob(data, offset: int):
+    (length,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    return _slice(data, offset, length), offset + length
+
+
+def _slice(data, offset: int, length: int):
+    if offset + length > len(data):
+        raise struct.error("field runs past the end of the message")
+    return memoryview(data)[offset:offset + length]
@@ -0,0 +1,160 @@
+# networking/compression.py
+
+"""
+Optional compression of encoded messages (negotiated at handshake).
+
+A compressed message is one marker byte followed by the compressed
+bytes of the normally encoded message (JSON or binary):
+
+    0xC1  zlib
+    0xC2  lzma (raw LZMA2 stream, no .xz container)
+    0xC3  zlib with the preset dictionary below
+
+The 0xC0 bits are the "compressed" flag: no codec, fragment or bundle
+starts with such a byte, so the receiver knows to inflate first and then
+decodes the result as usual. Senders only compress above a size
+threshold and only when it actually saves bytes, so small battle
+messages and already-compressed sticker images go out unchanged.
+"""
+
+import lzma
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+COMPRESSED_FLAG = 0xC0
+MAX_INFLATED = 16 * 1024 * 1024   # refuse anything that inflates beyond this
+
+
+# Substrings every PokeProtocol message is made of: JSON keys and the
+# message type names (from the schema registry when it was written). zlib
+# prefers matches near the end of the dictionary, so the most common ones go
+# last. Both peers must inflate with the very same bytes, so this is frozen:
+# never edit it in place, add a new compressor with a new name and marker.
+PRESET_DICTIONARY = (
+    b'"message_type": "HANDSHAKE_REQUEST", "sequence_number": , "ack": , "ack_cum": '
+    b', "ack_bits": , "codecs": , "compression": , "message_type": "HANDSHAKE_RESPONSE"'
+    b', "seed": , "codec": , "message_type": "SPECTATOR_REQUEST"'
+    b', "message_type": "BATTLE_SETUP", "battle_data": , "communication_mode": '
+    b', "pokemon_name": , "stat_boosts": , "damage_table": , "message_type": "ATTACK_ANNOUNCE"'
+    b', "move_name": , "move": , "move_damage": , "message_type": "DEFENSE_ANNOUNCE"'
+    b', "message_type": "CALCULATION_REPORT", "attacker": , "move_used": '
+    b', "remaining_health": , "damage_dealt": , "defender_hp_remaining": , "status_message": '
+    b', "message_type": "CALCULATION_CONFIRMATION", "message_type": "CHAT_MESSAGE"'
+    b', "sender_name": , "content_type": , "message_text": , "sticker_name": '
+    b', "sticker_data_b64": , "stream_id": , "offset": , "total_size": , "sticker_hash": '
+    b', "message_type": "ACK", "message_type": "MULTICAST_GROUP", "multicast_group": '
+    b', "multicast_port": , "multicast_next": , "message_type": "MULTICAST_NACK", "missing": '
+    b', "message_type": "MULTICAST_HEARTBEAT", "mc_last": , "content_type": "STICKER_FILE", '
+    b', "content_type": "TEXT", , {"sequence_number": '
+)
+_LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+
+
+class Compressor:
+    name = ""
+    marker = 0
+
+    def compress(self, payload: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data, max_length: int = MAX_INFLATED) -> bytes:
+        """Raises ValueError if data is corrupt or inflates beyond max_length."""
+        raise NotImplementedError
+
+
+class ZlibCompressor(Compressor):
+    name = "zlib"
+    marker = 0xC1
+
+    def __init__(self, level: int = 6, zdict: Optional[bytes] = None):
+        self.level = level
+        self.zdict = zdict
+
+    def _compressobj(self):
+        if self.zdict is None:
+            return zlib.compressobj(self.level)
+        return zlib.compressobj(self.level, zdict=self.zdict)
+
+    def compress(self, payload: bytes) -> bytes:
+        c = self._compressobj()
+        return c.compress(payload) + c.flush()
+
+    def decompress(self, data, max_length: int = MAX_INFLATED) -> bytes:
+        d = zlib.decompressobj() if self.zdict is None else zlib.decompressobj(zdict=self.zdict)
+        try:
+            out = d.decompress(data, max_length)
+        except zlib.error as e:
+            raise ValueError(f"corrupt {self.name} data: {e}") from None
+        if d.unconsumed_tail or not d.eof:
+            raise ValueError(f"{self.name} data truncated or inflates beyond {max_length} bytes")
+        return out
+
+
+class DictZlibCompressor(ZlibCompressor):
+    """zlib primed with PRESET_DICTIONARY: pays off on much smaller messages."""
+
+    name = "zlib-dict1"   # the 1 names this PRESET_DICTIONARY
+    marker = 0xC3
+
+    def __init__(self, level: int = 6):
+        super().__init__(level, zdict=PRESET_DICTIONARY)
+
+
+class LzmaCompressor(Compressor):
+    name = "lzma"
+    marker = 0xC2
+
+    def compress(self, payload: bytes) -> bytes:
+        return lzma.compress(payload, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+
+    def decompress(self, data, max_length: int = MAX_INFLATED) -> bytes:
+        d = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+        try:
+            out = d.decompress(bytes(data), max_length)
+        except lzma.LZMAError as e:
+            raise ValueError(f"corrupt {self.name} data: {e}") from None
+        if not d.eof:
+            raise ValueError(f"{self.name} data truncated or inflates beyond {max_length} bytes")
+        return out
+
+
+def default_compressors() -> List[Compressor]:
+    """Most preferred first (what we offer at handshake)."""
+    return [DictZlibCompressor(), ZlibCompressor(), LzmaCompressor()]
+
+
+def is_compressed(data) -> bool:
+    return len(data) > 0 and data[0] & 0xF0 == COMPRESSED_FLAG
+
+
+class CompressionSet:
+    """The compressors one side supports, by name and by marker byte."""
+
+    def __init__(self, compressors: Optional[Iterable[Compressor]] = None):
+        self.by_name: Dict[str, Compressor] = {}
+        self._by_marker: Dict[int, Compressor] = {}
+        for c in default_compressors() if compressors is None else compressors:
+            self.by_name[c.name] = c
+            self._by_marker[c.marker] = c
+
+    def names(self) -> List[str]:
+        return list(self.by_name)
+
+    def choose(self, offered) -> Optional[str]:
+        """First of the peer's offered algorithms we support, or None."""
+        for name in offered or ():
+            if name in self.by_name:
+                return name
+        return None
+
+    def compress(self, payload: bytes, name: str) -> Optional[bytes]:
+        """Marker + compressed payload, or None if that would not be smaller."""
+        compressor = self.by_name[name]
+        packed = bytes((compressor.marker,)) + compressor.compress(payload)
+        return packed if len(packed) < len(payload) else None
+
+    def decompress(self, data, max_length: int = MAX_INFLATED) -> bytes:
+        compressor = self._by_marker.get(data[0])
+        if compressor is None:
+            raise ValueError(f"unknown compression marker {data[0]:#x}")
+        return compressor.decompress(memoryview(data)[1:], max_length)
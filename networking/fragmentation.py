@@ -0,0 +1,174 @@
+# networking/fragmentation.py
+
+"""
+Fragmentation / reassembly for messages that do not fit in one datagram.
+
+A fragment is a small binary header followed by a slice of the encoded
+message. JSON datagrams always start with "{", so the magic prefix below
+can never be confused with a normal message.
+
+    magic    2s  b"PF"
+    seq      I   fragment's own sequence number (ACKed like any message)
+    msg_id   I   sequence number of the whole logical message
+    index    H   0 .. count-1
+    count    H   total fragments in the message
+
+Each fragment is ACKed individually, so the sender's selective-repeat
+window only retransmits the fragments that were actually lost. A
+fragment is only ACKed once the Reassembler has stored it (see
+Reassembler.offer()), and stored fragments are never thrown away to
+make room: an ACKed fragment is not sent again, so dropping it would
+lose the message while the sender believes it was delivered.
+"""
+
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+FRAGMENT_MAGIC = b"PF"
+FRAGMENT_HEADER = struct.Struct("!2sIIHH")
+MAX_FRAGMENTS = 0xFFFF
+
+
+def is_fragment(data) -> bool:
+    return data[:2] == FRAGMENT_MAGIC
+
+
+def encode_fragment(seq: int, message_id: int, index: int, count: int, chunk: bytes) -> bytes:
+    return FRAGMENT_HEADER.pack(FRAGMENT_MAGIC, seq, message_id, index, count) + chunk
+
+
+def decode_fragment(data) -> Tuple[int, int, int, int, bytes]:
+    """Return (seq, message_id, index, count, chunk). Raises ValueError if malformed."""
+    if len(data) < FRAGMENT_HEADER.size:
+        raise ValueError("fragment shorter than its header")
+    _, seq, message_id, index, count = FRAGMENT_HEADER.unpack_from(data)
+    if count == 0 or index >= count:
+        raise ValueError(f"bad fragment index {index}/{count}")
+    return seq, message_id, index, count, bytes(data[FRAGMENT_HEADER.size:])
+
+
+def split_payload(payload: bytes, mtu: int) -> List[bytes]:
+    """Split an encoded message into chunks that fit in mtu bytes once the header is added."""
+    chunk_size = mtu - FRAGMENT_HEADER.size
+    if chunk_size <= 0:
+        raise ValueError(f"mtu {mtu} is too small for the fragment header")
+    chunks = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+    if len(chunks) > MAX_FRAGMENTS:
+        raise ValueError(f"message needs {len(chunks)} fragments (max {MAX_FRAGMENTS})")
+    return chunks
+
+
+@dataclass
+class _Partial:
+    count: int
+    started: float
+    updated: float            # when the last new fragment arrived
+    chunks: List[Optional[bytes]] = field(default_factory=list)
+    received: int = 0
+    size: int = 0
+
+
+class Reassembler:
+    """
+    Collects fragments per (peer, message_id) until a message is complete.
+
+    Memory is bounded: at most max_messages partial messages and
+    max_bytes buffered in total. When full, new fragments are refused
+    (not stored, so not ACKed, and the sender retries them later)
+    rather than evicting partial messages whose fragments were already
+    ACKed. A partial message is dropped once no new fragment of it
+    arrived for `timeout` seconds, which should be at least as long as
+    the sender keeps retrying one fragment: by then it has given up on
+    the message.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 8 * 1024 * 1024,
+        max_messages: int = 64,
+        timeout: float = 10.0,
+        remember_completed: int = 256,
+    ):
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.remember_completed = remember_completed
+        self.total_bytes = 0
+        self.expired = 0
+        self.refused = 0
+        self._partial: "OrderedDict[Tuple[Any, int], _Partial]" = OrderedDict()
+        self._completed: "OrderedDict[Tuple[Any, int], None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._partial)
+
+    def add(self, addr, message_id: int, index: int, count: int, chunk: bytes,
+            now: Optional[float] = None) -> Optional[bytes]:
+        """Store one fragment; return the whole payload once the last one arrives."""
+        return self.offer(addr, message_id, index, count, chunk, now)[1]
+
+    def offer(self, addr, message_id: int, index: int, count: int, chunk: bytes,
+              now: Optional[float] = None) -> Tuple[bool, Optional[bytes]]:
+        """
+        Like add(), but also says whether the fragment may be ACKed: True
+        if it is stored now or was before (a retransmission), False if
+        it was refused and must be sent again.
+        """
+        if now is None:
+            now = time.monotonic()
+        self.expire(now)
+
+        key = (addr, message_id)
+        if key in self._completed:
+            return True, None  # late retransmission of a message we already delivered
+
+        partial = self._partial.get(key)
+        if partial is not None and partial.count != count:
+            return False, None
+        if partial is not None and partial.chunks[index] is not None:
+            return True, None  # duplicate fragment: our ACK was lost
+        if (partial is None and len(self._partial) >= self.max_messages) \
+                or self.total_bytes + len(chunk) > self.max_bytes:
+            self.refused += 1
+            return False, None
+
+        if partial is None:
+            partial = _Partial(count=count, started=now, updated=now, chunks=[None] * count)
+            self._partial[key] = partial
+        partial.chunks[index] = chunk
+        partial.received += 1
+        partial.size += len(chunk)
+        partial.updated = now
+        self._partial.move_to_end(key)   # keep the least recently updated first, for expire()
+        self.total_bytes += len(chunk)
+
+        if partial.received < partial.count:
+            return True, None
+
+        self._drop(key)
+        self._completed[key] = None
+        while len(self._completed) > self.remember_completed:
+            self._completed.popitem(last=False)
+        return True, b"".join(partial.chunks)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop partial messages without a new fragment for timeout seconds (stalest are at the front)."""
+        if now is None:
+            now = time.monotonic()
+        dropped = 0
+        while self._partial:
+            key, partial = next(iter(self._partial.items()))
+            if now - partial.updated < self.timeout:
+                break
+            self._drop(key)
+            dropped += 1
+        self.expired += dropped
+        return dropped
+
+    def _drop(self, key):
+        partial = self._partial.pop(key, None)
+        if partial is not None:
+            self.total_bytes -= partial.size
@@ -1,8 +1,33 @@
 import json
+from typing import Dict, Iterable, List, Optional, Union
 from chat.verbose_mode import VerboseManager
+from networking.codecs import BinaryCodec, Codec, Header, JsonCodec
 
 class MessageParser:
 
+    # Codecs we can speak, most preferred first. JSON is always the fallback.
+    def __init__(self, codecs: Optional[Iterable[Codec]] = None):
+        self.codecs: Dict[str, Codec] = {}
+        self._by_marker: Dict[int, Codec] = {}
+        for codec in (BinaryCodec(), JsonCodec()) if codecs is None else codecs:
+            self.register_codec(codec)
+        self.codecs.setdefault("json", JsonCodec())
+
+    def register_codec(self, codec: Codec):
+        self.codecs[codec.name] = codec
+        self._by_marker[codec.marker] = codec
+
+    # Names to offer in HANDSHAKE_REQUEST
+    def codec_names(self) -> List[str]:
+        return list(self.codecs)
+
+    # Pick the first codec in the peer's offer that we also support
+    def choose_codec(self, offered) -> str:
+        for name in offered or ():
+            if name in self.codecs:
+                return name
+        return "json"
+
     # Encoding message from dictionary to string
     def encode_message(self, data: dict) -> str:
         result = json.dumps(data)
@@ -11,11 +36,35 @@ class MessageParser:
             print(f"[MSG_PARSER] Encoded {msg_type}: {len(result)} bytes")
         return result
 
+    # Encoding message from dictionary to datagram bytes with the given codec
+    def encode_bytes(self, data: dict, codec: str = "json") -> bytes:
+        if codec == "json":
+            return self.encode_message(data).encode("utf-8")
+        result = self.codecs[codec].encode(data)
+        if VerboseManager.is_verbose():
+            msg_type = data.get("message_type", "UNKNOWN")
+            print(f"[MSG_PARSER] Encoded {msg_type} ({codec}): {len(result)} bytes")
+        return result
 
-    # Decoding message from string to dictionary
-    def decode_message(self, message: str) -> dict:
-        result = json.loads(message)
+    # Reading message_type / sequence_number (and pure ACK fields) without a full decode
+    def peek_header(self, data) -> Optional[Header]:
+        codec = self._by_marker.get(data[0]) if len(data) else None
+        return None if codec is None else codec.peek(data)
+
+    # Decoding message from string (or bytes / memoryview) to dictionary.
+    # The codec is recognised from the first byte, so any peer can be decoded.
+    def decode_message(self, message: Union[str, bytes, memoryview]) -> dict:
+        if not isinstance(message, str):
+            codec = self._by_marker.get(message[0]) if len(message) else None
+            if codec is not None and codec.name != "json":
+                result = codec.decode(message)
+            else:
+                # str() decodes straight out of the buffer, without a bytes copy first
+                message = str(message, "utf-8")
+                result = json.loads(message)
+        else:
+            result = json.loads(message)
         if VerboseManager.is_verbose():
-            msg_type = result.get("message_type", "UNKNOWN")
+            msg_type = result.get("message_type", "UNKNOWN") if isinstance(result, dict) else "non-object"
             print(f"[MSG_PARSER] Decoded {msg_type}: {len(message)} bytes")
-        return result
\ No newline at end of file
+        return result
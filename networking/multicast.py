@@ -0,0 +1,320 @@
+# networking/multicast.py
+
+"""
+IP multicast for BROADCAST mode: one sendto per event, however many
+spectators are watching.
+
+The host's MulticastSender stamps every event with "mc_seq" (1, 2, ...
+per game), sends it once to the group as a JSON datagram and keeps the
+last `history` events for repairs. While the game is on it also sends a
+MULTICAST_HEARTBEAT with the latest mc_seq every heartbeat_interval, so
+a spectator notices when the last events of a burst were lost.
+
+Multicast is unreliable, so each spectator runs a MulticastReceiver:
+events are delivered in mc_seq order; a gap is reported to the host as
+a MULTICAST_NACK {"missing": [...]} over the spectator's normal unicast
+socket, repeated every nack_interval until the event arrives or
+max_nacks NACKs went unanswered (then it is skipped). The host answers
+a NACK by resending the missing events, still carrying their mc_seq,
+to that spectator alone over reliable unicast.
+
+Everything else (handshake, the chat replay for late joiners and the
+MULTICAST_GROUP message that tells a spectator where to listen) stays
+on the reliable unicast path.
+
+With the default interface 127.0.0.1 this works on the loopback
+interface, which is how the game (and the tests) run it locally.
+"""
+
+import asyncio
+import random
+import socket
+import struct
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from chat.verbose_mode import VerboseManager
+
+DEFAULT_GROUP = "239.255.42.99"   # administratively scoped (local) group
+DEFAULT_PORT = 65433
+DEFAULT_INTERFACE = "127.0.0.1"
+MAX_NACK_BATCH = 64               # missing seqs per MULTICAST_NACK
+
+
+def open_sender_socket(interface: str = DEFAULT_INTERFACE, ttl: int = 1) -> socket.socket:
+    """Non-blocking UDP socket that sends to multicast groups on `interface`."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)   # spectators on this machine
+    s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+    s.setblocking(False)
+    return s
+
+
+def open_receiver_socket(group: str, port: int, interface: str = DEFAULT_INTERFACE) -> socket.socket:
+    """Non-blocking UDP socket bound to port and joined to group (several may share the port)."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind(("", port))
+    membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface))
+    s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    s.setblocking(False)
+    return s
+
+
+# ---------- host side ----------
+
+class MulticastSender:
+    def __init__(self, sock: socket.socket, parser, group: str = DEFAULT_GROUP, port: int = DEFAULT_PORT,
+                 history: int = 1024, heartbeat_interval: float = 1.0):
+        self.sock = sock
+        self.parser = parser
+        self.group = group
+        self.port = port
+        self.history = max(1, history)
+        self.heartbeat_interval = heartbeat_interval
+        self.next_seq = 1
+        self._ring: List[Optional[Dict[str, Any]]] = [None] * self.history   # mc_seq % history -> event
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {
+            "datagrams": 0,     # sendto() calls to the group, heartbeats included
+            "events": 0,
+            "heartbeats": 0,
+            "nacked": 0,        # seqs spectators asked for again
+            "repaired": 0,      # ... that we still had and resent
+        }
+
+    def log(self, *args):
+        if VerboseManager.is_verbose():
+            print("[MULTICAST]", *args)
+
+    def group_info(self) -> Dict[str, Any]:
+        """What a spectator needs to join (see MULTICAST_GROUP)."""
+        return {"multicast_group": self.group, "multicast_port": self.port, "multicast_next": self.next_seq}
+
+    def _send(self, msg: Dict[str, Any]):
+        try:
+            self.sock.sendto(self.parser.encode_bytes(msg), (self.group, self.port))
+            self.stats["datagrams"] += 1
+        except OSError as e:
+            self.log("Send failed:", e)
+
+    def publish(self, msg: Dict[str, Any]) -> int:
+        """Send msg to the group once; returns its mc_seq."""
+        seq = self.next_seq
+        self.next_seq += 1
+        msg = {k: v for k, v in msg.items() if k != "sequence_number"}
+        msg["mc_seq"] = seq
+        self._ring[seq % self.history] = msg
+        self.stats["events"] += 1
+        self._send(msg)
+        return seq
+
+    def repair(self, missing) -> List[Dict[str, Any]]:
+        """The events in missing (mc_seqs) that are still held, oldest first."""
+        found = []
+        for seq in sorted({s for s in missing[:MAX_NACK_BATCH] if type(s) is int}):
+            self.stats["nacked"] += 1
+            msg = self._ring[seq % self.history] if 0 < seq < self.next_seq else None
+            if msg is not None and msg["mc_seq"] == seq:
+                found.append(msg)
+        self.stats["repaired"] += len(found)
+        return found
+
+    def heartbeat(self):
+        if self.next_seq > 1:
+            self.stats["heartbeats"] += 1
+            self._send({"message_type": "MULTICAST_HEARTBEAT", "mc_last": self.next_seq - 1})
+
+    def start(self):
+        if self._heartbeat is None and self.heartbeat_interval > 0:
+            self._heartbeat = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.heartbeat()
+
+    def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        self.sock.close()
+
+
+# ---------- spectator side ----------
+
+class MulticastReceiver:
+    """In-order delivery of mc_seq-numbered events, with NACK bookkeeping for the gaps."""
+
+    def __init__(self, next_seq: int = 1, nack_interval: float = 0.2, max_nacks: int = 5,
+                 max_buffer: int = 1024):
+        self.next = next_seq                 # next mc_seq to deliver
+        self.highest = next_seq - 1          # highest mc_seq known to exist
+        self.nack_interval = nack_interval
+        self.max_nacks = max_nacks
+        self.max_buffer = max_buffer
+        self._buffer: Dict[int, Dict[str, Any]] = {}       # arrived early
+        self._missing: Dict[int, List[float]] = {}         # seq -> [next NACK at, NACKs sent]
+        self._lost: set = set()                            # given up on
+        self.delivered = 0
+        self.duplicates = 0
+        self.skipped = 0
+
+    def _expect_up_to(self, last: int, now: float):
+        for seq in range(self.highest + 1, last + 1):
+            self._missing[seq] = [now, 0]
+        self.highest = max(self.highest, last)
+
+    def receive(self, msg: Dict[str, Any], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Take one event (from the group or a repair); returns those now deliverable in order."""
+        seq = msg.get("mc_seq")
+        if type(seq) is not int:
+            return []
+        if seq < self.next or seq in self._buffer:
+            self.duplicates += 1
+            return []
+        now = time.monotonic() if now is None else now
+        if seq - self.next >= self.max_buffer:
+            # too far ahead to fill the gap: give up on it and start again from here
+            self.skipped += seq - self.next - len(self._buffer)
+            ready = [self._buffer[s] for s in sorted(self._buffer)]
+            self._buffer.clear()
+            self._missing.clear()
+            self._lost.clear()
+            self.next = self.highest = seq
+            self.delivered += len(ready)
+            return ready + self.receive(msg, now)
+        if seq > self.highest:
+            self._expect_up_to(seq - 1, now)   # anything skipped over is missing
+            self.highest = seq
+        else:
+            self._missing.pop(seq, None)
+        self._lost.discard(seq)
+        self._buffer[seq] = msg
+        return self._release()
+
+    def heartbeat(self, last: int, now: Optional[float] = None):
+        """The host says events up to `last` exist."""
+        if last > self.highest:
+            self._expect_up_to(last, time.monotonic() if now is None else now)
+
+    def due_nacks(self, now: Optional[float] = None) -> List[int]:
+        """Missing seqs to NACK now; gives up on those NACKed max_nacks times (see release())."""
+        now = time.monotonic() if now is None else now
+        nacks = []
+        for seq, state in list(self._missing.items()):
+            if state[0] > now:
+                continue
+            if state[1] >= self.max_nacks:
+                del self._missing[seq]
+                self._lost.add(seq)
+                continue
+            state[0] = now + self.nack_interval
+            state[1] += 1
+            nacks.append(seq)
+        return nacks
+
+    def release(self) -> List[Dict[str, Any]]:
+        """Events deliverable after due_nacks() gave up on a gap."""
+        return self._release()
+
+    def _release(self) -> List[Dict[str, Any]]:
+        ready = []
+        while True:
+            msg = self._buffer.pop(self.next, None)
+            if msg is not None:
+                ready.append(msg)
+            elif self.next in self._lost:
+                self._lost.discard(self.next)
+                self.skipped += 1
+            else:
+                break
+            self.next += 1
+        self.delivered += len(ready)
+        return ready
+
+
+class _SubscriberProtocol(asyncio.DatagramProtocol):
+    def __init__(self, owner: "MulticastSubscriber"):
+        self.owner = owner
+
+    def datagram_received(self, data: bytes, addr):
+        self.owner._datagram(data)
+
+
+class MulticastSubscriber:
+    """
+    A spectator's end of the group: receives events on the group socket,
+    hands them to on_message in order, and NACKs gaps with send_nack
+    (a function taking the MULTICAST_NACK dict, e.g. sending it
+    unreliably to the host). Repairs that come in over unicast go to
+    feed().
+    """
+
+    def __init__(self, parser, group: str, port: int, on_message: Callable[[Dict[str, Any]], None],
+                 send_nack: Callable[[Dict[str, Any]], None], next_seq: int = 1,
+                 interface: str = DEFAULT_INTERFACE, loss_prob: float = 0.0,
+                 nack_interval: float = 0.2, max_nacks: int = 5):
+        self.parser = parser
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.on_message = on_message
+        self.send_nack = send_nack
+        self.loss_prob = loss_prob     # artificial loss for testing
+        self.receiver = MulticastReceiver(next_seq, nack_interval, max_nacks)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._nacker: Optional[asyncio.Task] = None
+        self.nacks_sent = 0
+
+    def log(self, *args):
+        if VerboseManager.is_verbose():
+            print("[MULTICAST]", *args)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        sock = open_receiver_socket(self.group, self.port, self.interface)
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: _SubscriberProtocol(self), sock=sock)
+        self._nacker = loop.create_task(self._nack_loop())
+
+    def _datagram(self, data: bytes):
+        if random.random() < self.loss_prob:
+            return
+        try:
+            msg = self.parser.decode_message(data)
+        except (ValueError, UnicodeDecodeError):
+            return
+        if not isinstance(msg, dict):
+            return
+        if msg.get("message_type") == "MULTICAST_HEARTBEAT":
+            last = msg.get("mc_last")
+            if type(last) is int:
+                self.receiver.heartbeat(last)
+            return
+        self.feed(msg)
+
+    def feed(self, msg: Dict[str, Any]):
+        """An event from the group or a unicast repair."""
+        for event in self.receiver.receive(msg):
+            self.on_message(event)
+
+    async def _nack_loop(self):
+        while True:
+            await asyncio.sleep(self.receiver.nack_interval / 2)
+            missing = self.receiver.due_nacks()
+            for start in range(0, len(missing), MAX_NACK_BATCH):
+                self.send_nack({"message_type": "MULTICAST_NACK", "missing": missing[start:start + MAX_NACK_BATCH]})
+                self.nacks_sent += 1
+            for event in self.receiver.release():
+                self.on_message(event)
+
+    def close(self):
+        if self._nacker is not None:
+            self._nacker.cancel()
+            self._nacker = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
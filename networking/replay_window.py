@@ -0,0 +1,108 @@
+# networking/replay_window.py
+
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class ReplayWindow:
+    """
+    Sliding receive window for duplicate detection (IPsec/DTLS anti-replay style).
+
+    Tracks the highest sequence number seen plus a bitmap of the `size`
+    sequence numbers just below it. Checking a number is O(1) and the
+    memory used never grows:
+
+        bit 0 -> highest
+        bit n -> highest - n
+
+    Anything older than the window is reported as a duplicate. That is
+    only safe because the sender never has seqs `size` or more apart
+    waiting for an ACK (ReliableUDP bounds its window in sequence space
+    by the same replay_window): whatever is still being retransmitted
+    is inside the window, and anything older was ACKed or given up on.
+    """
+
+    def __init__(self, size: int = 64):
+        self.size = size
+        self.highest = 0
+        self.bitmap = 0
+
+    def check_and_update(self, seq: int) -> bool:
+        """Return True if seq is new (and mark it seen), False if it is a duplicate."""
+        if seq > self.highest:
+            shift = seq - self.highest
+            if shift >= self.size:
+                self.bitmap = 1
+            else:
+                self.bitmap = ((self.bitmap << shift) | 1) & ((1 << self.size) - 1)
+            self.highest = seq
+            return True
+
+        offset = self.highest - seq
+        if offset >= self.size:
+            return False
+        mask = 1 << offset
+        if self.bitmap & mask:
+            return False
+        self.bitmap |= mask
+        return True
+
+    def seen(self, seq: int) -> bool:
+        """What check_and_update(seq) would report as a duplicate, without marking it."""
+        if seq > self.highest:
+            return False
+        offset = self.highest - seq
+        return offset >= self.size or bool(self.bitmap >> offset & 1)
+
+
+class PeerReplayWindows:
+    """
+    One ReplayWindow per peer address, evicted after idle_timeout seconds.
+
+    Peers are kept in least-recently-used order, so eviction only ever
+    looks at the oldest entries (amortised O(1) per message).
+    """
+
+    def __init__(self, window_size: int = 64, idle_timeout: float = 300.0):
+        self.window_size = window_size
+        self.idle_timeout = idle_timeout
+        self._peers: "OrderedDict[Any, list]" = OrderedDict()  # addr -> [ReplayWindow, last_seen]
+
+    def __len__(self) -> int:
+        return len(self._peers)
+
+    def check_and_update(self, addr, seq: int, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        self.evict_idle(now)
+
+        entry = self._peers.get(addr)
+        if entry is None:
+            entry = [ReplayWindow(self.window_size), now]
+            self._peers[addr] = entry
+        else:
+            entry[1] = now
+            self._peers.move_to_end(addr)
+        return entry[0].check_and_update(seq)
+
+    def seen(self, addr, seq: int) -> bool:
+        """True if seq from addr was already checked in (read-only, no LRU update)."""
+        entry = self._peers.get(addr)
+        return entry is not None and entry[0].seen(seq)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop windows of peers not heard from in idle_timeout seconds."""
+        if now is None:
+            now = time.monotonic()
+        evicted = 0
+        while self._peers:
+            addr, (_, last_seen) = next(iter(self._peers.items()))
+            if now - last_seen < self.idle_timeout:
+                break
+            del self._peers[addr]
+            evicted += 1
+        return evicted
+
+    def forget(self, addr):
+        self._peers.pop(addr, None)
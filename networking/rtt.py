@@ -0,0 +1,80 @@
+# networking/rtt.py
+
+from typing import Any, Dict, Optional
+
+
+class RttEstimator:
+    """
+    Round-trip time estimator for one peer (Jacobson/Karels, RFC 6298).
+
+    - on_sample(rtt) feeds a measured RTT from a message that was ACKed
+      on its FIRST transmission (Karn's rule: the caller must not feed
+      samples from retransmitted messages, they are ambiguous).
+    - on_timeout() doubles the RTO (exponential backoff) until the next
+      valid sample arrives.
+    - rto is always clamped to [min_rto, max_rto].
+    """
+
+    ALPHA = 1 / 8   # gain for SRTT
+    BETA = 1 / 4    # gain for RTTVAR
+    K = 4           # RTTVAR multiplier
+
+    def __init__(self, initial_rto: float = 0.5, min_rto: float = 0.05, max_rto: float = 4.0):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.rto = self._clamp(initial_rto)
+        self.samples = 0
+        self.timeouts = 0
+        self.last_rtt: Optional[float] = None
+
+    def _clamp(self, value: float) -> float:
+        return max(self.min_rto, min(self.max_rto, value))
+
+    def on_sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = self._clamp(self.srtt + self.K * self.rttvar)
+        self.samples += 1
+        self.last_rtt = rtt
+
+    def on_timeout(self, current_rto: Optional[float] = None) -> float:
+        """
+        Back off after a timeout and return the RTO to use for the retry.
+
+        current_rto is the timer that just expired; when several messages
+        to the same peer time out together the peer's RTO is only raised
+        to the largest backed-off value instead of doubling once per message.
+        """
+        backed_off = self._clamp((current_rto or self.rto) * 2)
+        self.rto = max(self.rto, backed_off)
+        self.timeouts += 1
+        return backed_off
+
+    def quality(self) -> str:
+        """Human-readable connection quality bucket based on SRTT."""
+        if self.srtt is None:
+            return "unknown"
+        if self.srtt < 0.05:
+            return "excellent"
+        if self.srtt < 0.15:
+            return "good"
+        if self.srtt < 0.4:
+            return "fair"
+        return "poor"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "srtt": self.srtt,
+            "rttvar": self.rttvar,
+            "rto": self.rto,
+            "last_rtt": self.last_rtt,
+            "samples": self.samples,
+            "timeouts": self.timeouts,
+            "quality": self.quality(),
+        }
@@ -0,0 +1,285 @@
+# networking/schema.py
+
+"""
+Declarations of every PokeProtocol message type.
+
+Each MessageSchema lists the fields a message may carry, their wire kind
+(see networking.codecs) and whether they are required. From that the
+registry compiles, once at import time:
+
+    - a validator: validate(msg_dict) -> None if the message is well
+      formed, otherwise a short reason. It only does dict lookups and
+      type checks, so a bad datagram never raises.
+    - a message class with __slots__ (CalculationReport,
+      AttackAnnounce, ...) with from_dict() (validate + build, None if
+      invalid) and to_dict().
+
+The binary codec takes its layouts from these schemas too, so adding a
+field here is all it takes to put it on the wire compactly.
+
+Unknown extra fields are allowed (they are simply not checked), so newer
+peers can add optional fields without breaking older ones.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class Field:
+    """
+    One message field: name, kind, required flag, and for "json" fields
+    the Python type the value must have (None = anything). `wire`
+    overrides the kind the binary codec uses, e.g. "json" for a nested
+    object whose optional sub-fields make a fixed layout a poor fit.
+    """
+
+    __slots__ = ("name", "kind", "required", "of", "wire")
+
+    def __init__(self, name: str, kind, required: bool = False, of: Optional[type] = None,
+                 wire: Optional[str] = None):
+        self.name = name
+        self.kind = kind      # "u32", "i32", "u64", "str", "b64", "json" or a tuple of Fields
+        self.required = required
+        self.of = of
+        self.wire = wire
+
+    def wire_kind(self):
+        """The kind as the binary codec wants it (nested fields as (name, kind) pairs)."""
+        if self.wire is not None:
+            return self.wire
+        if isinstance(self.kind, tuple):
+            return tuple((f.name, f.wire_kind()) for f in self.kind)
+        return self.kind
+
+
+# fields any message may carry: sequence number + piggybacked ACK fields.
+# sequence_number must stay first (the binary codec keeps it at a fixed offset).
+def _common(seq_required: bool = False) -> Tuple[Field, ...]:
+    return (
+        Field("sequence_number", "u32", required=seq_required),
+        Field("ack", "u32"),
+        Field("ack_cum", "u32"),
+        Field("ack_bits", "u64"),
+    )
+
+
+class MessageSchema:
+    def __init__(self, type_id: int, message_type: str, *fields: Field, reliable: bool = False):
+        self.type_id = type_id
+        self.message_type = message_type
+        # reliable messages always carry the sequence number they are ACKed with
+        self.fields: Tuple[Field, ...] = _common(seq_required=reliable) + fields
+        self.validate = _compile_validator(self)
+        self.message_class = _compile_class(self)
+
+    def layout(self) -> Tuple[Tuple[str, Any], ...]:
+        return tuple((f.name, f.wire_kind()) for f in self.fields)
+
+
+class SchemaRegistry:
+    def __init__(self, schemas: List[MessageSchema]):
+        self._by_type: Dict[str, MessageSchema] = {s.message_type: s for s in schemas}
+        self._by_id: Dict[int, MessageSchema] = {s.type_id: s for s in schemas}
+
+    def __iter__(self) -> Iterator[MessageSchema]:
+        return iter(self._by_id.values())
+
+    def get(self, message_type) -> Optional[MessageSchema]:
+        return self._by_type.get(message_type)
+
+    def by_id(self, type_id: int) -> Optional[MessageSchema]:
+        return self._by_id.get(type_id)
+
+    def validate(self, msg: Dict[str, Any]) -> Optional[str]:
+        """None if msg is a well-formed message of a known type, else why not."""
+        message_type = msg.get("message_type")
+        if type(message_type) is not str:   # a dict or list would not even hash
+            return "message_type must be a string"
+        schema = self._by_type.get(message_type)
+        if schema is None:
+            return f"unknown message_type {msg.get('message_type')!r}"
+        return schema.validate(msg)
+
+
+# ---------- compilation ----------
+
+_INT_RANGES = {"u32": (0, 0xFFFFFFFF), "i32": (-0x80000000, 0x7FFFFFFF), "u64": (0, 0xFFFFFFFFFFFFFFFF)}
+
+
+def _check_lines(field: Field, var: str, path: str, depth: int) -> List[str]:
+    """Source lines that `return` an error if `var` (known not None) is not a valid `field`."""
+    kind = field.kind
+    if kind in _INT_RANGES:
+        low, high = _INT_RANGES[kind]
+        return [f"if type({var}) is not int or not {low} <= {var} <= {high}: "
+                f"return '{path} must be an integer in {kind} range'"]
+    if kind in ("str", "b64"):
+        return [f"if type({var}) is not str: return '{path} must be a string'"]
+    if kind == "json":
+        if field.of is None:
+            return []
+        return [f"if type({var}) is not {field.of.__name__}: return '{path} must be a {field.of.__name__}'"]
+    if isinstance(kind, tuple):
+        lines = [f"if type({var}) is not dict: return '{path} must be an object'"]
+        for sub in kind:
+            lines += _field_lines(sub, f"{var}.get({sub.name!r})", f"{path}.{sub.name}", depth + 1)
+        return lines
+    raise ValueError(f"unknown field kind {kind!r}")
+
+
+def _field_lines(field: Field, lookup: str, path: str, depth: int) -> List[str]:
+    var = f"v{depth}"
+    lines = [f"{var} = {lookup}"]
+    checks = _check_lines(field, var, path, depth)
+    if field.required:
+        lines.append(f"if {var} is None: return '{path} is required'")
+        lines += checks
+    elif checks:
+        lines.append(f"if {var} is not None:")
+        lines += ["    " + line for line in checks]
+    return lines
+
+
+def _compile_validator(schema: MessageSchema):
+    body: List[str] = []
+    for field in schema.fields:
+        body += _field_lines(field, f"m.get({field.name!r})", field.name, 0)
+    source = "def validate(m):\n" + "".join(f"    {line}\n" for line in body) + "    return None\n"
+    namespace: Dict[str, Any] = {}
+    exec(source, namespace)
+    return namespace["validate"]
+
+
+def _class_name(message_type: str) -> str:
+    return "".join(part.capitalize() for part in message_type.split("_"))
+
+
+def _compile_class(schema: MessageSchema):
+    names = [f.name for f in schema.fields]
+    args = "".join(f", {name}=None" for name in names)
+    lines = [f"def __init__(self{args}):"]
+    lines += [f"    self.{name} = {name}" for name in names] or ["    pass"]
+    lines.append("def to_dict(self):")
+    lines.append(f"    d = {{'message_type': {schema.message_type!r}}}")
+    for name in names:
+        lines.append(f"    if self.{name} is not None: d[{name!r}] = self.{name}")
+    lines.append("    return d")
+    lines.append("def _build(cls, m):")
+    lines.append("    return cls(" + ", ".join(f"m.get({name!r})" for name in names) + ")")
+    namespace: Dict[str, Any] = {}
+    exec("\n".join(lines) + "\n", namespace)
+
+    return type(_class_name(schema.message_type), (Message,), {
+        "__slots__": tuple(names),
+        "message_type": schema.message_type,
+        "schema": schema,
+        "__init__": namespace["__init__"],
+        "to_dict": namespace["to_dict"],
+        "_build": classmethod(namespace["_build"]),
+    })
+
+
+class Message:
+    """Base class of the compiled message classes."""
+
+    __slots__ = ()
+    message_type = ""
+    schema: MessageSchema
+
+    @classmethod
+    def from_dict(cls, msg: Dict[str, Any]):
+        """The message as an instance, or None if msg is not a valid one of this type."""
+        message_type = msg.get("message_type")
+        if type(message_type) is not str or message_type != cls.message_type \
+                or cls.schema.validate(msg) is not None:
+            return None
+        return cls._build(msg)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items() if k != "message_type")
+        return f"{type(self).__name__}({fields})"
+
+
+# ---------- the PokeProtocol messages ----------
+
+MOVE = (Field("move", "str", required=True), Field("move_damage", "i32", required=True))
+POKEMON_CHOICE = (Field("pokemon", "str", required=True), Field("hp", "i32", required=True))
+STAT_BOOSTS = (  # as typed at the prompt
+    Field("special_attack_uses", "str", required=True),
+    Field("special_defense_uses", "str", required=True),
+)
+BATTLE_DATA = (
+    Field("communication_mode", "str"),  # host only
+    Field("pokemon_name", POKEMON_CHOICE, required=True),
+    Field("stat_boosts", STAT_BOOSTS, required=True),
+    Field("damage_table", "str"),  # joiner only: its DamageTable.digest, checked by the host
+)
+
+REGISTRY = SchemaRegistry([
+    MessageSchema(
+        1, "HANDSHAKE_REQUEST",
+        Field("codecs", "json", of=list),
+        Field("compression", "json", of=list),
+    ),
+    MessageSchema(
+        2, "HANDSHAKE_RESPONSE",
+        Field("seed", "u32", required=True),
+        Field("codec", "str"),
+        Field("compression", "str"),
+    ),
+    MessageSchema(3, "SPECTATOR_REQUEST"),
+    MessageSchema(4, "BATTLE_SETUP", Field("battle_data", BATTLE_DATA, required=True, wire="json")),
+    MessageSchema(5, "ATTACK_ANNOUNCE", Field("move_name", MOVE, required=True), reliable=True),
+    MessageSchema(6, "DEFENSE_ANNOUNCE", reliable=True),
+    MessageSchema(
+        7, "CALCULATION_REPORT",
+        Field("attacker", "str", required=True),
+        Field("move_used", "str", required=True),
+        Field("remaining_health", "i32", required=True),
+        Field("damage_dealt", "i32", required=True),
+        Field("defender_hp_remaining", "i32", required=True),
+        Field("status_message", "str"),
+        reliable=True,
+    ),
+    MessageSchema(8, "CALCULATION_CONFIRMATION", reliable=True),
+    MessageSchema(
+        9, "CHAT_MESSAGE",
+        Field("sender_name", "str"),
+        Field("content_type", "str"),
+        Field("message_text", "str"),
+        Field("sticker_name", "str"),
+        Field("sticker_data_b64", "b64"),
+        Field("stream_id", "u32"),      # chunked sticker streams (chat.sticker_stream)
+        Field("offset", "u64"),
+        Field("total_size", "u64"),
+        Field("sticker_hash", "str"),
+        reliable=True,
+    ),
+    MessageSchema(10, "ACK", reliable=True),
+    # BROADCAST mode (networking.multicast)
+    MessageSchema(
+        11, "MULTICAST_GROUP",
+        Field("multicast_group", "str", required=True),
+        Field("multicast_port", "u32", required=True),
+        Field("multicast_next", "u32", required=True),
+        reliable=True,
+    ),
+    MessageSchema(12, "MULTICAST_NACK", Field("missing", "json", required=True, of=list)),
+    MessageSchema(13, "MULTICAST_HEARTBEAT", Field("mc_last", "u32", required=True)),
+])
+
+HandshakeRequest = REGISTRY.get("HANDSHAKE_REQUEST").message_class
+HandshakeResponse = REGISTRY.get("HANDSHAKE_RESPONSE").message_class
+SpectatorRequest = REGISTRY.get("SPECTATOR_REQUEST").message_class
+BattleSetup = REGISTRY.get("BATTLE_SETUP").message_class
+AttackAnnounce = REGISTRY.get("ATTACK_ANNOUNCE").message_class
+DefenseAnnounce = REGISTRY.get("DEFENSE_ANNOUNCE").message_class
+CalculationReport = REGISTRY.get("CALCULATION_REPORT").message_class
+CalculationConfirmation = REGISTRY.get("CALCULATION_CONFIRMATION").message_class
+ChatMessage = REGISTRY.get("CHAT_MESSAGE").message_class
+Ack = REGISTRY.get("ACK").message_class
+MulticastGroup = REGISTRY.get("MULTICAST_GROUP").message_class
+MulticastNack = REGISTRY.get("MULTICAST_NACK").message_class
+MulticastHeartbeat = REGISTRY.get("MULTICAST_HEARTBEAT").message_class
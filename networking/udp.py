@@ -3,23 +3,50 @@
 import random
 import socket
 import time
-from typing import Dict, Any
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Deque, Optional, Tuple
 from chat.verbose_mode import VerboseManager
+from networking import fragmentation
+from networking.acks import ACK_FIELDS, AckState
+from networking import bundling
+from networking import compression
+from networking.buffers import BufferPool
+from networking.bundling import Bundler
+from networking.compression import CompressionSet
+from networking.fragmentation import Reassembler
+from networking.replay_window import PeerReplayWindows
+from networking.rtt import RttEstimator
+from networking.schema import SchemaRegistry
+
+
+@dataclass
+class _Outstanding:
+    """One reliable message that is in flight (or waiting for window space)."""
+    seq: int
+    addr: Tuple[str, int]
+    payload: bytes
+    future: Future
+    attempts: int = 0
+    deadline: float = 0.0
+    rto: float = 0.0          # timer used for the current attempt
+    first_sent: float = 0.0   # for RTT samples (Karn: only if attempts == 1)
+    urgent: bool = False      # skip the bundling delay on first transmission
 
 
 class ReliableUDP:
     """
     A very simple reliability wrapper on top of UDP.
 
-    - Adds a "sequence_number" field to outgoing messages.
-    - Retries sending the same datagram up to max_retries.
-    - Waits for a JSON-encoded ACK:
-        { "message_type": "ACK", "sequence_number": <seq> }
+    - Adds a "sequence_number" field to outgoing messages (one sequence space per peer).
+    - Keeps up to window_size messages in flight per peer, each retried on its own timer up to max_retries.
+    - send() returns a Future (True once ACKed, False after giving up); send_reliable() waits for it.
 
-    NOTE: This class does NOT automatically send ACKs.
+    NOTE: Apart from fragments, this class does NOT automatically decide what to ACK.
     Your application code (host/joiner/spectator/protocols) must:
         - Look for incoming messages with a "sequence_number".
-        - For non-ACK messages, send back an ACK using the same seq.
+        - For non-ACK messages, call send_ack() with the same seq.
     """
 
     def __init__(
@@ -30,99 +57,665 @@ class ReliableUDP:
         max_retries: int = 3,
         loss_prob: float = 0.0,
         verbose: bool = False,
+        window_size: int = 8,
+        min_rto: float = 0.05,
+        max_rto: float = 4.0,
+        replay_window: int = 64,
+        peer_idle_timeout: float = 300.0,
+        mtu: int = 1200,
+        max_reassembly_bytes: int = 8 * 1024 * 1024,
+        reassembly_timeout: Optional[float] = None,
+        ack_delay: float = 0.02,
+        ack_every: int = 4,
+        bundle_delay: float = 0.0,
+        recv_buffers: int = 4,
+        schema: Optional[SchemaRegistry] = None,
+        header_peek: bool = True,
+        compress_threshold: int = 128,
     ):
         self.sock = socket_obj
         self.parser = parser
         self.timeout = timeout
         self.max_retries = max_retries
         self.loss_prob = loss_prob
-        self._next_seq = 0
-        self._received_seqs = set()  # Track received sequence numbers for duplicate detection
+        self.window_size = max(1, window_size)
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self._rtt: Dict[Any, RttEstimator] = {}         # peer addr -> RTT estimator
+        self._next_seq: Dict[Any, int] = {}             # peer addr -> last sequence number used
+        # per-peer sliding windows of received sequence numbers for duplicate detection
+        self._received = PeerReplayWindows(replay_window, peer_idle_timeout)
+        self.replay_window = replay_window
+        self.mtu = mtu
+        if reassembly_timeout is None:
+            # how long a sender with our settings may keep retrying one fragment
+            reassembly_timeout = max_retries * max_rto
+        self._reassembler = Reassembler(max_bytes=max_reassembly_bytes, timeout=reassembly_timeout)
+
+        self.ack_delay = ack_delay
+        self.ack_every = max(1, ack_every)
+        self._acks: Dict[Any, AckState] = {}            # peer addr -> what we owe it
+        self._codecs: Dict[Any, str] = {}               # peer addr -> codec name (default json)
+        self.compression = CompressionSet()             # what we can inflate / offer
+        self.compress_threshold = compress_threshold
+        self._compression: Dict[Any, str] = {}          # peer addr -> agreed algorithm
+        # small messages to one peer share a datagram, sent at most bundle_delay
+        # seconds after the first (urgent=True sends the bundle at once)
+        self._bundler = Bundler(mtu, bundle_delay) if bundle_delay > 0 else None
+        self._buffers = BufferPool(recv_buffers)
+        self.schema = schema
+        self.header_peek = header_peek
+        self.stats: Dict[str, int] = {
+            "datagrams_sent": 0,      # actual sendto() calls
+            "messages_bundled": 0,    # messages that shared a datagram with others
+            "data_datagrams": 0,      # reliable transmissions incl. retries and fragments
+            "acks_requested": 0,      # send_ack() calls (one per message to acknowledge)
+            "ack_datagrams": 0,       # pure ACK datagrams actually sent
+            "acks_piggybacked": 0,    # times ACK info rode on a data message instead
+            "rx_messages": 0,         # messages decoded (ACKs included, bundles counted per message)
+            "rx_bytes_allocated": 0,  # bytes the receive path had to allocate for them
+            "rx_rejected": 0,         # decoded messages dropped by schema validation
+            "rx_fast_acks": 0,        # pure ACKs handled from the header, without decoding
+            "rx_fast_duplicates": 0,  # duplicates re-ACKed from the header, without decoding
+            "compressed_messages": 0, # outgoing messages sent compressed
+            "compression_saved": 0,   # bytes those saved
+        }
+
+        self._in_flight: Dict[Tuple[Any, int], _Outstanding] = {}  # (addr, seq) -> message waiting for its ACK
+        self._peer_in_flight: Dict[Any, set] = {}       # peer addr -> seqs in _in_flight
+        # per peer, so a peer that stopped answering never holds up sends to the others
+        self._backlog: Dict[Any, Deque[_Outstanding]] = {}  # peer addr -> messages waiting for window space
+        self._inbox: Deque[Tuple[Dict[str, Any], Any]] = deque()  # non-ACK messages for recv()
 
     def log(self, *args):
         if VerboseManager.is_verbose():
             print("[ReliableUDP]", *args)
 
-    def next_sequence_number(self) -> int:
-        self._next_seq += 1
-        self.log("Next sequence number:", self._next_seq)
-        return self._next_seq
+    def next_sequence_number(self, addr=None) -> int:
+        seq = self._next_seq.get(addr, 0) + 1
+        self._next_seq[addr] = seq
+        self.log("Next sequence number:", seq, "for", addr)
+        return seq
 
-    def _is_ack_for(self, msg_dict: Dict[str, Any], seq: int) -> bool:
-        if msg_dict.get("message_type") != "ACK":
-            return False
-        return int(msg_dict.get("sequence_number", -1)) == seq
+    # ---------- sending ----------
 
-    def send_reliable(self, message_dict: Dict[str, Any], addr) -> bool:
+    def send(
+        self,
+        message_dict: Dict[str, Any],
+        addr,
+        callback: Optional[Callable[[bool], None]] = None,
+        urgent: bool = False,
+    ) -> Future:
+        """
+        Queue message_dict for reliable delivery and return immediately.
+
+        The returned Future resolves to True once the ACK arrives, or False
+        after max_retries unanswered transmissions. If callback is given it
+        is called with that same bool. Progress (ACKs, retransmissions) is
+        made whenever poll(), recv() or send_reliable() pump the socket.
+
+        Payloads larger than mtu are fragmented; the Future then resolves
+        once every fragment is ACKed (or False as soon as one gives up).
+        """
+        seq = self.next_sequence_number(addr)
+        # copy so we don't mutate caller's dict; sequence_number goes first so
+        # the receiver can peek at it without decoding (see networking.codecs),
+        # even when the caller's dict already carries one
+        message_dict = {"sequence_number": seq,
+                        **{k: v for k, v in message_dict.items() if k != "sequence_number"}}
+        # only piggyback ACKs on a message that goes out now: a backlogged one
+        # would hold them until a window slot frees, and the peer would retransmit
+        ack_fields = self._pending_ack_fields(addr) \
+            if addr not in self._backlog and self._can_start(addr, seq) else None
+        if ack_fields:
+            message_dict.update(ack_fields)
+
+        payload = self._encode(message_dict, addr)
+        future = self._new_future()
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(f.result()))
+
+        if len(payload) > self.mtu:
+            # the peer reads the fields only once every fragment is in, so the
+            # ACKs stay pending and go out on their own
+            self._send_fragmented(seq, payload, addr, future)
+        else:
+            if ack_fields:
+                self._acks_piggybacked(addr)
+            self._enqueue(_Outstanding(seq=seq, addr=addr, payload=payload, future=future, urgent=urgent))
+        return future
+
+    def _enqueue(self, entry: _Outstanding):
+        if entry.addr not in self._backlog and self._can_start(entry.addr, entry.seq):
+            self._start(entry)
+        else:
+            self.log(f"Window full ({self.window_size}), queueing seq={entry.seq}")
+            self._backlog.setdefault(entry.addr, deque()).append(entry)
+
+    def _can_start(self, addr, seq: int) -> bool:
+        """Room in addr's window, and seq within replay_window of its oldest unACKed seq."""
+        # the seq bound keeps every retransmission inside the receiver's duplicate
+        # window (networking.replay_window, same replay_window on both ends), so it
+        # is never taken for an old duplicate however many fragments follow it
+        in_flight = self._peer_in_flight.get(addr)
+        if not in_flight:
+            return True
+        return len(in_flight) < self.window_size and seq - min(in_flight) < self.replay_window
+
+    def _send_fragmented(self, message_id: int, payload: bytes, addr, future):
+        chunks = fragmentation.split_payload(payload, self.mtu)
+        count = len(chunks)
+        self.log(f"Fragmenting seq={message_id}: {len(payload)} bytes -> {count} fragments")
+
+        fragment_keys = set()
+        remaining = [count]
+
+        def on_fragment_done(f):
+            if future.done():
+                return
+            if not f.result():
+                # one fragment gave up: the message is lost, stop sending the rest
+                self._abandon(fragment_keys)
+                future.set_result(False)
+                return
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                future.set_result(True)
+
+        for index, chunk in enumerate(chunks):
+            seq = self.next_sequence_number(addr)
+            fragment_keys.add((addr, seq))
+            fragment_future = self._new_future()
+            fragment_future.add_done_callback(on_fragment_done)
+            data = fragmentation.encode_fragment(seq, message_id, index, count, chunk)
+            self._enqueue(_Outstanding(seq=seq, addr=addr, payload=data, future=fragment_future))
+
+    def _abandon(self, keys):
+        """Forget queued/in-flight messages without waiting for their ACKs."""
+        for addr in {addr for addr, _ in keys}:
+            backlog = deque(e for e in self._backlog.pop(addr, ()) if (e.addr, e.seq) not in keys)
+            if backlog:
+                self._backlog[addr] = backlog
+        for key in keys:
+            if key in self._in_flight:
+                self._finish(key, False)
+
+    def send_reliable(self, message_dict: Dict[str, Any], addr, urgent: bool = False) -> bool:
         """
         Encode message_dict as JSON, add sequence_number, send, and wait for ACK.
 
-        Returns True if ACK is received, False otherwise.
+        Returns True if ACK is received, False otherwise. With window_size=1
+        this is the original stop-and-wait sender.
         """
-        seq = self.next_sequence_number()
-        message_dict = dict(message_dict)  # copy so we don't mutate caller's dict
-        message_dict["sequence_number"] = seq
+        future = self.send(message_dict, addr, urgent=urgent)
+        while not future.done():
+            self.poll()
+        return future.result()
+
+    def _start(self, entry: _Outstanding):
+        self._in_flight[(entry.addr, entry.seq)] = entry
+        self._peer_in_flight.setdefault(entry.addr, set()).add(entry.seq)
+        # adaptive per peer (networking.rtt); `timeout` is only the initial RTO,
+        # and each retry doubles it up to max_rto
+        entry.rto = self.rtt_estimator(entry.addr).rto
+        entry.first_sent = time.monotonic()
+        self._transmit(entry)
+        self._timers_changed()
+
+    def _transmit(self, entry: _Outstanding):
+        entry.attempts += 1
+        entry.deadline = time.monotonic() + entry.rto
+
+        # artificial loss for testing, if desired
+        if random.random() < self.loss_prob:
+            self.log(f"(Simulated drop) seq={entry.seq}, attempt={entry.attempts}")
+            return
+        self.log(f"Sending seq={entry.seq}, attempt={entry.attempts}")
+        self.stats["data_datagrams"] += 1
+        # retransmissions have already waited a full RTO, don't delay them further
+        self._output(entry.payload, entry.addr, urgent=entry.urgent or entry.attempts > 1)
 
-        payload = self.parser.encode_message(message_dict).encode("utf-8")
+    def send_unreliable(self, message_dict: Dict[str, Any], addr, urgent: bool = False):
+        """Fire-and-forget send (no sequence number, no ACK expected)."""
+        message_dict = dict(message_dict)
+        self._attach_acks(message_dict, addr)
+        payload = self._encode(message_dict, addr)
+        self._output(payload, addr, urgent)
 
-        attempt = 0
-        while attempt < self.max_retries:
-            attempt += 1
+    # ---------- codec ----------
 
-            # artificial loss for testing, if desired
-            if random.random() < self.loss_prob:
-                self.log(f"(Simulated drop) seq={seq}, attempt={attempt}")
+    def set_peer_codec(self, addr, codec: str):
+        """Encode everything for addr with this codec (agreed at handshake)."""
+        if codec not in self.parser.codecs:
+            raise ValueError(f"unknown codec {codec!r}")
+        self._codecs[addr] = codec
+        self.log(f"Using codec {codec} for {addr}")
+
+    def peer_codec(self, addr) -> str:
+        return self._codecs.get(addr, "json")
+
+    def set_peer_compression(self, addr, algorithm: Optional[str]):
+        """Compress messages to addr above compress_threshold (None: never)."""
+        if algorithm is None:
+            self._compression.pop(addr, None)
+            return
+        if algorithm not in self.compression.by_name:
+            raise ValueError(f"unknown compression {algorithm!r}")
+        self._compression[addr] = algorithm
+        self.log(f"Using {algorithm} compression for {addr}")
+
+    def _encode(self, message_dict: Dict[str, Any], addr) -> bytes:
+        payload = self.parser.encode_bytes(message_dict, self._codecs.get(addr, "json"))
+        algorithm = self._compression.get(addr)
+        if algorithm is None or len(payload) < self.compress_threshold:
+            return payload
+        packed = self.compression.compress(payload, algorithm)
+        if packed is None:
+            return payload  # incompressible (e.g. a JPEG in the binary codec)
+        self.stats["compressed_messages"] += 1
+        self.stats["compression_saved"] += len(payload) - len(packed)
+        return packed
+
+    # ---------- bundling stage ----------
+
+    def _output(self, payload: bytes, addr, urgent: bool = False):
+        """Send payload now, or park it in the peer's bundle (see networking.bundling)."""
+        if self._bundler is None:
+            self._send_datagram(payload, addr)
+            return
+        if not bundling.can_bundle(payload):
+            # keep per-peer order: whatever is waiting goes out first
+            for peer, datagram in self._bundler.flush(addr):
+                self._send_datagram(datagram, peer)
+            self._send_datagram(payload, addr)
+            return
+        had_pending = self._bundler.next_deadline()
+        for datagram in self._bundler.add(addr, payload, urgent):
+            self._send_datagram(datagram, addr)
+        if had_pending is None and self._bundler.next_deadline() is not None:
+            self._timers_changed()
+
+    def _send_datagram(self, datagram: bytes, addr):
+        if bundling.is_bundle(datagram):
+            self.stats["messages_bundled"] += bundling.message_count(datagram)
+        self.stats["datagrams_sent"] += 1
+        self._sendto(datagram, addr)
+
+    def flush(self, addr=None):
+        """Send pending ACKs and bundles now (e.g. before going quiet)."""
+        self.flush_acks(addr)
+        if self._bundler is not None:
+            for peer, datagram in self._bundler.flush(addr):
+                self._send_datagram(datagram, peer)
+
+    # ---------- I/O hooks (overridden by AsyncReliableUDP) ----------
+
+    def _new_future(self):
+        return Future()
+
+    def _sendto(self, payload: bytes, addr):
+        self.sock.sendto(payload, addr)
+
+    def _deliver(self, msg: Dict[str, Any], addr):
+        self._inbox.append((msg, addr))
+
+    def _timers_changed(self):
+        """A new retransmission or ACK deadline exists (async version wakes its timer)."""
+
+    def _finish(self, key: Tuple[Any, int], delivered: bool):
+        entry = self._in_flight.pop(key, None)
+        if entry is None:
+            return
+        addr = entry.addr
+        in_flight = self._peer_in_flight[addr]
+        in_flight.discard(entry.seq)
+        # refill the peer's window before running callbacks so they see a consistent state
+        backlog = self._backlog.get(addr)
+        while backlog and self._can_start(addr, backlog[0].seq):
+            self._start(backlog.popleft())
+        if not backlog:
+            self._backlog.pop(addr, None)
+        if not in_flight:
+            del self._peer_in_flight[addr]
+        if not entry.future.done():
+            entry.future.set_result(delivered)
+
+    def _next_deadline(self) -> Optional[float]:
+        """Earliest retransmission or delayed-ACK deadline, or None if idle."""
+        deadlines = [e.deadline for e in self._in_flight.values()]
+        deadlines.extend(a.deadline for a in self._acks.values() if a.deadline is not None)
+        if self._bundler is not None and self._bundler.next_deadline() is not None:
+            deadlines.append(self._bundler.next_deadline())
+        return min(deadlines) if deadlines else None
+
+    def _service_timers(self):
+        """Flush due ACKs, then retransmit (or give up on) every expired message."""
+        now = time.monotonic()
+        for addr, state in list(self._acks.items()):
+            if state.deadline is not None and state.deadline <= now:
+                self._send_pure_ack(addr)
+        if self._bundler is not None:
+            for addr, datagram in self._bundler.due(now):
+                self._send_datagram(datagram, addr)
+
+        for key, entry in list(self._in_flight.items()):
+            if entry.deadline > now or key not in self._in_flight:
+                continue  # not due yet, or finished by an earlier callback in this pass
+            self.log(f"Timeout waiting for ACK for seq {entry.seq} (rto={entry.rto:.3f}s)")
+            estimator = self.rtt_estimator(entry.addr)
+            if entry.attempts >= self.max_retries:
+                self.log(f"Giving up on seq={entry.seq} after {self.max_retries} retries.")
+                estimator.on_timeout(entry.rto)
+                self._finish(key, False)
             else:
-                self.log(f"Sending seq={seq}, attempt={attempt}")
-                self.sock.sendto(payload, addr)
+                entry.rto = estimator.on_timeout(entry.rto)
+                self._transmit(entry)
 
-            # wait for ack
-            self.sock.settimeout(self.timeout)
-            try:
-                data, _ = self.sock.recvfrom(65535)
-            except socket.timeout:
-                self.log(f"Timeout waiting for ACK for seq {seq}")
-                continue  # retry
-            finally:
-                self.sock.settimeout(None)
+    # ---------- RTT estimation ----------
 
-            try:
-                msg = self.parser.decode_message(data.decode("utf-8"))
-            except Exception as e:
-                self.log("Failed to decode potential ACK:", e)
+    def rtt_estimator(self, addr) -> RttEstimator:
+        estimator = self._rtt.get(addr)
+        if estimator is None:
+            estimator = RttEstimator(self.timeout, self.min_rto, self.max_rto)
+            self._rtt[addr] = estimator
+        return estimator
+
+    def rtt_stats(self, addr) -> Dict[str, Any]:
+        """Live SRTT / RTTVAR / RTO for a peer, for connection-quality display."""
+        return self.rtt_estimator(addr).stats()
+
+    def pending_count(self) -> int:
+        """Messages still waiting for an ACK, including those not yet sent."""
+        return len(self._in_flight) + sum(len(b) for b in self._backlog.values())
+
+    # ---------- receiving ----------
+
+    def poll(self, timeout: Optional[float] = None):
+        """
+        Wait for at most one datagram and process it.
+
+        ACKs complete their pending send; everything else goes to the inbox
+        for recv(). The wait is cut short by the next retransmission
+        deadline, and expired timers are serviced before returning.
+        timeout=None means "block until something happens".
+        """
+        wait = timeout
+        next_deadline = self._next_deadline()
+        if next_deadline is not None:
+            until_deadline = max(0.0, next_deadline - time.monotonic())
+            wait = until_deadline if wait is None else min(wait, until_deadline)
+
+        self.sock.settimeout(wait)
+        try:
+            self._receive_into()
+        except (socket.timeout, BlockingIOError):
+            pass
+        finally:
+            self.sock.settimeout(None)
+        self._service_timers()
+
+    def _receive_into(self):
+        """Read one datagram into a pooled buffer and process it in place."""
+        # only the decoded message and fragment chunks are allocated; see
+        # session_stats()["rx_bytes_per_message"]
+        buf = self._buffers.acquire()
+        try:
+            nbytes, addr = self.sock.recvfrom_into(buf)
+            with memoryview(buf) as view:
+                self._handle_datagram(view[:nbytes], addr)
+        finally:
+            self._buffers.release(buf)
+
+    def _handle_datagram(self, data, addr):
+        """
+        Process one datagram. data may be bytes or a memoryview into a
+        receive buffer that is reused afterwards, so nothing may keep a
+        reference to it (fragment chunks are copied, messages decoded).
+        """
+        if not bundling.is_bundle(data):
+            self._handle_message(data, addr)
+            return
+        for part in bundling.split_bundle(data):
+            if bundling.is_bundle(part):
+                # we never nest bundles; a crafted one could nest deep enough to overflow the stack
+                self.stats["rx_rejected"] += 1
+                self.log("Dropping a bundle nested in a bundle")
                 continue
+            self._handle_message(part, addr)
 
-            if self._is_ack_for(msg, seq):
-                self.log(f"Received ACK for seq={seq}")
-                return True
-            else:
-                self.log("Received non-ACK or wrong seq while waiting for ACK:", msg)
+    def _handle_message(self, data, addr):
+        """Process one message (or fragment) of a datagram."""
+        if fragmentation.is_fragment(data):
+            data = self._handle_fragment(data, addr)
+            if data is None:
+                return
+
+        if compression.is_compressed(data):
+            try:
+                data = self.compression.decompress(data, self._reassembler.max_bytes)
+            except ValueError as e:
+                self.log("Dropping undecompressable message:", e)
+                return
+            self.stats["rx_bytes_allocated"] += len(data)
+
+        if self.header_peek and self._handle_header(data, addr):
+            return
 
-        self.log(f"Giving up on seq={seq} after {self.max_retries} retries.")
+        try:
+            msg = self.parser.decode_message(data)
+        except Exception as e:
+            self.log("Failed to decode incoming datagram:", e)
+            return
+        self.stats["rx_messages"] += 1
+        self.stats["rx_bytes_allocated"] += len(data)  # the decoded text
+        error = self._validate(msg)
+        if error is not None:
+            self.stats["rx_rejected"] += 1
+            self.log("Rejected incoming message:", error)
+            return
+
+        if msg.get("message_type") == "ACK":
+            if "ack" not in msg:
+                # single-message ACK (older peers, or a seq outside the SACK window)
+                msg["ack"] = int(msg.get("sequence_number", -1))
+            self._process_acks(msg, addr)
+            return
+
+        if "ack" in msg:
+            self._process_acks(msg, addr)
+            for field in ACK_FIELDS:
+                msg.pop(field, None)
+        self._deliver(msg, addr)
+
+    def _validate(self, msg) -> Optional[str]:
+        """Why msg must be dropped (not an object, or fails the schema), or None."""
+        # runs before anything else looks at msg, so callers may index required fields
+        if type(msg) is not dict:
+            return "not a JSON object"
+        if self.schema is None:
+            return None
+        return self.schema.validate(msg)
+
+    def _handle_header(self, data, addr) -> bool:
+        """
+        Fast path: deal with pure ACKs and already-seen messages from the
+        peeked header alone (no dict, no schema check, no verbose hooks).
+        Returns False if the message needs the full decode.
+        """
+        header = self.parser.peek_header(data)
+        if header is None:
+            return False
+        if header.ack is not None:
+            self.stats["rx_messages"] += 1
+            self.stats["rx_fast_acks"] += 1
+            self._process_ack_values(addr, *header.ack)
+            return True
+        seq = header.sequence_number
+        if seq is not None and header.message_type != "ACK" and self._received.seen(addr, seq):
+            # a retransmission of something the application already took:
+            # our ACK got lost, so just ACK it again
+            self.stats["rx_messages"] += 1
+            self.stats["rx_fast_duplicates"] += 1
+            self.send_ack(addr, seq)
+            return True
         return False
 
-    def is_duplicate(self, msg_dict: Dict[str, Any]) -> bool:
-        """Check if a message with this sequence number has already been received."""
+    def _process_acks(self, fields: Dict[str, Any], addr):
+        """Complete every in-flight message to addr that the ACK fields cover."""
+        self._process_ack_values(
+            addr,
+            int(fields.get("ack", -1)),
+            int(fields.get("ack_cum", 0)),
+            int(fields.get("ack_bits", 0)),
+        )
+
+    def _process_ack_values(self, addr, largest: int, cumulative: int, bitmap: int):
+        # acks.covers() inlined: this runs for every ACK against the peer's whole window
+        acked = []
+        for seq in self._peer_in_flight.get(addr, ()):
+            offset = largest - seq
+            if offset == 0 or seq <= cumulative or (0 < offset < 64 and bitmap >> offset & 1):
+                acked.append((addr, seq))
+        if not acked:
+            return
+        now = time.monotonic()
+        for key in acked:
+            entry = self._in_flight.get(key)
+            if entry is None:
+                continue  # finished by an earlier callback in this loop
+            if entry.attempts == 1:
+                # Karn's rule: only unambiguous (never retransmitted) samples
+                self.rtt_estimator(addr).on_sample(now - entry.first_sent)
+            self.log(f"Received ACK for seq={entry.seq}")
+            self._finish(key, True)
+
+    def _handle_fragment(self, data: bytes, addr) -> Optional[bytes]:
+        """Store and ACK one fragment; return the whole payload once it is complete."""
+        # every fragment has its own seq, so the sender resends only the lost ones;
+        # an ACKed fragment is never resent, hence ACK only what the reassembler kept
+        try:
+            seq, message_id, index, count, chunk = fragmentation.decode_fragment(data)
+        except ValueError as e:
+            self.log("Dropping malformed fragment:", e)
+            return None
+
+        self.stats["rx_bytes_allocated"] += len(chunk)  # copied out of the receive buffer
+        stored, whole = self._reassembler.offer(addr, message_id, index, count, chunk)
+        if not stored:
+            # no ACK: the sender retries it once there is room again
+            self.log(f"Reassembly full, refusing fragment seq={seq}")
+            return None
+        self.send_ack(addr, seq)
+        if whole is not None:
+            self.stats["rx_bytes_allocated"] += len(whole)
+            self.log(f"Reassembled seq={message_id} from {count} fragments ({len(whole)} bytes)")
+        return whole
+
+    def recv(self, timeout: Optional[float] = None):
+        """
+        Return the next non-ACK message as (msg_dict, addr).
+
+        Keeps servicing ACKs and retransmissions while it waits. Returns
+        None if timeout (seconds) elapses first; timeout=None blocks.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while not self._inbox:
+            if end is None:
+                self.poll()
+                continue
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.poll(remaining)
+        return self._inbox.popleft()
+
+    def is_duplicate(self, msg_dict: Dict[str, Any], addr=None) -> bool:
+        """
+        Check if a message with this sequence number has already been received
+        from addr. Each peer has its own sequence space; callers that do not
+        pass addr share a single window.
+        """
         if "sequence_number" not in msg_dict:
             return False
-        seq = msg_dict.get("sequence_number")
-        if seq in self._received_seqs:
-            self.log(f"Duplicate message detected: seq={seq}")
+        seq = int(msg_dict.get("sequence_number"))
+        if not self._received.check_and_update(addr, seq):
+            self.log(f"Duplicate message detected: seq={seq} from {addr}")
             return True
-        self._received_seqs.add(seq)
         return False
 
+    # ---------- ACKs ----------
+
     def send_ack(self, addr, sequence_number: int) -> bool:
-        """Send an ACK message back to the sender."""
-        ack_msg = {
-            "message_type": "ACK",
-            "sequence_number": sequence_number,
-        }
-        payload = self.parser.encode_message(ack_msg).encode("utf-8")
+        """
+        Acknowledge sequence_number from addr.
+
+        The ACK is coalesced with others for the same peer and sent with the
+        next outgoing message, or as a pure ACK once ack_delay expires.
+        """
+        self.stats["acks_requested"] += 1
+        state = self._acks.get(addr)
+        if state is None:
+            state = AckState()
+            self._acks[addr] = state
+
+        if not state.record(sequence_number):
+            # too old for the SACK bitmap: acknowledge it on its own
+            return self._send_ack_datagram(addr, {"sequence_number": sequence_number})
+
+        if self.ack_delay <= 0 or state.pending >= self.ack_every:
+            return self._send_pure_ack(addr)
+        if state.deadline is None:
+            state.deadline = time.monotonic() + self.ack_delay
+            self._timers_changed()
+        return True
+
+    def flush_acks(self, addr=None):
+        """Send every pending ACK now (e.g. before blocking on something else)."""
+        for peer, state in list(self._acks.items()):
+            if state.pending and (addr is None or peer == addr):
+                self._send_pure_ack(peer)
+
+    def _attach_acks(self, message_dict: Dict[str, Any], addr):
+        fields = self._pending_ack_fields(addr)
+        if fields:
+            message_dict.update(fields)
+            self._acks_piggybacked(addr)
+
+    def _pending_ack_fields(self, addr) -> Optional[Dict[str, int]]:
+        """The ACK fields for addr if any ACK is pending, without clearing it."""
+        state = self._acks.get(addr)
+        if state is None or not state.pending:
+            return None
+        return state.fields()
+
+    def _acks_piggybacked(self, addr):
+        self._acks[addr].clear_pending()
+        self.stats["acks_piggybacked"] += 1
+
+    def _send_pure_ack(self, addr) -> bool:
+        state = self._acks[addr]
+        fields = state.fields()
+        state.clear_pending()
+        return self._send_ack_datagram(addr, {"sequence_number": fields["ack"], **fields})
+
+    def _send_ack_datagram(self, addr, fields: Dict[str, Any]) -> bool:
+        ack_msg = {"message_type": "ACK", **fields}
+        payload = self._encode(ack_msg, addr)
         try:
-            self.sock.sendto(payload, addr)
-            self.log(f"Sent ACK for seq={sequence_number}")
+            # the ACK already waited ack_delay: send it together with anything bundled
+            self._output(payload, addr, urgent=True)
+            self.stats["ack_datagrams"] += 1
+            self.log(f"Sent ACK {fields}")
             return True
         except Exception as e:
-            self.log(f"Failed to send ACK for seq={sequence_number}: {e}")
+            self.log(f"Failed to send ACK {fields}: {e}")
             return False
+
+    def session_stats(self) -> Dict[str, int]:
+        """Datagram counters for this session, including ACK datagrams saved
+        and bytes allocated per received message."""
+        stats = dict(self.stats)
+        stats["ack_datagrams_saved"] = stats["acks_requested"] - stats["ack_datagrams"]
+        stats["rx_bytes_per_message"] = stats["rx_bytes_allocated"] // max(1, stats["rx_messages"])
+        stats["rx_buffer_misses"] = self._buffers.misses
+        return stats
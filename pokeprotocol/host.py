@@ -8,63 +8,22 @@ from networking.message_parser import MessageParser
 from game.battle_state import BattleState
 from pokeprotocol.protocols import Protocols
 from chat.chat_handler import ChatHandler
-from networking.udp import ReliableUDP
+from networking.async_udp import AsyncReliableUDP
+from networking.schema import REGISTRY
 from chat.verbose_mode import VerboseManager
 
+import asyncio
 import socket
 import random
 
 HOST = "127.0.0.1"
 PORT = 65432
-BUFFER_SIZE = 65535  # big enough for base64 stickers
 
 init_divider = "=============== INITIALIZATION ===========\n"
 battle_setup_divider = "=============== BATTLE SETUP ===========\n"
 
 
-def send_ack(sock: socket.socket, addr, seq: int, parser: MessageParser):
-    ack = {
-        "message_type": "ACK",
-        "sequence_number": seq,
-    }
-    sock.sendto(parser.encode_message(ack).encode("utf-8"), addr)
-
-
-def handle_incoming_with_chat(
-    sock: socket.socket,
-    addr,
-    msg: dict,
-    chat_handler: ChatHandler,
-    parser: MessageParser,
-):
-    """
-    For host: handle ACK and CHAT_MESSAGE, forward others to caller.
-    Returns:
-        - None if the message was handled here (chat/ACK).
-        - msg (dict) if it is a non-chat, non-ACK message.
-    """
-    mtype = msg.get("message_type")
-
-    if mtype == "ACK":
-        # ACKs are for the other side's ReliableUDP; we can ignore.
-        return None
-
-    if mtype == "CHAT_MESSAGE":
-        seq = msg.get("sequence_number")
-        if seq is not None:
-            send_ack(sock, addr, seq, parser)
-        if chat_handler is not None:
-            chat_handler.handle_incoming(msg)
-        else:
-            sender = msg.get("sender_name", "Unknown")
-            text = msg.get("message_text", "")
-            print(f"[CHAT] {sender}: {text}")
-        return None
-
-    return msg
-
-
-def init():
+async def init():
     parser = MessageParser()
     
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -81,8 +40,7 @@ def init():
             retry_count += 1
             if retry_count < max_retries:
                 print(f"[HOST] Port {PORT} in use, retrying... (attempt {retry_count}/{max_retries})")
-                import time
-                time.sleep(1)
+                await asyncio.sleep(1)
             else:
                 s.close()
                 print(f"[HOST] Failed to bind after {max_retries} attempts. Exiting.")
@@ -93,16 +51,25 @@ def init():
         print(f"[HOST] Host listening on {HOST}:{PORT}...")
         print("[HOST] Awaiting handshake...\n")
 
-        reliable = ReliableUDP(
+        reliable = await AsyncReliableUDP.create(
             socket_obj=s,
             parser=parser,
+            # initial RTO only; ReliableUDP adapts it per peer from ACK timing
             timeout=0.5,
-            max_retries=3,
+            max_retries=5,
+            min_rto=0.05,
+            max_rto=4.0,
+            bundle_delay=0.005,
+            recv_into=True,
+            schema=REGISTRY,  # drop malformed messages before the game sees them
             loss_prob=0.0,
             verbose=True,
         )
         
         protocols = Protocols(reliable)
+        protocols.accept_spectators = True
+        # chat (and ACKs, inside reliable) are handled in the background from here on
+        protocols.start_dispatcher()
 
         chat_handler = None
         joiner_addr = None
@@ -110,17 +77,11 @@ def init():
 
         # === HANDSHAKE LOOP ===
         while True:
-            data, addr = s.recvfrom(BUFFER_SIZE)
-            msg = parser.decode_message(data.decode("utf-8"))
+            msg, addr = await protocols.recv_non_chat()
             message_type = msg.get("message_type")
 
-            # handle chat or ACK even before joiner is fully set up
-            if message_type in ("CHAT_MESSAGE", "ACK"):
-                handled = handle_incoming_with_chat(s, addr, msg, chat_handler, parser)
-                if handled is None:
-                    continue
-
-            if message_type not in ("HANDSHAKE_REQUEST", "SPECTATOR_REQUEST"):
+            # (SPECTATOR_REQUEST is answered by the dispatcher, see Protocols.handle_spectator)
+            if message_type != "HANDSHAKE_REQUEST":
                 print(f"[HOST] Unexpected message type in init: {message_type}")
                 continue
 
@@ -131,11 +92,19 @@ def init():
                     print(f"[DBUG:HOST] Handshake from address: {addr}")
 
                 seed = random.randint(0, 9999)
+                codec = parser.choose_codec(msg.get("codecs"))
+                compression = reliable.compression.choose(msg.get("compression"))
                 resp = {
                     "message_type": "HANDSHAKE_RESPONSE",
                     "seed": seed,
+                    "codec": codec,
                 }
-                s.sendto(parser.encode_message(resp).encode("utf-8"), addr)
+                if compression is not None:
+                    resp["compression"] = compression
+                # the response itself still goes out as plain JSON
+                reliable.send_unreliable(resp, addr)
+                reliable.set_peer_codec(addr, codec)
+                reliable.set_peer_compression(addr, compression)
                 if VerboseManager.is_verbose():
                     print(f"[DBUG:HOST] Sent HANDSHAKE_RESPONSE with seed={seed}")
 
@@ -161,7 +130,9 @@ def init():
                     print("[DBUG:HOST] Starting battle setup phase")
 
                 # host chooses pokemon, etc. (host_battle_setup should use input_with_chat)
-                battle_data = protocols.host_battle_setup()
+                battle_data = await protocols.host_battle_setup()
+                if battle_data["communication_mode"] == "BROADCAST":
+                    protocols.enable_multicast()
                 if VerboseManager.is_verbose():
                     print(f"[DBUG:HOST] Host battle data prepared: {battle_data.get('pokemon_name', 'Unknown')}")
 
@@ -169,22 +140,15 @@ def init():
                     "message_type": "BATTLE_SETUP",
                     "battle_data": battle_data,
                 }
-                s.sendto(
-                    parser.encode_message(host_setup_msg).encode("utf-8"),
-                    joiner_addr,
-                )
+                reliable.send_unreliable(host_setup_msg, joiner_addr)
+                protocols.spectators.publish(host_setup_msg)
                 if VerboseManager.is_verbose():
                     print(f"[DBUG:HOST] Sent BATTLE_SETUP message to {joiner_addr}")
                 print("\nBattle setup data sent to Joiner. Awaiting Joiner response...\n")
 
-                # wait for joiner BATTLE_SETUP (still handling chat)
+                # wait for joiner BATTLE_SETUP (chat is handled by the dispatcher)
                 while True:
-                    data2, addr2 = s.recvfrom(BUFFER_SIZE)
-                    msg2 = parser.decode_message(data2.decode("utf-8"))
-
-                    handled2 = handle_incoming_with_chat(s, addr2, msg2, chat_handler, parser)
-                    if handled2 is None:
-                        continue
+                    handled2, addr2 = await protocols.recv_non_chat()
 
                     if handled2.get("message_type") != "BATTLE_SETUP":
                         print(
@@ -194,6 +158,7 @@ def init():
                         continue
 
                     joiner_msg = handled2
+                    protocols.spectators.publish(joiner_msg)
                     break
 
                 print("\nBattle setup data received from Joiner:")
@@ -209,7 +174,8 @@ def init():
                     print(f"[DBUG:HOST] BattleState initialized for host with seed={seed}")
                 joiner_raw = joiner_msg["battle_data"]
                 opp_battle_data = joiner_raw["pokemon_name"]
-                battle_state.set_pokemon_data(battle_data["pokemon_name"], opp_battle_data, battle_data["stat_boosts"])
+                battle_state.set_pokemon_data(battle_data["pokemon_name"], opp_battle_data, battle_data["stat_boosts"],
+                                              peer_digest=joiner_raw.get("damage_table"))
                 print(
                     f"\n[DBUG:HOST] Pokemon data set: "
                     f"Mine HP: {battle_state.my_pokemon['hp']} "
@@ -221,22 +187,18 @@ def init():
                 # Done with init; break out to start game
                 break
 
-            else:
-                # SPECTATOR_REQUEST – you can extend this if you want spectators
-                print(f"[HOST] Spectator handshake received from {addr}")
-                resp = {
-                    "message_type": "HANDSHAKE_RESPONSE",
-                    "seed": random.randint(0, 9999),
-                }
-                s.sendto(parser.encode_message(resp).encode("utf-8"), addr)
-                # For simplicity we don't attach spectator chat here.
-
         # === GAME LOOP ===
         if battle_state is not None and joiner_addr is not None:
-            protocols.start_game(s, joiner_addr, battle_state)
+            await protocols.start_game(joiner_addr, battle_state)
         else:
             print("[HOST] No battle_state created. Exiting.")
 
+        protocols.stop_dispatcher()
+        protocols.spectators.close()
+        if protocols.chat_handler is not None:
+            protocols.chat_handler.close()  # drop half-received sticker streams
+        reliable.close()
+
 
 if __name__ == "__main__":
-    init()
+    asyncio.run(init())
@@ -8,62 +8,21 @@ from networking.message_parser import MessageParser
 from game.battle_state import BattleState
 from pokeprotocol.protocols import Protocols
 from chat.chat_handler import ChatHandler
-from networking.udp import ReliableUDP
+from networking.async_udp import AsyncReliableUDP
+from networking.schema import REGISTRY
 from chat.verbose_mode import VerboseManager
 
+import asyncio
 import socket
 
 HOST = "127.0.0.1"
 PORT = 65432
-BUFFER_SIZE = 65535
 
 init_divider = "=============== INITIALIZATION ===========\n"
 battle_setup_divider = "=============== BATTLE SETUP ===========\n"
 
 
-def send_ack(sock: socket.socket, addr, seq: int, parser: MessageParser):
-    ack = {
-        "message_type": "ACK",
-        "sequence_number": seq,
-    }
-    sock.sendto(parser.encode_message(ack).encode("utf-8"), addr)
-
-
-def handle_incoming_with_chat(
-    sock: socket.socket,
-    addr,
-    msg: dict,
-    chat_handler: ChatHandler,
-    parser: MessageParser,
-):
-    """
-    For joiner: handle ACK and CHAT_MESSAGE, forward others to caller.
-    Returns:
-        - None if handled here (chat/ACK)
-        - msg dict if it is a non-chat, non-ACK message
-    """
-    mtype = msg.get("message_type")
-
-    if mtype == "ACK":
-        # ACK is meant for other side's ReliableUDP; ignore here.
-        return None
-
-    if mtype == "CHAT_MESSAGE":
-        seq = msg.get("sequence_number")
-        if seq is not None:
-            send_ack(sock, addr, seq, parser)
-        if chat_handler is not None:
-            chat_handler.handle_incoming(msg)
-        else:
-            sender = msg.get("sender_name", "Unknown")
-            text = msg.get("message_text", "")
-            print(f"[CHAT] {sender}: {text}")
-        return None
-
-    return msg
-
-
-def init():
+async def init():
     parser = MessageParser()
     
     with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
@@ -71,18 +30,27 @@ def init():
         print(f"[JOINER] Connected to host at {HOST}:{PORT}")
 
         # IMPORTANT: we DO NOT call s.connect() here
-        # so we can safely use sendto() with (HOST, PORT) and recvfrom().
+        # so we can safely use sendto() with (HOST, PORT) on the shared transport.
+        # Bind to an ephemeral port up front so the event loop can read from it.
+        s.bind(("", 0))
 
-        reliable = ReliableUDP(
+        reliable = await AsyncReliableUDP.create(
             socket_obj=s,
             parser=parser,
+            # initial RTO only; ReliableUDP adapts it per peer from ACK timing
             timeout=0.5,
-            max_retries=3,
+            max_retries=5,
+            min_rto=0.05,
+            max_rto=4.0,
+            bundle_delay=0.005,
+            recv_into=True,
+            schema=REGISTRY,  # drop malformed messages before the game sees them
             loss_prob=0.0,
             verbose=True,
         )
         
         protocols = Protocols(reliable)
+        protocols.start_dispatcher()
 
         chat_handler = ChatHandler(
             socket_obj=s,
@@ -98,22 +66,16 @@ def init():
             print(f"[DBUG:JOINER] Sending HANDSHAKE_REQUEST to {HOST}:{PORT}")
         handshake_req = {
             "message_type": "HANDSHAKE_REQUEST",
+            "codecs": parser.codec_names(),  # host picks one, JSON if it knows none
+            "compression": reliable.compression.names(),
         }
-        s.sendto(
-            parser.encode_message(handshake_req).encode("utf-8"),
-            (HOST, PORT),
-        )
+        reliable.send_unreliable(handshake_req, (HOST, PORT))
         if VerboseManager.is_verbose():
             print("[DBUG:JOINER] Handshake request sent, waiting for response...")
 
         # === WAIT FOR HANDSHAKE_RESPONSE ===
         while True:
-            data, addr = s.recvfrom(BUFFER_SIZE)
-            msg = parser.decode_message(data.decode("utf-8"))
-
-            handled = handle_incoming_with_chat(s, addr, msg, chat_handler, parser)
-            if handled is None:
-                continue
+            handled, addr = await protocols.recv_non_chat()
 
             if handled.get("message_type") != "HANDSHAKE_RESPONSE":
                 print(
@@ -123,6 +85,8 @@ def init():
                 continue
 
             seed = handled["seed"]
+            reliable.set_peer_codec((HOST, PORT), parser.choose_codec([handled.get("codec")]))
+            reliable.set_peer_compression((HOST, PORT), reliable.compression.choose([handled.get("compression")]))
             if VerboseManager.is_verbose():
                 print(f"[DBUG:JOINER] Received HANDSHAKE_RESPONSE with seed={seed}")
             print("[JOINER] Host message received:")
@@ -141,14 +105,9 @@ def init():
 
         # Wait for host's BATTLE_SETUP (while still handling chat)
         while True:
-            data, addr = s.recvfrom(BUFFER_SIZE)
-            msg = parser.decode_message(data.decode("utf-8"))
+            handled, addr = await protocols.recv_non_chat()
             if VerboseManager.is_verbose():
-                print(f"[DBUG:JOINER] Received message type: {msg.get('message_type')}")
-
-            handled = handle_incoming_with_chat(s, addr, msg, chat_handler, parser)
-            if handled is None:
-                continue
+                print(f"[DBUG:JOINER] Received message type: {handled.get('message_type')}")
 
             if handled.get("message_type") != "BATTLE_SETUP":
                 print(
@@ -167,32 +126,33 @@ def init():
         print("\nHost setup received. Now choose your Pokémon.\n")
 
         # Joiner chooses Pokémon (this should use input_with_chat internally)
-        joiner_battle_data = protocols.joiner_battle_setup()
+        joiner_battle_data = await protocols.joiner_battle_setup()
         if VerboseManager.is_verbose():
             print(f"[DBUG:JOINER] Joiner battle data prepared: {joiner_battle_data.get('pokemon_name', 'Unknown')}")
 
+        # === Initialize BattleState ===
+        # both Pokemon are known now, so the damage table is built before we reply
+        battle_state = BattleState(is_host=False, seed=seed, verbose=True)
+        if VerboseManager.is_verbose():
+            print(f"[DBUG:JOINER] BattleState initialized for joiner with seed={seed}")
+        my_poke_data = joiner_battle_data["pokemon_name"]
+        opp_poke_data = host_battle_data["pokemon_name"]
+        battle_state.set_pokemon_data(my_poke_data, opp_poke_data, joiner_battle_data["stat_boosts"])
+        if battle_state.damage_table is not None:
+            # the host checks it against its own table
+            joiner_battle_data["damage_table"] = battle_state.damage_table.digest
+
         # Send our setup back to host
         joiner_setup_msg = {
             "message_type": "BATTLE_SETUP",
             "battle_data": joiner_battle_data,
         }
-        s.sendto(
-            parser.encode_message(joiner_setup_msg).encode("utf-8"),
-            (HOST, PORT),
-        )
+        reliable.send_unreliable(joiner_setup_msg, (HOST, PORT))
         if VerboseManager.is_verbose():
             print("[DBUG:JOINER] Sent BATTLE_SETUP message to host")
         print("Battle setup data sent to Host.")
         print("Battle initialization complete!\n")
 
-        # === Initialize BattleState ===
-        battle_state = BattleState(is_host=False, seed=seed, verbose=True)
-        if VerboseManager.is_verbose():
-            print(f"[DBUG:JOINER] BattleState initialized for joiner with seed={seed}")
-        my_poke_data = joiner_battle_data["pokemon_name"]
-        opp_poke_data = host_battle_data["pokemon_name"]
-        battle_state.set_pokemon_data(my_poke_data, opp_poke_data, joiner_battle_data["stat_boosts"])
-
         print(
             f"[DBUG:JOINER] Pokemon data set: "
             f"Mine HP: {battle_state.my_pokemon['hp']} "
@@ -202,8 +162,13 @@ def init():
             print(f"[DBUG:JOINER] Joiner pokemon: {battle_state.my_pokemon.get('name', '?')}, Opponent: {battle_state.opponent_pokemon.get('name', '?')}")
 
         # === GAME LOOP ===
-        protocols.start_game(s, (HOST, PORT), battle_state)
+        await protocols.start_game((HOST, PORT), battle_state)
+
+        protocols.stop_dispatcher()
+        if protocols.chat_handler is not None:
+            protocols.chat_handler.close()  # drop half-received sticker streams
+        reliable.close()
 
 
 if __name__ == "__main__":
-    init()
+    asyncio.run(init())
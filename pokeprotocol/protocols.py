@@ -1,25 +1,48 @@
 from __future__ import annotations
 
 from typing import Optional
-import socket
+import asyncio
+import random
 
 from chat.chat_handler import ChatHandler
 from networking.message_parser import MessageParser
 from game.battle_state import BattleState
-from game.pokemon_stats import load_pokemon_stats, get_by_name
-from networking.udp import ReliableUDP
+from game.pokemon_stats import get_by_name
+from game.pokemon_table import get_pokemon_table
+from networking.async_udp import AsyncReliableUDP
+from networking.multicast import DEFAULT_GROUP, DEFAULT_PORT, MulticastSender, open_sender_socket
+from networking.schema import AttackAnnounce, CalculationReport
 from chat.verbose_mode import VerboseManager
+from pokeprotocol.spectators import SpectatorRegistry
+
+# damage of every move in a battle without a damage table (a Pokemon not in the CSV)
+MOVE_DAMAGE = 20
 
 your_turn_divider = "================== YOUR TURN ==============\n"
 their_turn_divider = "================== OPPONENT'S TURN =======\n"
 
 
 class Protocols:
-    def __init__(self, reliable: ReliableUDP):
-        self.pokemon_stats = load_pokemon_stats()
+    """
+    Battle flow on top of an AsyncReliableUDP. Every method that touches
+    the network or the keyboard is a coroutine, so the whole game, chat
+    and handshake share one event loop.
+    """
+
+    def __init__(self, reliable: AsyncReliableUDP):
+        self.pokemon_stats = get_pokemon_table()  # column store, loaded once per process from the compiled cache
         self.chat_handler: Optional[ChatHandler] = None
         self.reliable = reliable
         self.parser = MessageParser()
+        self._battle_inbox: asyncio.Queue = asyncio.Queue()  # non-chat messages for recv_non_chat()
+        self._dispatcher: Optional[asyncio.Task] = None
+        # battle messages skip the transport's bundling delay; chat may wait for company
+        self.urgent_battle_messages = True
+        # host only: answer SPECTATOR_REQUEST at any time, replay recent chat to
+        # them and forward every chat message and battle event from then on
+        self.accept_spectators = False
+        self.spectator_replay = 20
+        self.spectators = SpectatorRegistry(reliable)
 
     # ------------------------------------------------------------------
     # VERBOSE MODE
@@ -37,12 +60,13 @@ class Protocols:
     # ------------------------------------------------------------------
     def attach_chat_handler(self, handler: ChatHandler):
         self.chat_handler = handler
+        handler.on_chat = lambda event: self.spectators.publish(event.to_message())
 
     # ------------------------------------------------------------------
     # CHAT COMMANDS
     # ------------------------------------------------------------------
-    def maybe_handle_chat_command(self, text: str) -> bool:
-        """Intercept /chat, /sticker, /stickerfile commands."""
+    async def maybe_handle_chat_command(self, text: str) -> bool:
+        """Intercept /chat, /sticker, /stickerfile, /history, /search, /net commands."""
         if not text.startswith("/"):
             return False
 
@@ -50,11 +74,40 @@ class Protocols:
             print("[CHAT] (no chat handler attached)")
             return True
 
+        # /net -> connection quality to the peer
+        if text.strip() == "/net":
+            self.print_connection_quality(self.chat_handler.peer_addr)
+            if len(self.spectators):
+                self.print_spectator_stats()
+            return True
+
+        # /history [N] -> last N chat messages (default 10)
+        if text.strip() == "/history" or text.startswith("/history "):
+            arg = text[len("/history"):].strip()
+            if arg and not arg.isdigit():
+                print("[CHAT] Usage: /history [N]")
+                return True
+            events = self.chat_handler.history.last(int(arg) if arg else 10)
+            if not events:
+                print("[HISTORY] (no chat yet)")
+            for event in events:
+                print("[HISTORY]", event.format())
+            return True
+
+        # /search words -> chat messages containing all of them
+        if text.startswith("/search "):
+            query = text[len("/search "):].strip()
+            events = self.chat_handler.history.search(query)
+            print(f"[SEARCH] {len(events)} match(es) for '{query}'")
+            for event in events:
+                print("[SEARCH]", event.format())
+            return True
+
         # /chat message
         if text.startswith("/chat "):
             msg = text[len("/chat "):].strip()
             if msg:
-                self.chat_handler.send_text(msg)
+                await self.chat_handler.send_text(msg)
             else:
                 print("[CHAT] Usage: /chat <message>")
             return True
@@ -63,7 +116,7 @@ class Protocols:
         if text.startswith("/sticker "):
             name = text[len("/sticker "):].strip()
             if name:
-                self.chat_handler.send_sticker(name)
+                await self.chat_handler.send_sticker(name)
             else:
                 print("[CHAT] Usage: /sticker <name>")
             return True
@@ -77,48 +130,174 @@ class Protocols:
 
             path = parts[1]
             label = parts[2] if len(parts) == 3 else None
-            self.chat_handler.send_sticker_from_file(path, label)
+            await self.chat_handler.send_sticker_from_file(path, label)
             return True
 
         print("[CHAT] Unknown command.")
         return True
 
+    def print_connection_quality(self, addr):
+        stats = self.reliable.rtt_stats(addr)
+        if stats["srtt"] is None:
+            print(f"[NET] {addr}: no RTT samples yet (rto={stats['rto'] * 1000:.0f} ms)")
+            return
+        print(
+            f"[NET] {addr}: {stats['quality']} - "
+            f"srtt={stats['srtt'] * 1000:.1f} ms, "
+            f"rttvar={stats['rttvar'] * 1000:.1f} ms, "
+            f"rto={stats['rto'] * 1000:.0f} ms, "
+            f"samples={stats['samples']}, timeouts={stats['timeouts']}"
+        )
+        self.print_datagram_stats()
+
+    def print_datagram_stats(self):
+        stats = self.reliable.session_stats()
+        print(
+            f"[NET] datagrams: {stats['data_datagrams']} data, "
+            f"{stats['ack_datagrams']} pure ACKs for {stats['acks_requested']} acknowledged messages "
+            f"({stats['acks_piggybacked']} piggybacked, {stats['ack_datagrams_saved']} ACK datagrams saved); "
+            f"{stats['datagrams_sent']} datagrams on the wire, {stats['messages_bundled']} messages bundled; "
+            f"received {stats['rx_messages']} messages, {stats['rx_bytes_per_message']} bytes allocated per message "
+            f"({stats['rx_fast_acks']} ACKs and {stats['rx_fast_duplicates']} duplicates handled from the header)"
+        )
+
+    def print_spectator_stats(self):
+        totals = self.spectators.totals()
+        print(
+            f"[NET] spectators: {totals['spectators']} watching ({totals['removed']} removed), "
+            f"{totals['published']} events published, {totals['sent']} delivered, "
+            f"{totals['dropped']} dropped, {totals['failed']} failed; "
+            f"worst lag {totals['max_lag']} events / {totals['max_lag_seconds'] * 1000:.0f} ms"
+        )
+        multicast = totals["multicast"]
+        if multicast is not None:
+            print(
+                f"[NET] multicast: {multicast['events']} events in {multicast['datagrams']} datagrams, "
+                f"{multicast['repaired']} of {multicast['nacked']} NACKed events repaired"
+            )
+        if VerboseManager.is_verbose():
+            for addr in self.spectators.addrs():
+                stats = self.spectators.stats(addr)
+                print(
+                    f"[NET]   {addr}: sent={stats['sent']} dropped={stats['dropped']} "
+                    f"failed={stats['failed']} lag={stats['lag']} (max {stats['max_lag']})"
+                )
+
     # ------------------------------------------------------------------
     # INPUT WRAPPER
     # ------------------------------------------------------------------
-    def input_with_chat(self, prompt: str) -> str:
+    async def input_with_chat(self, prompt: str) -> str:
+        """input() in a worker thread, so the loop keeps receiving while we type."""
+        loop = asyncio.get_running_loop()
         while True:
-            user_input = input(prompt).strip()
+            user_input = (await loop.run_in_executor(None, input, prompt)).strip()
             if user_input.startswith("/"):
-                self.maybe_handle_chat_command(user_input)
+                await self.maybe_handle_chat_command(user_input)
                 continue
             return user_input
 
     # ------------------------------------------------------------------
     # RECV FILTER
     # ------------------------------------------------------------------
-    def recv_non_chat(self, sock: socket.socket, bufsize=4096):
-        """Filter CHAT_MESSAGE from battle logic."""
-        while True:
-            data, addr = sock.recvfrom(bufsize)
-            msg = self.parser.decode_message(data.decode())
+    def start_dispatcher(self):
+        """Start the task that splits incoming chat from battle messages."""
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+
+    def stop_dispatcher(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
 
-            if msg.get("message_type") == "CHAT_MESSAGE":
-                if self.chat_handler:
-                    self.chat_handler.handle_incoming(msg)
+    async def _dispatch_loop(self):
+        while True:
+            msg, addr = await self.reliable.recv()
+            message_type = msg.get("message_type")
+            if message_type == "CHAT_MESSAGE":
+                self.handle_chat(msg, addr)
+                continue
+            if message_type == "SPECTATOR_REQUEST" and self.accept_spectators:
+                self.handle_spectator(addr)
+                continue
+            if message_type == "MULTICAST_NACK" and self.accept_spectators:
+                self.spectators.repair(addr, msg.get("missing"))
                 continue
+            self._battle_inbox.put_nowait((msg, addr))
+
+    def handle_spectator(self, addr):
+        """Answer a spectator's handshake, register it and replay the latest chat to it."""
+        print(f"[HOST] Spectator handshake received from {addr}")
+        resp = {
+            "message_type": "HANDSHAKE_RESPONSE",
+            "seed": random.randint(0, 9999),
+        }
+        self.reliable.send_unreliable(resp, addr)
+        backlog = []
+        if self.chat_handler is not None:
+            # straight from our history: the original senders are not involved
+            backlog = self.chat_handler.history.replay(self.spectator_replay)
+        self.spectators.add(addr, backlog)
+
+    def enable_multicast(self, group: str = DEFAULT_GROUP, port: int = DEFAULT_PORT):
+        """BROADCAST mode: send spectator events once to a multicast group instead of to each spectator."""
+        sender = MulticastSender(open_sender_socket(), self.parser, group, port)
+        sender.start()
+        self.spectators.enable_multicast(sender)
+        print(f"[HOST] Broadcasting to spectators on multicast group {group}:{port}")
+
+    def handle_chat(self, msg: dict, addr):
+        """ACK a CHAT_MESSAGE right away and show it (once)."""
+        if self.chat_handler is not None and not self.chat_handler.can_accept(msg):
+            # sticker worker is backed up: no ACK, so the peer resends it later
+            return
+        seq = msg.get("sequence_number")
+        if seq is not None:
+            self.reliable.send_ack(addr, seq)
+            if self.reliable.is_duplicate(msg, addr):
+                return
+
+        if self.chat_handler is not None:
+            self.chat_handler.handle_incoming(msg)
+        else:
+            sender = msg.get("sender_name", "Unknown")
+            text = msg.get("message_text", "")
+            print(f"[CHAT] {sender}: {text}")
+
+    async def recv_non_chat(self):
+        """
+        Next non-chat message as (msg, addr).
 
-            return msg, addr
+        Chat is handled by the dispatcher task as soon as it arrives, even
+        while we are waiting at a prompt.
+        """
+        return await self._battle_inbox.get()
+
+    async def _recv_battle(self, addr):
+        """Next battle message from addr: ACKed, duplicates skipped, forwarded to spectators."""
+        while True:
+            msg, _ = await self.recv_non_chat()
+            if "sequence_number" in msg:
+                self.reliable.send_ack(addr, msg["sequence_number"])
+                if self.reliable.is_duplicate(msg, addr):
+                    continue
+            break
+        self.spectators.publish(msg)
+        return msg
+
+    async def _send_battle(self, msg: dict, addr) -> bool:
+        """Send a battle message to the opponent; spectators get it too."""
+        self.spectators.publish(msg)
+        return await self.reliable.send_reliable(msg, addr, urgent=self.urgent_battle_messages)
 
     # ------------------------------------------------------------------
     # BATTLE SETUP: HOST
     # ------------------------------------------------------------------
-    def host_battle_setup(self):
+    async def host_battle_setup(self):
         health = 100
 
         # comms
         while True:
-            comms = self.input_with_chat("What communication mode would you like? (P2P/BROADCAST) ")
+            comms = await self.input_with_chat("What communication mode would you like? (P2P/BROADCAST) ")
             comms = comms.upper()
             if comms in ("P2P", "BROADCAST"):
                 break
@@ -126,7 +305,7 @@ class Protocols:
 
         # pokemon
         while True:
-            poke_name = self.input_with_chat("Choose your Pokemon: ").lower()
+            poke_name = (await self.input_with_chat("Choose your Pokemon: ")).lower()
             poke = get_by_name(poke_name, self.pokemon_stats)
             if poke is None:
                 print("Pokemon not found in CSV.")
@@ -135,8 +314,8 @@ class Protocols:
             mypoke = {"pokemon": poke_name, "hp": health}
             break
 
-        atk = self.input_with_chat("How much special attack boost? ")
-        df = self.input_with_chat("How much special defense boost? ")
+        atk = await self.input_with_chat("How much special attack boost? ")
+        df = await self.input_with_chat("How much special defense boost? ")
 
         return {
             "communication_mode": comms,
@@ -150,12 +329,12 @@ class Protocols:
     # ------------------------------------------------------------------
     # BATTLE SETUP: JOINER
     # ------------------------------------------------------------------
-    def joiner_battle_setup(self):
+    async def joiner_battle_setup(self):
         health = 140
 
-        poke_name = self.input_with_chat("Choose your Pokemon: ").lower()
-        atk = self.input_with_chat("How much special attack boost? ")
-        df = self.input_with_chat("How much special defense boost? ")
+        poke_name = (await self.input_with_chat("Choose your Pokemon: ")).lower()
+        atk = await self.input_with_chat("How much special attack boost? ")
+        df = await self.input_with_chat("How much special defense boost? ")
 
         return {
             "pokemon_name": {"pokemon": poke_name, "hp": health},
@@ -165,33 +344,40 @@ class Protocols:
             }
         }
 
+    # ------------------------------------------------------------------
+    # TURN DAMAGE
+    # ------------------------------------------------------------------
+    def _turn_damage(self, state: BattleState, your_turn: bool) -> int:
+        """
+        This turn's damage, from the battle's damage table and one draw of
+        the seeded RNG. Both peers roll once per turn, so they get the same.
+        """
+        if state.damage_table is None:
+            return MOVE_DAMAGE
+        return state.roll_damage("normal", your_turn)
+
     # ------------------------------------------------------------------
     # MAIN TURN: ATTACK
     # ------------------------------------------------------------------
-    def your_turn(self, sock, addr, state: BattleState):
+    async def your_turn(self, addr, state: BattleState):
         print(your_turn_divider)
+        self.log("Connection quality:", self.reliable.rtt_stats(addr)["quality"])
 
-        move = self.input_with_chat("Choose your attack move: ").lower()
+        move = (await self.input_with_chat("Choose your attack move: ")).lower()
+        damage = self._turn_damage(state, your_turn=True)
 
         attack_msg = {
             "message_type": "ATTACK_ANNOUNCE",
-            "move_name": {"move": move, "move_damage": 20},
+            "move_name": {"move": move, "move_damage": damage},
             "sequence_number": state.next_sequence_number(),
         }
 
         state.record_attack_announce(attack_msg["move_name"])
-        self.reliable.send_reliable(attack_msg, addr)
+        await self._send_battle(attack_msg, addr)
         print("Attack announced.\n")
 
         # wait for DEFENSE_ANNOUNCE
-        while True:
-            msg, _ = self.recv_non_chat(sock)
-            if "sequence_number" in msg:
-                if self.reliable.is_duplicate(msg):
-                    self.reliable.send_ack(addr, msg["sequence_number"])
-                    continue
-                self.reliable.send_ack(addr, msg["sequence_number"])
-            break
+        msg = await self._recv_battle(addr)
         if msg.get("message_type") != "DEFENSE_ANNOUNCE":
             print("Unexpected:", msg)
             return
@@ -199,7 +385,7 @@ class Protocols:
         state.receive_defense_announce()
 
         # damage
-        remaining = state.opponent_pokemon["hp"] - state.last_attack["move_damage"]
+        remaining = state.opponent_pokemon["hp"] - damage
         state.opponent_pokemon["hp"] = remaining
 
         calc_msg = {
@@ -207,84 +393,77 @@ class Protocols:
             "attacker": state.my_pokemon["pokemon"],
             "move_used": move,
             "remaining_health": state.my_pokemon["hp"],
-            "damage_dealt": 20,
+            "damage_dealt": damage,
             "defender_hp_remaining": remaining,
-            "status_message": f"{move} dealt 20 damage!",
+            "status_message": f"{move} dealt {damage} damage!",
             "sequence_number": state.next_sequence_number(),
         }
 
         state.send_calculation_confirm()
-        self.reliable.send_reliable(calc_msg, addr)
-        print(f"Damage dealt: {20} damage to opponent. Their HP: {remaining}\n")
+        await self._send_battle(calc_msg, addr)
+        print(f"Damage dealt: {damage} damage to opponent. Their HP: {remaining}\n")
 
         # wait opponent calc
-        while True:
-            msg, _ = self.recv_non_chat(sock)
-            if "sequence_number" in msg:
-                if self.reliable.is_duplicate(msg):
-                    self.reliable.send_ack(addr, msg["sequence_number"])
-                    continue
-                self.reliable.send_ack(addr, msg["sequence_number"])
-            break
+        msg = await self._recv_battle(addr)
+        report = CalculationReport.from_dict(msg)
+        if report is None:
+            print("Unexpected:", msg)
+            return
         state.receive_calculation_report(
-            msg["defender_hp_remaining"],
-            msg["sequence_number"],
+            report.defender_hp_remaining,
+            report.sequence_number,
         )
 
         # Record our own calculation (our remaining HP after opponent's counter)
-        if "remaining_health" in msg:
-            state.record_local_calculation(msg["remaining_health"])
-        else:
-            state.record_local_calculation(state.my_pokemon["hp"])
+        state.record_local_calculation(report.remaining_health)
         if state.both_confirmed():
             confirm = {
                 "message_type": "CALCULATION_CONFIRMATION",
                 "sequence_number": state.next_sequence_number(),
             }
-            self.reliable.send_reliable(confirm, addr)
+            await self._send_battle(confirm, addr)
             state.switch_turn()
 
     # ------------------------------------------------------------------
     # OPPONENT TURN
     # ------------------------------------------------------------------
-    def their_turn(self, sock, addr, state: BattleState):
+    async def their_turn(self, addr, state: BattleState):
         print(their_turn_divider)
         print("Waiting for opponent's move...\n")
 
-        while True:
-            msg, _ = self.recv_non_chat(sock)
-            if "sequence_number" in msg:
-                if self.reliable.is_duplicate(msg):
-                    self.reliable.send_ack(addr, msg["sequence_number"])
-                    continue
-                self.reliable.send_ack(addr, msg["sequence_number"])
-            break
-        state.receive_attack_announce(msg["move_name"])
+        msg = await self._recv_battle(addr)
+        attack = AttackAnnounce.from_dict(msg)
+        if attack is None:
+            print("Unexpected:", msg)
+            return
+        state.receive_attack_announce(attack.move_name)
+        # our own roll, not the announced damage: the reports below compare the two
+        damage = self._turn_damage(state, your_turn=False)
+        if damage != attack.move_name["move_damage"]:
+            print(f"[PROTOCOLS] Opponent announced {attack.move_name['move_damage']} damage, "
+                  f"our damage table gives {damage}")
 
         def_msg = {
             "message_type": "DEFENSE_ANNOUNCE",
             "sequence_number": state.next_sequence_number()
         }
-        self.reliable.send_reliable(def_msg, addr)
+        await self._send_battle(def_msg, addr)
         state.receive_defense_announce()
 
         # opponent calc
-        while True:
-            msg, _ = self.recv_non_chat(sock)
-            if "sequence_number" in msg:
-                if self.reliable.is_duplicate(msg):
-                    self.reliable.send_ack(addr, msg["sequence_number"])
-                    continue
-                self.reliable.send_ack(addr, msg["sequence_number"])
-            break
+        msg = await self._recv_battle(addr)
+        report = CalculationReport.from_dict(msg)
+        if report is None:
+            print("Unexpected:", msg)
+            return
         state.receive_calculation_confirm()
         state.receive_calculation_report(
-            msg["defender_hp_remaining"],
-            msg["sequence_number"],
+            report.defender_hp_remaining,
+            report.sequence_number,
         )
 
         # our calc
-        remaining = state.my_pokemon["hp"] - state.last_attack["move_damage"]
+        remaining = state.my_pokemon["hp"] - damage
         state.my_pokemon["hp"] = remaining
 
         calc_msg = {
@@ -292,26 +471,19 @@ class Protocols:
             "attacker": state.opponent_pokemon["pokemon"],
             "move_used": state.last_attack["move"],
             "remaining_health": state.opponent_pokemon["hp"],
-            "damage_dealt": state.last_attack["move_damage"],
+            "damage_dealt": damage,
             "defender_hp_remaining": remaining,
             "status_message": "Damage processed",
             "sequence_number": state.next_sequence_number(),
         }
 
-        self.reliable.send_reliable(calc_msg, addr)
-        print(f"Calculation processed: You took {state.last_attack['move_damage']} damage. HP: {remaining}\n")
+        await self._send_battle(calc_msg, addr)
+        print(f"Calculation processed: You took {damage} damage. HP: {remaining}\n")
         state.send_calculation_confirm()
         state.record_local_calculation(remaining)
 
         # wait confirm
-        while True:
-            msg, _ = self.recv_non_chat(sock)
-            if "sequence_number" in msg:
-                if self.reliable.is_duplicate(msg):
-                    self.reliable.send_ack(addr, msg["sequence_number"])
-                    continue
-                self.reliable.send_ack(addr, msg["sequence_number"])
-            break
+        msg = await self._recv_battle(addr)
 
         if msg.get("message_type") == "CALCULATION_CONFIRMATION":
             if state.both_confirmed():
@@ -320,16 +492,24 @@ class Protocols:
     # ------------------------------------------------------------------
     # GAME LOOP
     # ------------------------------------------------------------------
-    def start_game(self, sock, addr, state: BattleState):
+    async def start_game(self, addr, state: BattleState):
         while not state.check_game_over():
             if state.my_turn:
-                self.your_turn(sock, addr, state)
+                await self.your_turn(addr, state)
             else:
-                self.their_turn(sock, addr, state)
+                await self.their_turn(addr, state)
 
         print("\n\n===== GAME OVER =====\n")
         if state.winner == "me":
             print("YOU WON!\n")
         else:
             print("YOU LOST!\n")
-        print(f"Final HP - You: {state.my_pokemon['hp']}, Opponent: {state.opponent_pokemon['hp']}\n")
\ No newline at end of file
+        print(f"Final HP - You: {state.my_pokemon['hp']}, Opponent: {state.opponent_pokemon['hp']}\n")
+        if VerboseManager.is_verbose():
+            self.print_datagram_stats()
+            if len(self.spectators):
+                self.print_spectator_stats()
+        # let spectators catch up on the last events (a stuck one is not waited for long)
+        await self.spectators.flush(timeout=2.0)
+        # don't leave the ACK for the last message of the game behind
+        self.reliable.flush()
\ No newline at end of file
@@ -1,7 +1,13 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from networking.message_parser import MessageParser
-from networking.udp import ReliableUDP
-from pokeprotocol.protocols import Protocols
+from networking.async_udp import AsyncReliableUDP
+from networking.schema import REGISTRY
+from networking.multicast import MulticastSubscriber
 
+import asyncio
 import socket
 
 # GLOBAL VARIABLES AND CONSTANTS
@@ -11,26 +17,23 @@ PORT = 65432        # Port used by host
 divider = "=====================================\n\n"
 
 parser = MessageParser()
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-reliable = ReliableUDP(sock, verbose=True)
-protocols = Protocols(reliable)
 
 # will fix spectator once host/joiner are done:D
 # FUNCTIONS
-def spectator_handshake():
+async def spectator_handshake():
     with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-        
+        s.bind(("", 0))
+        reliable = await AsyncReliableUDP.create(s, parser, schema=REGISTRY)
+
         # Spectator connects to host
         print(f"[SPECTATOR] Connected to host at {HOST}:{PORT}")
         print(f"[SPECTATOR] Sending handshake request...\n")
 
         # Sending handshake request to host
         spectator_msg = "SPECTATOR_REQUEST"
-        spectator_response = parser.encode_message({"message_type": spectator_msg})
-        s.sendto(spectator_response.encode(), (HOST, PORT))
+        reliable.send_unreliable({"message_type": spectator_msg}, (HOST, PORT))
 
-        data, addr = s.recvfrom(1024)
-        host_msg = parser.decode_message(data.decode())
+        host_msg, addr = await reliable.recv()
         message_type = host_msg.get("message_type")
 
         # Host handshake response handling
@@ -41,8 +44,74 @@ def spectator_handshake():
             print("\n")
         else:
             print(f"[SPECTATOR] Unexpected message type: {message_type}")
+            reliable.close()
+            return
+
+        # The host replays its latest chat to us, then forwards every chat
+        # message and battle event (in BROADCAST mode through a multicast
+        # group, with lost events resent to us on request)
+        subscriber = None
+        try:
+            while True:
+                msg, addr = await reliable.recv()
+                seq = msg.get("sequence_number")
+                if seq is not None:
+                    reliable.send_ack(addr, seq)
+                    if reliable.is_duplicate(msg, addr):
+                        continue
+                if msg.get("message_type") == "MULTICAST_GROUP":
+                    if subscriber is None:
+                        host_addr = addr
+                        subscriber = MulticastSubscriber(
+                            parser,
+                            msg["multicast_group"],
+                            msg["multicast_port"],
+                            on_message=show,
+                            send_nack=lambda nack: reliable.send_unreliable(nack, host_addr),
+                            next_seq=msg["multicast_next"],
+                        )
+                        await subscriber.start()
+                        print(f"[SPECTATOR] Listening on multicast group {subscriber.group}:{subscriber.port}\n")
+                    continue
+                if "mc_seq" in msg and subscriber is not None:
+                    subscriber.feed(msg)  # a repair of an event we missed
+                    continue
+                show(msg)
+        finally:
+            if subscriber is not None:
+                subscriber.close()
+            reliable.close()
+
+
+def show(msg):
+    message_type = msg.get("message_type")
+    if message_type == "BATTLE_SETUP":
+        pokemon = msg.get("battle_data", {}).get("pokemon_name", {})
+        print(f"[BATTLE] {pokemon.get('pokemon', '?').capitalize()} enters with {pokemon.get('hp', '?')} HP")
+        return
+    if message_type == "ATTACK_ANNOUNCE":
+        print(f"[BATTLE] Attack: {msg.get('move_name', {}).get('move', '?')}")
+        return
+    if message_type == "CALCULATION_REPORT":
+        print(
+            f"[BATTLE] {msg.get('attacker', '?')}: {msg.get('status_message', '')} "
+            f"(defender HP {msg.get('defender_hp_remaining', '?')})"
+        )
+        return
+    if message_type != "CHAT_MESSAGE":
+        return
+    sender = msg.get("sender_name", "Unknown")
+    if msg.get("content_type") == "TEXT":
+        for text in msg.get("message_text", "").split("\n"):
+            print(f"[CHAT] {sender}: {text}")
+    else:
+        print(f"[CHAT] {sender} sent sticker: [{msg.get('sticker_name', 'sticker')}]")
 
 
 
 # MAIN
-spectator_handshake()
\ No newline at end of file
+if __name__ == "__main__":
+    try:
+        asyncio.run(spectator_handshake())
+    except KeyboardInterrupt:
+        pass
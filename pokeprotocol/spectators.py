@@ -0,0 +1,229 @@
+# pokeprotocol/spectators.py
+
+"""
+Host-side fan-out of the game to its spectators.
+
+The host keeps a SpectatorRegistry of everyone who sent a
+SPECTATOR_REQUEST. publish(msg) hands a chat message or battle event to
+every spectator and returns at once: each spectator has its own bounded
+queue, and at most max_in_flight of its messages are waiting for an
+ACK at any time (ReliableUDP gives every peer its own window too). So a
+slow or vanished spectator only falls behind on its own queue; the
+battle loop and the other spectators never wait for it.
+
+When a spectator's queue is full the oldest queued event is dropped to
+make room (a spectator would rather see the game late than stalled).
+A spectator whose last max_failures messages all went unACKed is
+assumed gone and removed; it can rejoin with a new SPECTATOR_REQUEST.
+
+Per spectator the registry counts events sent, dropped and failed, and
+its lag: events it is behind (queued + waiting for an ACK) and how long
+the oldest of them has been waiting.
+
+In BROADCAST mode (enable_multicast) events are instead sent once to a
+multicast group (networking.multicast). The per-spectator queues then
+only carry what is meant for one spectator: the MULTICAST_GROUP message
+telling it where to listen, its chat replay, and repairs of the events
+it NACKed.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from chat.verbose_mode import VerboseManager
+from networking.multicast import MulticastSender
+
+
+class _Spectator:
+    __slots__ = ("addr", "queue", "in_flight", "sent", "dropped", "failed",
+                 "failures_in_row", "max_lag")
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.queue: Deque[Tuple[float, Dict[str, Any]]] = deque()   # (published at, msg)
+        self.in_flight: Dict[asyncio.Future, float] = {}            # send future -> published at
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.failures_in_row = 0
+        self.max_lag = 0
+
+    def lag(self) -> int:
+        return len(self.queue) + len(self.in_flight)
+
+    def lag_seconds(self, now: float) -> float:
+        oldest = list(self.in_flight.values())
+        if self.queue:
+            oldest.append(self.queue[0][0])
+        return now - min(oldest) if oldest else 0.0
+
+
+class SpectatorRegistry:
+    def __init__(self, reliable, max_queue: int = 256, max_in_flight: int = 4, max_failures: int = 3):
+        self.reliable = reliable   # networking.async_udp.AsyncReliableUDP
+        self.max_queue = max(1, max_queue)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_failures = max(1, max_failures)
+        self._spectators: Dict[Any, _Spectator] = {}
+        self.multicast: Optional[MulticastSender] = None
+        self.published = 0
+        self.removed = 0
+
+    def log(self, *args):
+        if VerboseManager.is_verbose():
+            print("[SPECTATORS]", *args)
+
+    def __len__(self) -> int:
+        return len(self._spectators)
+
+    def __contains__(self, addr) -> bool:
+        return addr in self._spectators
+
+    def addrs(self) -> List[Any]:
+        return list(self._spectators)
+
+    # ---------- membership ----------
+
+    def add(self, addr, backlog: Iterable[Dict[str, Any]] = ()) -> bool:
+        """
+        Register addr (again) and queue backlog (e.g. recent chat) for it
+        ahead of anything published from now on. Returns False if addr was
+        already registered; its counters are kept and only the backlog is
+        queued.
+        """
+        spectator = self._spectators.get(addr)
+        new = spectator is None
+        if new:
+            spectator = self._spectators[addr] = _Spectator(addr)
+            self.log(f"{addr} joined ({len(self._spectators)} watching)")
+        if self.multicast is not None:
+            self._queue(spectator, self._group_message())
+        for msg in backlog:
+            self._queue(spectator, msg)
+        self._pump(spectator)
+        return new
+
+    def remove(self, addr) -> bool:
+        spectator = self._spectators.pop(addr, None)
+        if spectator is None:
+            return False
+        spectator.queue.clear()
+        self.removed += 1
+        self.log(f"{addr} removed ({len(self._spectators)} watching)")
+        return True
+
+    # ---------- fan-out ----------
+
+    def enable_multicast(self, sender: MulticastSender):
+        """Publish through sender from now on, and tell everyone watching where to listen."""
+        self.multicast = sender
+        for spectator in list(self._spectators.values()):
+            self._queue(spectator, self._group_message())
+            self._pump(spectator)
+
+    def _group_message(self) -> Dict[str, Any]:
+        return {"message_type": "MULTICAST_GROUP", **self.multicast.group_info()}
+
+    def repair(self, addr, missing) -> int:
+        """Resend the multicast events a spectator NACKed, to it alone. Returns how many."""
+        spectator = self._spectators.get(addr)
+        if spectator is None or self.multicast is None or not isinstance(missing, list):
+            return 0   # only repair for spectators we know, never for arbitrary addresses
+        events = self.multicast.repair(missing)
+        for msg in events:
+            self._queue(spectator, msg)
+        self._pump(spectator)
+        return len(events)
+
+    def publish(self, msg: Dict[str, Any]) -> None:
+        """Hand msg to every spectator: one multicast datagram, or into each spectator's queue."""
+        self.published += 1
+        if self.multicast is not None:
+            self.multicast.publish(msg)
+            return
+        # each spectator gets its own sequence number, so drop the sender's
+        msg = {k: v for k, v in msg.items() if k != "sequence_number"}
+        for spectator in list(self._spectators.values()):
+            self._queue(spectator, msg)
+            self._pump(spectator)
+
+    def _queue(self, spectator: _Spectator, msg: Dict[str, Any]):
+        if len(spectator.queue) >= self.max_queue:
+            spectator.queue.popleft()
+            spectator.dropped += 1
+        spectator.queue.append((time.monotonic(), msg))
+        spectator.max_lag = max(spectator.max_lag, spectator.lag())
+
+    def _pump(self, spectator: _Spectator):
+        while spectator.queue and len(spectator.in_flight) < self.max_in_flight:
+            published, msg = spectator.queue.popleft()
+            future = self.reliable.send(msg, spectator.addr)
+            spectator.in_flight[future] = published
+            future.add_done_callback(lambda f, s=spectator: self._sent(s, f))
+
+    def _sent(self, spectator: _Spectator, future: asyncio.Future):
+        spectator.in_flight.pop(future, None)
+        if self._spectators.get(spectator.addr) is not spectator:
+            return   # removed (or rejoined) meanwhile
+        if not future.cancelled() and future.result():
+            spectator.sent += 1
+            spectator.failures_in_row = 0
+        else:
+            spectator.failed += 1
+            spectator.failures_in_row += 1
+            if spectator.failures_in_row >= self.max_failures:
+                print(f"[HOST] Spectator {spectator.addr} stopped answering, removed")
+                self.remove(spectator.addr)
+                return
+        self._pump(spectator)
+
+    async def flush(self, timeout: Optional[float] = None):
+        """Wait until every spectator's queue is empty and nothing is waiting for an ACK."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(s.lag() for s in self._spectators.values()):
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            pending = [f for s in self._spectators.values() for f in s.in_flight]
+            if pending:
+                await asyncio.wait(pending, timeout=0.1)
+            else:
+                await asyncio.sleep(0)
+
+    def close(self):
+        """Forget every spectator; messages already handed to the transport still go out."""
+        self._spectators.clear()
+        if self.multicast is not None:
+            self.multicast.close()
+            self.multicast = None
+
+    # ---------- counters ----------
+
+    def stats(self, addr) -> Optional[Dict[str, Any]]:
+        spectator = self._spectators.get(addr)
+        if spectator is None:
+            return None
+        return {
+            "sent": spectator.sent,
+            "dropped": spectator.dropped,
+            "failed": spectator.failed,
+            "lag": spectator.lag(),
+            "lag_seconds": spectator.lag_seconds(time.monotonic()),
+            "max_lag": spectator.max_lag,
+        }
+
+    def totals(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        spectators = list(self._spectators.values())
+        return {
+            "spectators": len(spectators),
+            "published": self.published,
+            "removed": self.removed,
+            "sent": sum(s.sent for s in spectators),
+            "dropped": sum(s.dropped for s in spectators),
+            "failed": sum(s.failed for s in spectators),
+            "max_lag": max((s.lag() for s in spectators), default=0),
+            "max_lag_seconds": max((s.lag_seconds(now) for s in spectators), default=0.0),
+            "multicast": dict(self.multicast.stats) if self.multicast is not None else None,
+        }
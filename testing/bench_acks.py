@@ -0,0 +1,62 @@
+"""
+ACK and duplicate processing rate with and without the header-peek fast
+path, for both codecs.
+
+    python -m testing.bench_acks
+"""
+
+import socket
+import time
+
+from networking.message_parser import MessageParser
+from networking.schema import REGISTRY
+from networking.udp import ReliableUDP
+
+N = 20000
+PEER = ("127.0.0.1", 9)   # discard port: nothing ever answers
+
+
+def make_transport(header_peek: bool) -> ReliableUDP:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    udp = ReliableUDP(sock, MessageParser(), schema=REGISTRY, header_peek=header_peek, timeout=60)
+    for i in range(8):  # a full window of messages waiting for their ACKs
+        udp.send({"message_type": "DEFENSE_ANNOUNCE"}, PEER)
+    return udp
+
+
+def rate(udp: ReliableUDP, datagram: bytes, repeat: int = 5) -> float:
+    """Datagrams per second, best of `repeat` runs (the machine may be noisy)."""
+    handle = udp._handle_datagram
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(N):
+            handle(datagram, PEER)
+        best = max(best, N / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    parser = MessageParser()
+    # an ACK for a sequence number that is not in flight, so the window stays full
+    ack = {"message_type": "ACK", "sequence_number": 1000, "ack": 1000, "ack_cum": 0, "ack_bits": 0b101}
+    dup = {"sequence_number": 3, "message_type": "ATTACK_ANNOUNCE",
+           "move_name": {"move": "thunderbolt", "move_damage": 20}}
+    print(f"{'message':10} {'codec':5} {'full decode/s':>14} {'header peek/s':>14} {'speedup':>8}")
+    for codec in ("json", "bin1"):
+        for name, msg in (("ACK", ack), ("duplicate", dup)):
+            datagram = parser.encode_bytes(msg, codec)
+            rates = []
+            for header_peek in (False, True):
+                udp = make_transport(header_peek)
+                udp.is_duplicate(dup, PEER)            # the application already took seq 3
+                # full path: the application ACKs the duplicate again and drops it
+                udp._deliver = lambda m, a, udp=udp: udp.send_ack(a, m["sequence_number"])
+                rates.append(rate(udp, datagram))
+                udp.sock.close()
+            print(f"{name:10} {codec:5} {rates[0]:14,.0f} {rates[1]:14,.0f} {rates[1] / rates[0]:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Encoded size and encode/decode time per message type, JSON vs binary.
+
+    python -m testing.bench_codecs
+"""
+
+import base64
+import os
+import timeit
+
+from networking.codecs import BinaryCodec, JsonCodec
+
+STICKER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "stickers", "smile.jpg")
+
+
+def sample_messages():
+    with open(STICKER, "rb") as f:
+        b64 = base64.b64encode(f.read()).decode("ascii")
+    acks = {"ack": 41, "ack_cum": 40, "ack_bits": 0b1011}
+    return {
+        "HANDSHAKE_RESPONSE": {"message_type": "HANDSHAKE_RESPONSE", "seed": 4821, "codec": "bin1"},
+        "BATTLE_SETUP": {"message_type": "BATTLE_SETUP", "battle_data": {
+            "pokemon_name": {"pokemon": "Pikachu", "hp": 35},
+            "stat_boosts": {"special_attack_uses": 3, "special_defense_uses": 2}}},
+        "ATTACK_ANNOUNCE": {"message_type": "ATTACK_ANNOUNCE", "sequence_number": 12,
+                            "move_name": {"move": "thunderbolt", "move_damage": 20}},
+        "DEFENSE_ANNOUNCE": {"message_type": "DEFENSE_ANNOUNCE", "sequence_number": 13, **acks},
+        "CALCULATION_REPORT": {"message_type": "CALCULATION_REPORT", "attacker": "Pikachu",
+                               "move_used": "thunderbolt", "remaining_health": 35, "damage_dealt": 20,
+                               "defender_hp_remaining": 15, "status_message": "thunderbolt dealt 20 damage!",
+                               "sequence_number": 14, **acks},
+        "CALCULATION_CONFIRMATION": {"message_type": "CALCULATION_CONFIRMATION", "sequence_number": 15},
+        "CHAT_MESSAGE (text)": {"message_type": "CHAT_MESSAGE", "sender_name": "HOST", "content_type": "TEXT",
+                                "message_text": "good luck!", "sequence_number": 16},
+        "CHAT_MESSAGE (sticker)": {"message_type": "CHAT_MESSAGE", "sender_name": "HOST",
+                                   "content_type": "STICKER_FILE", "sticker_name": "smile.jpg",
+                                   "sticker_data_b64": b64, "sequence_number": 17},
+        "ACK": {"message_type": "ACK", "sequence_number": 41, **acks},
+    }
+
+
+def main():
+    codecs = [JsonCodec(), BinaryCodec()]
+    print(f"{'message':26} {'codec':5} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for name, msg in sample_messages().items():
+        for codec in codecs:
+            encoded = codec.encode(msg)
+            number = 20 if len(encoded) > 10000 else 20000
+            enc = timeit.timeit(lambda: codec.encode(msg), number=number) / number * 1e6
+            dec = timeit.timeit(lambda: codec.decode(encoded), number=number) / number * 1e6
+            print(f"{name:26} {codec.name:5} {len(encoded):7d} {enc:10.2f} {dec:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
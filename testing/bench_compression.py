@@ -0,0 +1,50 @@
+"""
+Where compression pays off: compressed size and CPU time per algorithm
+for typical battle messages and the sample stickers, in both codecs.
+
+    python -m testing.bench_compression
+"""
+
+import base64
+import os
+import timeit
+
+from networking.codecs import BinaryCodec, JsonCodec
+from networking.compression import CompressionSet
+from testing.bench_codecs import sample_messages
+
+STICKERS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "stickers")
+
+
+def messages():
+    msgs = {k: v for k, v in sample_messages().items() if "sticker" not in k}
+    for name in sorted(os.listdir(STICKERS)):
+        with open(os.path.join(STICKERS, name), "rb") as f:
+            msgs[f"STICKER {name}"] = {
+                "message_type": "CHAT_MESSAGE", "sender_name": "HOST", "content_type": "STICKER_FILE",
+                "sticker_name": name, "sticker_data_b64": base64.b64encode(f.read()).decode("ascii"),
+                "sequence_number": 17,
+            }
+    return msgs
+
+
+def main():
+    compression = CompressionSet()
+    print(f"{'message':26} {'codec':5} {'bytes':>7} " +
+          " ".join(f"{name + ' bytes':>15} {'c/d us':>13}" for name in compression.names()))
+    for name, msg in messages().items():
+        for codec in (JsonCodec(), BinaryCodec()):
+            payload = codec.encode(msg)
+            number = 3 if len(payload) > 10000 else 300
+            cols = []
+            for algorithm, compressor in compression.by_name.items():
+                packed = compressor.compress(payload)
+                c = timeit.timeit(lambda: compressor.compress(payload), number=number) / number * 1e6
+                d = timeit.timeit(lambda: compressor.decompress(packed), number=number) / number * 1e6
+                saved = 100 * (1 - (len(packed) + 1) / len(payload))
+                cols.append(f"{len(packed) + 1:7d} ({saved:+4.0f}%) {c:6.0f}/{d:<6.0f}")
+            print(f"{name:26} {codec.name:5} {len(payload):7d} " + " ".join(cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Full N x N matchup table: calculate_damage() in a loop vs
+calculate_damage_batch() (NumPy, and the plain-Python fallback).
+
+    python -m testing.bench_damage_batch
+"""
+
+import random
+import time
+
+from game import damage_calculator
+from game.battle_state import BattleState
+from game.damage_calculator import calculate_damage, matchup_table
+from game.pokemon_table import get_pokemon_table
+
+
+def main():
+    table = get_pokemon_table()
+    n = len(table)
+    rows = [row.to_dict() for row in table]
+
+    # one pair at a time on dicts, as a battle does it; timed on a sample and scaled up
+    state = BattleState(is_host=True, seed=1)
+    state.rng = random.Random(1)
+    sample = 20000
+    start = time.perf_counter()
+    for k in range(sample):
+        state.set_pokemon_data(rows[k % n], rows[(k * 7) % n], None)
+        calculate_damage(state, "normal", your_turn=True)
+    loop = (time.perf_counter() - start) / sample * n * n
+
+    timings = {}
+    for mode in ("atk", "def", "normal"):
+        start = time.perf_counter()
+        matchup_table(table, mode)
+        timings[mode] = time.perf_counter() - start
+
+    numpy = damage_calculator.np
+    damage_calculator.np = None
+    start = time.perf_counter()
+    matchup_table(table)
+    plain = time.perf_counter() - start
+    damage_calculator.np = numpy
+
+    print(f"{n} x {n} = {n * n} matchups")
+    print(f"  calculate_damage() loop     {loop:8.2f} s  (from {sample} calls)")
+    for mode, seconds in timings.items():
+        print(f"  batch, NumPy, {mode:<6}        {seconds * 1000:8.1f} ms")
+    print(f"  batch, plain Python         {plain:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Cost of one turn's damage: calculate_damage() on the stat dicts vs the
+battle's damage table (a lookup and one variance draw).
+
+    python -m testing.bench_damage_table
+"""
+
+import time
+
+from game.battle_state import BattleState
+from game.damage_calculator import calculate_damage
+from game.pokemon_table import get_pokemon_table
+
+
+def per_turn_us(state, turns=50000):
+    start = time.perf_counter()
+    for turn in range(turns):
+        calculate_damage(state, ("atk", "def", "normal")[turn % 3], your_turn=turn % 2 == 0)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    table = get_pokemon_table()
+    mine, theirs = table.get("charizard").to_dict(), table.get("blastoise").to_dict()
+
+    start = time.perf_counter()
+    with_table = BattleState(is_host=True, seed=7)
+    with_table.set_pokemon_data(mine, theirs)
+    setup = (time.perf_counter() - start) * 1e6
+
+    dicts = BattleState(is_host=True, seed=7)
+    dicts.set_pokemon_data(mine, theirs)
+    dicts.damage_table = None
+
+    print(f"damage table setup            {setup:8.1f} us   (digest {with_table.damage_table.digest[:16]})")
+    print(f"turn from the stat dicts      {per_turn_us(dicts):8.2f} us")
+    print(f"turn from the damage table    {per_turn_us(with_table):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
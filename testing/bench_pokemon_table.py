@@ -0,0 +1,90 @@
+"""
+Memory per Pokemon and lookup latency: dataclasses vs PokemonTable,
+for the bundled CSV and a synthetic dataset 100x its size.
+
+    python -m testing.bench_pokemon_table
+"""
+
+import csv
+import gc
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from game.pokemon_stats import DEFAULT_CSV, load_pokemon_stats
+from game.pokemon_table import PokemonTable
+
+
+def allocated(fn):
+    """(result, bytes allocated by fn that are still alive)"""
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def per_call_us(fn, keys, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for key in keys:
+            fn(key)
+        best = min(best, time.perf_counter() - start)
+    return best / len(keys) * 1e6
+
+
+def write_scaled_csv(path, factor):
+    with open(DEFAULT_CSV, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields, rows = reader.fieldnames, list(reader)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        for copy in range(factor):
+            for row in rows:
+                writer.writerow(dict(row, name=f"{row['name']}-{copy}") if copy else row)
+
+
+def report(label, csv_path):
+    load_pokemon_stats(csv_path)   # compile the cache once
+    raw, raw_bytes = allocated(lambda: load_pokemon_stats(csv_path, use_cache=False))
+    stats, stats_bytes = allocated(lambda: load_pokemon_stats(csv_path))
+    table, table_bytes = allocated(lambda: PokemonTable.load(csv_path))
+    count = len(table)
+    del raw
+
+    keys = list(stats)[::max(1, count // 2000)]
+    dict_lookup = per_call_us(lambda k: stats[k].hp + stats[k].against_fire, keys)
+
+    def from_row(key):
+        row = table.get(key)
+        return row.hp + row["against_fire"]
+    table_lookup = per_call_us(from_row, keys)
+    indexes = [table.index_of(k) for k in keys]
+    column_lookup = per_call_us(lambda i: table.stats["hp"][i] + table.multiplier("against_fire", i), indexes)
+
+    print(f"{label}: {count} Pokemon")
+    print(f"  dataclasses + raw rows   {raw_bytes / count:8.0f} B/Pokemon")
+    print(f"  dataclasses (no raw)     {stats_bytes / count:8.0f} B/Pokemon")
+    print(f"  PokemonTable             {table_bytes / count:8.0f} B/Pokemon")
+    print(f"  dict lookup + 2 fields   {dict_lookup:8.3f} us")
+    print(f"  table.get() + 2 fields   {table_lookup:8.3f} us")
+    print(f"  by index, from columns   {column_lookup:8.3f} us")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "pokemon.csv")
+        shutil.copy(DEFAULT_CSV, csv_path)
+        report("bundled CSV", csv_path)
+        big_path = os.path.join(tmp, "pokemon_x100.csv")
+        write_scaled_csv(big_path, 100)
+        report("100x dataset", big_path)
+
+
+if __name__ == "__main__":
+    main()
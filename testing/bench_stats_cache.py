@@ -0,0 +1,42 @@
+"""
+Startup cost of the Pokemon stats: CSV parse vs compiled cache.
+
+    python -m testing.bench_stats_cache
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from game.pokemon_stats import DEFAULT_CSV, get_pokemon_stats, load_pokemon_stats
+
+
+def timed(fn, repeat=1):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "pokemon.csv")
+        shutil.copy(DEFAULT_CSV, csv_path)
+        parse = timed(lambda: load_pokemon_stats(csv_path, use_cache=False), repeat=5)
+        cold = timed(lambda: load_pokemon_stats(csv_path))   # parses and writes the cache
+        warm = timed(lambda: load_pokemon_stats(csv_path), repeat=5)
+        size = os.path.getsize(csv_path + ".cache")
+    get_pokemon_stats()
+    shared = timed(get_pokemon_stats, repeat=5)
+
+    print(f"CSV parse (no cache)          {parse:8.2f} ms")
+    print(f"cold start (parse + compile)  {cold:8.2f} ms")
+    print(f"warm start (from cache)       {warm:8.2f} ms   ({size} byte cache)")
+    print(f"get_pokemon_stats() again     {shared * 1000:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
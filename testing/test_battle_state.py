@@ -64,6 +64,9 @@ def test_basic_flow():
     # Joiner's turn
     assert joiner.can_attack() == True
     assert host.can_defend() == True
+
+    # verbose mode is process-wide: don't leave it on for the other tests
+    host.set_verbose(False)
     
     print("\n All tests passed!")
 
@@ -109,6 +112,7 @@ def test_verbose_toggle():
     battle.can_attack()
     battle.record_local_calculation(100)
     print("   ^^ Debug messages appeared above? Good!\n")
+    battle.set_verbose(False)   # process-wide: don't leave it on for the other tests
     
     print(" Verbose toggle test passed!")
 
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+from chat.verbose_mode import VerboseManager
+from networking import bundling
+from networking.codecs import BinaryCodec, JsonCodec
+from networking.message_parser import MessageParser
+from testing.test_udp import make_pair
+
+STICKER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "stickers", "smile.jpg")
+
+CALC_REPORT = {
+    "message_type": "CALCULATION_REPORT",
+    "attacker": "Pikachu",
+    "move_used": "thunderbolt",
+    "remaining_health": 35,
+    "damage_dealt": 20,
+    "defender_hp_remaining": -5,
+    "status_message": "thunderbolt dealt 20 damage!",
+    "sequence_number": 7,
+    "ack": 6, "ack_cum": 6, "ack_bits": 2 ** 63 + 1,
+}
+
+
+def test_binary_codec_round_trips_and_is_smaller():
+    codec = BinaryCodec()
+    with open(STICKER, "rb") as f:
+        sticker = {
+            "message_type": "CHAT_MESSAGE",
+            "sender_name": "HOST",
+            "content_type": "STICKER_FILE",
+            "sticker_name": "smile.jpg",
+            "sticker_data_b64": base64.b64encode(f.read()).decode("ascii"),
+            "sequence_number": 3,
+        }
+    attack = {"message_type": "ATTACK_ANNOUNCE", "move_name": {"move": "tackle", "move_damage": 20},
+              "sequence_number": 1}
+    for msg in (CALC_REPORT, sticker, attack, {"message_type": "ACK", "sequence_number": 9}):
+        encoded = codec.encode(msg)
+        assert codec.decode(encoded) == msg
+        assert len(encoded) < len(JsonCodec().encode(msg))
+    assert len(codec.encode(sticker)) < len(sticker["sticker_data_b64"]) * 0.8
+
+
+def test_binary_codec_keeps_values_that_do_not_fit_the_layout():
+    codec = BinaryCodec()
+    odd = {
+        "message_type": "CALCULATION_REPORT",
+        "damage_dealt": 20.5,             # float, not i32
+        "remaining_health": True,         # bool, not int
+        "defender_hp_remaining": 2 ** 40,  # out of range
+        "move_name": {"move": "x"},       # unexpected field
+        "sequence_number": 1,
+    }
+    assert codec.decode(codec.encode(odd)) == odd
+    unknown = {"message_type": "RESOLUTION_REQUEST", "sequence_number": 4, "x": [1, 2]}
+    assert codec.decode(codec.encode(unknown)) == unknown
+
+
+def test_binary_codec_rejects_truncated_input():
+    encoded = BinaryCodec().encode(CALC_REPORT)
+    for cut in (1, 5, len(encoded) - 1):
+        with pytest.raises(ValueError):
+            BinaryCodec().decode(encoded[:cut])
+
+
+def test_verbose_decode_of_non_object_json(monkeypatch, capsys):
+    monkeypatch.setattr(VerboseManager, "_verbose", True)
+    # valid JSON but not a message: the transport rejects it, the log must not crash first
+    assert MessageParser().decode_message(b"[1, 2]") == [1, 2]
+    assert "Decoded non-object" in capsys.readouterr().out
+
+
+def test_codec_negotiation_and_mixed_bundles():
+    parser = MessageParser()
+    assert parser.choose_codec(["zstd", "bin1", "json"]) == "bin1"
+    assert parser.choose_codec(None) == "json"       # peer from before codecs
+    assert MessageParser(codecs=[JsonCodec()]).choose_codec(parser.codec_names()) == "json"
+
+    a, b = make_pair(bundle_delay=0.05)
+    b_addr = b.sock.getsockname()
+    a.set_peer_codec(b_addr, "bin1")
+    a.send_unreliable({"message_type": "CHAT_MESSAGE", "message_text": "line\nbreak"}, b_addr)
+    a.send_unreliable(CALC_REPORT, b_addr, urgent=True)
+    assert a.session_stats()["datagrams_sent"] == 1
+
+    first, _ = b.recv(timeout=1)
+    second, _ = b.recv(timeout=1)
+    assert first["message_text"] == "line\nbreak"
+    assert second["status_message"] == CALC_REPORT["status_message"]
+    assert bundling.message_count(bundling.PREFIXED_MAGIC + b"\x00\x01{") == 1
+
+
+def test_header_peek_reads_acks_and_sequence_numbers():
+    parser = MessageParser()
+    ack = {"message_type": "ACK", "sequence_number": 9, "ack": 9, "ack_cum": 7, "ack_bits": 0b101}
+    data = {"sequence_number": 4, "message_type": "ATTACK_ANNOUNCE",
+            "move_name": {"move": "ember", "move_damage": 20}}
+    for codec in ("json", "bin1"):
+        header = parser.peek_header(parser.encode_bytes(ack, codec))
+        assert header.ack == (9, 7, 0b101)
+        single = parser.peek_header(parser.encode_bytes({"message_type": "ACK", "sequence_number": 3}, codec))
+        assert single.ack == (3, 0, 0)
+        header = parser.peek_header(parser.encode_bytes(data, codec))
+        assert header == ("ATTACK_ANNOUNCE", 4, None)
+    # JSON from other writers just takes the full decode
+    assert parser.peek_header(b'{"message_type": "ATTACK_ANNOUNCE", "sequence_number": 4}') is None
+
+
+def test_fast_path_handles_acks_and_duplicates_without_decoding():
+    a, b = make_pair()
+    b_addr = b.sock.getsockname()
+    a.set_peer_codec(b_addr, "bin1")
+
+    sent = a.send({"message_type": "CHAT_MESSAGE", "message_text": "hi"}, b_addr)
+    msg, addr = b.recv(timeout=1)
+    b.send_ack(addr, msg["sequence_number"])
+    assert not b.is_duplicate(msg, addr)
+    b.flush_acks()
+    while not sent.done():
+        a.poll(0.1)
+    assert a.session_stats()["rx_fast_acks"] == 1
+
+    # the ACK was lost and A retransmits: B re-ACKs without delivering it again
+    b._handle_datagram(a.parser.encode_bytes({**msg, "sequence_number": 1}, "bin1"), addr)
+    assert b.recv(timeout=0.05) is None
+    assert b.session_stats()["rx_fast_duplicates"] == 1
+
+
+def test_negotiated_compression_above_threshold():
+    from networking.compression import CompressionSet, LzmaCompressor
+
+    assert CompressionSet().choose(["brotli", "zlib"]) == "zlib"
+    assert CompressionSet([LzmaCompressor()]).choose(["zlib-dict1", "zlib"]) is None
+
+    a, b = make_pair()
+    b_addr = b.sock.getsockname()
+    a.set_peer_compression(b_addr, "zlib-dict1")
+    a.send_unreliable({"message_type": "DEFENSE_ANNOUNCE"}, b_addr)          # below threshold
+    a.send_unreliable(CALC_REPORT, b_addr)
+    noise = os.urandom(1000)  # like sticker image data: does not compress
+    a.set_peer_codec(b_addr, "bin1")
+    a.send_unreliable({"message_type": "CHAT_MESSAGE", "content_type": "STICKER_FILE",
+                       "sticker_data_b64": base64.b64encode(noise).decode("ascii")}, b_addr)
+
+    got = [b.recv(timeout=1)[0] for _ in range(3)]
+    assert got[1] == {k: v for k, v in CALC_REPORT.items() if not k.startswith("ack")}
+    assert base64.b64decode(got[2]["sticker_data_b64"]) == noise
+    stats = a.session_stats()
+    assert stats["compressed_messages"] == 1        # only the JSON report: the JPEG does not shrink
+    assert stats["compression_saved"] > 100
+
+    packed = a.compression.compress(b'{"x": "' + b"y" * 500 + b'"}', "zlib")
+    with pytest.raises(ValueError):
+        b.compression.decompress(packed[:-4])
+    with pytest.raises(ValueError):
+        b.compression.decompress(packed, max_length=100)
+
+
+def test_preset_dictionary_is_frozen():
+    from networking.compression import PRESET_DICTIONARY, DictZlibCompressor
+
+    # peers inflate "zlib-dict1" with these exact bytes: a new dictionary needs a new name
+    assert DictZlibCompressor.name == "zlib-dict1"
+    assert hashlib.sha256(PRESET_DICTIONARY).hexdigest() == \
+        "015c2d6122f0700b8c1c614ecd0b4ac5dc6339afdc0e5fe4dc6d5dde9b3013dd"
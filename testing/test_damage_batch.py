@@ -0,0 +1,62 @@
+import random
+
+from game import damage_calculator
+from game.battle_state import BattleState
+from game.damage_calculator import (DAMAGE_EFFECTS, calculate_damage, calculate_damage_batch, get_damage_effect,
+                                    matchup_table)
+from game.pokemon_table import get_pokemon_table
+
+PAIRS = [("pikachu", "gyarados"), ("charizard", "bulbasaur"), ("gengar", "snorlax"), ("mewtwo", "blissey"),
+         ("magikarp", "shuckle"), ("garchomp", "dragonite"), ("lucario", "skarmory"), ("sylveon", "gengar")]
+MODES = ["atk", "def", "normal"]
+
+
+def one_by_one(table, attacker, defender, mode, variance):
+    state = BattleState(is_host=True, seed=1)
+    state.set_pokemon_data(table.get(attacker).to_dict(), table.get(defender).to_dict(), None)
+    state.rng = random.Random(0)
+    state.rng.uniform = lambda a, b: variance
+    return calculate_damage(state, mode, your_turn=True)
+
+
+def test_batch_matches_calculate_damage():
+    table = get_pokemon_table()
+    pairs = [(a, d, mode) for a, d in PAIRS for mode in MODES]
+    batch = calculate_damage_batch(table, [table.index_of(a) for a, _, _ in pairs],
+                                   [table.index_of(d) for _, d, _ in pairs], [m for _, _, m in pairs])
+
+    for k, (attacker, defender, mode) in enumerate(pairs):
+        low, _ = one_by_one(table, attacker, defender, mode, 0.85)
+        high, _ = one_by_one(table, attacker, defender, mode, 1.0)
+        assert (batch.minimum[k], batch.maximum[k]) == (low, high)
+        assert low <= batch.expected[k] <= high
+
+        # the mean over the variance, by brute force
+        rolls = [one_by_one(table, attacker, defender, mode, 0.85 + 0.15 * (i + 0.5) / 500)[0] for i in range(500)]
+        assert abs(sum(rolls) / len(rolls) - batch.expected[k]) < 0.02
+        hp = table.get(defender).hp
+        assert batch.effect_names()[k] == get_damage_effect(hp, batch.expected[k])
+
+    assert set(batch.effect_names()) <= set(DAMAGE_EFFECTS)
+
+
+def test_without_numpy_gives_the_same(monkeypatch):
+    table = get_pokemon_table()
+    attackers = list(range(0, len(table), 37))
+    defenders = attackers[::-1]
+    batch = calculate_damage_batch(table, attackers, defenders, "atk")
+    monkeypatch.setattr(damage_calculator, "np", None)
+    plain = calculate_damage_batch(table, attackers, defenders, "atk")
+    assert list(plain.minimum) == list(batch.minimum) and list(plain.maximum) == list(batch.maximum)
+    assert all(abs(p - b) < 1e-9 for p, b in zip(plain.expected, batch.expected))
+    assert list(plain.effect) == list(batch.effect)
+
+
+def test_matchup_table_covers_every_pair():
+    table = get_pokemon_table()
+    batch = matchup_table(table, "def")
+    n = len(table)
+    assert len(batch.expected) == n * n
+    a, d = table.index_of("pikachu"), table.index_of("gyarados")
+    single = calculate_damage_batch(table, [a], [d], "def")
+    assert batch.expected[a * n + d] == single.expected[0] and batch.maximum[a * n + d] == single.maximum[0]
@@ -0,0 +1,143 @@
+import asyncio
+import random
+import socket
+
+from game.battle_state import BattleState
+from game.damage_calculator import calculate_damage
+from game.damage_table import STAT_MODES, DamageTable
+from game.pokemon_table import get_pokemon_table
+from networking.async_udp import AsyncReliableUDP
+from networking.message_parser import MessageParser
+from networking.schema import REGISTRY
+from pokeprotocol.protocols import Protocols
+
+
+def battle(host_poke="pikachu", joiner_poke="charmander", seed=4242):
+    host = BattleState(is_host=True, seed=seed)
+    joiner = BattleState(is_host=False, seed=seed)
+    host.set_pokemon_data({"pokemon": host_poke, "hp": 100}, {"pokemon": joiner_poke, "hp": 100})
+    joiner.set_pokemon_data({"pokemon": joiner_poke, "hp": 100}, {"pokemon": host_poke, "hp": 100})
+    return host, joiner
+
+
+def test_both_peers_build_the_same_table():
+    host, joiner = battle()
+    assert host.damage_table is not None
+    assert host.damage_table.digest == joiner.damage_table.digest
+    assert host.check_battle_state()["damage_table"] == joiner.check_battle_state()["damage_table"]
+    assert (host.damage_table.host, host.damage_table.joiner) == ("Pikachu", "Charmander")
+
+    other, _ = battle(joiner_poke="squirtle")
+    assert other.damage_table.digest != host.damage_table.digest
+
+    try:
+        host.damage_table.base_power = 40
+        assert False, "damage table changed"
+    except AttributeError:
+        pass
+
+    unknown = BattleState(is_host=True, seed=1)
+    unknown.set_pokemon_data({"pokemon": "missingno", "hp": 100}, {"pokemon": "pikachu", "hp": 100})
+    assert unknown.damage_table is None
+
+
+def test_turns_are_a_lookup_and_one_draw():
+    host, joiner = battle()
+    for turn in range(6):
+        mode = STAT_MODES[turn % 3]
+        host_turn = turn % 2 == 0
+        # the same seed: both peers roll the same damage for the same attack
+        assert host.roll_damage(mode, host_turn) == joiner.roll_damage(mode, not host_turn)
+
+    table = get_pokemon_table()
+    pikachu, charmander = table.get("pikachu").to_dict(), table.get("charmander").to_dict()
+    for mode in STAT_MODES:
+        host, _ = battle()
+        from_table = calculate_damage(host, mode, your_turn=True)
+
+        # the same turn computed from the full stat dicts, without a table
+        plain = BattleState(is_host=True, seed=4242)
+        plain.set_pokemon_data(dict(pikachu, hp=100), dict(charmander, hp=100))
+        plain.damage_table = None
+        assert calculate_damage(plain, mode, your_turn=True) == from_table
+        assert host.rng.random() == plain.rng.random()   # exactly one draw each
+
+
+def test_build_matches_its_inputs():
+    table = get_pokemon_table()
+    damage = DamageTable.build(table, "Gengar", "snorlax")
+    assert damage == DamageTable.build(table, "gengar", "SNORLAX")
+    assert damage.base("host", "normal") == 0.0          # ghost on normal
+    assert damage.roll("host", "normal", random.Random(1)) == 1
+    assert DamageTable.build(table, "gengar", "nobody") is None
+
+
+def test_host_checks_the_joiners_digest_from_battle_setup():
+    host_choice, joiner_choice = {"pokemon": "pikachu", "hp": 100}, {"pokemon": "charmander", "hp": 100}
+    joiner = BattleState(is_host=False, seed=7)
+    joiner.set_pokemon_data(dict(joiner_choice), dict(host_choice))
+    setup = {
+        "message_type": "BATTLE_SETUP",
+        "battle_data": {
+            "pokemon_name": joiner_choice,
+            "stat_boosts": {"special_attack_uses": "1", "special_defense_uses": "1"},
+            "damage_table": joiner.damage_table.digest,
+        },
+    }
+    assert REGISTRY.validate(setup) is None
+    parser = MessageParser()
+    for codec in ("json", "bin1"):
+        received = parser.decode_message(parser.encode_bytes(setup, codec))["battle_data"]
+        assert received["damage_table"] == joiner.damage_table.digest
+
+    host = BattleState(is_host=True, seed=7)
+    assert host.set_pokemon_data(dict(host_choice), dict(joiner_choice), peer_digest=received["damage_table"])
+    assert host.check_battle_state()["damage_table_agreed"] is True
+
+    # the joiner worked from other data: the host notices at setup
+    other = BattleState(is_host=True, seed=7)
+    assert not other.set_pokemon_data(dict(host_choice), {"pokemon": "squirtle", "hp": 100},
+                                      peer_digest=joiner.damage_table.digest)
+    assert other.damage_table_agreed is False
+
+    # an older joiner sends no digest: nothing to compare
+    assert BattleState(is_host=True, seed=7).set_pokemon_data(dict(host_choice), dict(joiner_choice))
+
+
+def test_turns_deal_the_damage_table_damage():
+    host, joiner = battle()
+    expected, _ = battle()
+    host_hits = expected.roll_damage("normal", your_turn=True)        # the host attacks first
+    joiner_hits = expected.roll_damage("normal", your_turn=False)
+    assert host_hits != 20
+
+    async def scenario():
+        parser = MessageParser()
+        socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+        for s in socks:
+            s.bind(("127.0.0.1", 0))
+        addrs = [s.getsockname() for s in socks]
+        peers = []
+        for s in socks:
+            protocols = Protocols(await AsyncReliableUDP.create(s, parser, schema=REGISTRY))
+            protocols.start_dispatcher()
+            peers.append(protocols)
+
+        async def choose(prompt):
+            return "tackle"
+
+        for protocols in peers:
+            protocols.input_with_chat = choose
+        await asyncio.wait_for(asyncio.gather(peers[0].your_turn(addrs[1], host),
+                                              peers[1].their_turn(addrs[0], joiner)), 5)
+        await asyncio.wait_for(asyncio.gather(peers[0].their_turn(addrs[1], host),
+                                              peers[1].your_turn(addrs[0], joiner)), 5)
+        for protocols in peers:
+            protocols.stop_dispatcher()
+            protocols.reliable.close()
+        for s in socks:
+            s.close()
+
+    asyncio.run(scenario())
+    assert host.opponent_pokemon["hp"] == joiner.my_pokemon["hp"] == 100 - host_hits
+    assert host.my_pokemon["hp"] == joiner.opponent_pokemon["hp"] == 100 - joiner_hits
@@ -0,0 +1,98 @@
+import base64
+import os
+import random
+import socket
+import threading
+
+from networking.fragmentation import Reassembler, decode_fragment, encode_fragment, split_payload
+from networking.message_parser import MessageParser
+from networking.udp import ReliableUDP
+
+STICKER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "stickers", "smile.jpg")
+
+
+def test_split_and_reassemble_out_of_order():
+    payload = os.urandom(5000)
+    chunks = split_payload(payload, 1200)
+    frames = [encode_fragment(100 + i, 7, i, len(chunks), c) for i, c in enumerate(chunks)]
+    assert all(len(f) <= 1200 for f in frames)
+
+    r = Reassembler()
+    result = None
+    for frame in reversed(frames + frames[:1]):   # includes a duplicate
+        _, mid, idx, count, chunk = decode_fragment(frame)
+        out = r.add(("peer", 1), mid, idx, count, chunk)
+        if out is not None:
+            assert result is None
+            result = out
+    assert result == payload
+    assert len(r) == 0 and r.total_bytes == 0
+
+
+def test_reassembly_is_bounded_and_times_out():
+    r = Reassembler(max_bytes=1000, max_messages=2, timeout=5)
+    assert r.offer("a", 1, 0, 2, b"x" * 400, now=0) == (True, None)
+    assert r.offer("a", 2, 0, 2, b"y" * 400, now=1) == (True, None)
+    assert r.offer("a", 3, 0, 2, b"z" * 100, now=2) == (False, None)   # too many messages
+    assert r.offer("a", 1, 1, 2, b"x" * 300, now=2) == (False, None)   # too many bytes
+    assert r.offer("a", 2, 0, 2, b"y" * 400, now=2) == (True, None)    # duplicate: ACK again
+    assert len(r) == 2 and r.total_bytes == 800 and r.refused == 2
+
+    # stored fragments are never dropped for room, so a retry can still finish the message
+    assert r.offer("a", 1, 1, 2, b"x" * 100, now=3) == (True, b"x" * 500)
+    assert r.offer("a", 1, 1, 2, b"x" * 100, now=4) == (True, None)    # late retransmission
+    assert r.offer("a", 3, 0, 2, b"z" * 100, now=4) == (True, None)
+
+    # expiry counts from the last fragment, not from the first
+    r.expire(now=7)
+    assert len(r) == 1 and r.total_bytes == 100
+    r.expire(now=9)
+    assert len(r) == 0 and r.total_bytes == 0
+
+
+def test_refused_fragments_are_not_acked():
+    parser = MessageParser()
+    a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    b = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    a.bind(("127.0.0.1", 0))
+    b.bind(("127.0.0.1", 0))
+    sender = ReliableUDP(a, parser, timeout=0.05, min_rto=0.02, max_rto=0.05, max_retries=3)
+    receiver = ReliableUDP(b, parser, max_reassembly_bytes=2000)
+    assert sender._reassembler.timeout == 3 * 0.05   # its own worst-case retry span
+
+    msg = {"message_type": "CHAT_MESSAGE", "content_type": "TEXT", "message_text": "x" * 5000}
+    got = []
+    t = threading.Thread(target=lambda: (got.append(receiver.recv(timeout=1)), receiver.flush_acks()))
+    t.start()
+    # the receiver cannot hold the whole message: the sender must not believe it was delivered
+    assert not sender.send_reliable(msg, b.getsockname())
+    t.join()
+    assert got == [None] and receiver._reassembler.refused > 0
+
+
+def test_sticker_survives_loss_and_only_lost_fragments_are_resent():
+    parser = MessageParser()
+    a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    b = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    a.bind(("127.0.0.1", 0))
+    b.bind(("127.0.0.1", 0))
+    sender = ReliableUDP(a, parser, timeout=0.05, min_rto=0.02, max_retries=8, loss_prob=0.1)
+    receiver = ReliableUDP(b, parser)
+
+    with open(STICKER, "rb") as f:
+        b64 = base64.b64encode(f.read()).decode("ascii")
+    msg = {"message_type": "CHAT_MESSAGE", "content_type": "STICKER_FILE", "sticker_data_b64": b64}
+
+    got = []
+    t = threading.Thread(target=lambda: (got.append(receiver.recv(timeout=10)), receiver.flush_acks()))
+    t.start()
+    random.seed(1)
+    sent = []
+    original = sender._transmit
+    sender._transmit = lambda entry: (sent.append(entry.seq), original(entry))
+    assert sender.send_reliable(msg, b.getsockname())
+    t.join()
+
+    assert got[0][0]["sticker_data_b64"] == b64
+    fragments = len(split_payload(parser.encode_message({**msg, "sequence_number": 1}).encode(), 1200))
+    assert fragments < len(sent) < 2 * fragments
@@ -0,0 +1,32 @@
+from chat.history import ChatHistory
+
+
+def test_history_ring_and_search():
+    history = ChatHistory(capacity=3)
+    history.add("HOST", "TEXT", "Good luck Pikachu")
+    history.add("JOINER", "TEXT", "good luck to you too")
+    history.add("JOINER", "STICKER", "heart")
+    assert [e.text for e in history.search("good luck")] == ["Good luck Pikachu", "good luck to you too"]
+    assert [e.text for e in history.search("joiner")] == ["good luck to you too", "heart"]
+
+    history.add("HOST", "TEXT", "ember incoming")   # overwrites the oldest event
+    assert len(history) == 3
+    assert [e.text for e in history.last(10)] == ["good luck to you too", "heart", "ember incoming"]
+    assert [e.text for e in history.search("luck")] == ["good luck to you too"]
+    assert history.search("pikachu") == [] and "pikachu" not in history._index
+
+    assert history.replay(2) == [
+        {"message_type": "CHAT_MESSAGE", "sender_name": "JOINER", "content_type": "STICKER", "sticker_name": "heart"},
+        {"message_type": "CHAT_MESSAGE", "sender_name": "HOST", "content_type": "TEXT",
+         "message_text": "ember incoming"},
+    ]
+
+
+def test_history_memory_stays_bounded():
+    history = ChatHistory(capacity=50, max_text=20)
+    for i in range(5000):
+        history.add("HOST", "TEXT", f"message {i} " + "x" * 100)
+    assert len(history) == 50 and all(len(e.text) <= 20 for e in history.last(50))
+    # only the words ("host", "message", i, "xxx...") of the 50 events still in the ring are indexed
+    assert len(history._index) == 53
+    assert sum(len(p) for p in history._index.values()) == 50 * 4
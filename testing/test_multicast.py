@@ -0,0 +1,116 @@
+import asyncio
+import random
+import socket
+
+from networking.async_udp import AsyncReliableUDP
+from networking.message_parser import MessageParser
+from networking.multicast import DEFAULT_GROUP, MulticastReceiver, MulticastSender, MulticastSubscriber, open_sender_socket
+from networking.schema import REGISTRY
+from pokeprotocol.spectators import SpectatorRegistry
+
+
+def event(i):
+    return {"message_type": "CHAT_MESSAGE", "sender_name": "HOST", "content_type": "TEXT",
+            "message_text": str(i), "mc_seq": i}
+
+
+def test_receiver_orders_and_nacks_gaps():
+    receiver = MulticastReceiver(next_seq=1, nack_interval=1.0, max_nacks=2)
+    assert receiver.receive(event(1), now=0) == [event(1)]
+    assert receiver.receive(event(3), now=0) == [] and receiver.receive(event(4), now=0) == []
+    assert receiver.due_nacks(now=0) == [2] and receiver.due_nacks(now=0.5) == []
+    assert receiver.receive(event(2), now=0.6) == [event(2), event(3), event(4)]   # the repair
+    assert receiver.receive(event(3), now=0.7) == [] and receiver.duplicates == 1
+
+    receiver.heartbeat(6, now=1)     # 5 and 6 were sent but never arrived
+    assert receiver.due_nacks(now=1) == [5, 6]
+    assert receiver.receive(event(6), now=1.5) == []
+    assert receiver.due_nacks(now=2) == [5]
+    assert receiver.due_nacks(now=3) == [] and receiver.release() == [event(6)]   # gave up on 5
+    assert receiver.skipped == 1 and receiver.next == 7
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+def test_multicast_one_sendto_per_event_with_nack_repair():
+    random.seed(7)
+
+    async def scenario():
+        parser = MessageParser()
+        host_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        host_sock.bind(("127.0.0.1", 0))
+        host = await AsyncReliableUDP.create(host_sock, parser, recv_into=True, schema=REGISTRY)
+        host_addr = host_sock.getsockname()
+        registry = SpectatorRegistry(host)
+        sender = MulticastSender(open_sender_socket(), parser, DEFAULT_GROUP, free_port(), heartbeat_interval=0.05)
+        sender.start()
+        registry.enable_multicast(sender)
+
+        async def dispatch():   # what Protocols._dispatch_loop does for the host
+            while True:
+                msg, addr = await host.recv()
+                if msg["message_type"] == "MULTICAST_NACK":
+                    registry.repair(addr, msg["missing"])
+
+        async def watch(transport, seen, joined, loss_prob):   # what pokeprotocol.spectator does
+            subscriber = None
+            try:
+                while True:
+                    msg, addr = await transport.recv()
+                    transport.send_ack(addr, msg["sequence_number"])
+                    if transport.is_duplicate(msg, addr):
+                        continue
+                    if msg["message_type"] == "MULTICAST_GROUP":
+                        subscriber = MulticastSubscriber(
+                            parser, msg["multicast_group"], msg["multicast_port"],
+                            on_message=lambda m: seen.append(m["message_text"]),
+                            send_nack=lambda nack: transport.send_unreliable(nack, host_addr),
+                            next_seq=msg["multicast_next"], loss_prob=loss_prob, nack_interval=0.05,
+                        )
+                        await subscriber.start()
+                        joined.set()
+                    elif "mc_seq" in msg:
+                        subscriber.feed(msg)
+            finally:
+                if subscriber is not None:
+                    subscriber.close()
+
+        tasks = [asyncio.ensure_future(dispatch())]
+        spectators, seen, joined = [], [], []
+        for loss_prob in (0.0, 0.0, 0.3):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            spectator = await AsyncReliableUDP.create(sock, parser, recv_into=True, schema=REGISTRY)
+            spectators.append(spectator)
+            seen.append([])
+            joined.append(asyncio.Event())
+            tasks.append(asyncio.ensure_future(watch(spectator, seen[-1], joined[-1], loss_prob)))
+            registry.add(sock.getsockname())
+        await asyncio.wait_for(asyncio.gather(*(j.wait() for j in joined)), 5)
+
+        for i in range(1, 31):
+            registry.publish(event(i))
+            await asyncio.sleep(0.002)
+
+        async def all_seen():
+            while any(len(s) < 30 for s in seen):
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(all_seen(), 10)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.sleep(0)
+        stats = registry.totals()["multicast"]
+        registry.close()
+        for transport in spectators + [host]:
+            transport.close()
+        return seen, stats
+
+    seen, stats = asyncio.run(scenario())
+    assert all(s == [str(i) for i in range(1, 31)] for s in seen)
+    assert stats["events"] == 30 and stats["datagrams"] - stats["heartbeats"] == 30   # not 30 per spectator
+    assert stats["repaired"] > 0     # the lossy spectator's gaps were filled over unicast
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from chat.outbox import ChatOutbox
+
+
+class FakeReliable:
+    """send_reliable() that records what was sent and waits for the test to ACK it."""
+
+    def __init__(self):
+        self.sent = []
+        self.acks = asyncio.Queue()
+
+    async def send_reliable(self, msg, addr):
+        self.sent.append((time.monotonic(), msg, addr))
+        return await self.acks.get()
+
+
+def text(t):
+    return {"message_type": "CHAT_MESSAGE", "sender_name": "HOST", "content_type": "TEXT", "message_text": t}
+
+
+def test_outbox_coalesces_bursts_in_order():
+    async def scenario():
+        reliable = FakeReliable()
+        outbox = ChatOutbox(reliable)
+        first = outbox.post(text("a"), "peer")
+        await asyncio.sleep(0)          # "a" is now waiting for its ACK
+        rest = [outbox.post(text(t), "peer") for t in "bcd"]
+        sticker = outbox.post({"message_type": "CHAT_MESSAGE", "content_type": "STICKER"}, "peer")
+        for ok in (True, True, False):
+            reliable.acks.put_nowait(ok)
+        await outbox.flush()
+        outbox.close()
+        return reliable.sent, first, rest, sticker, outbox.stats
+
+    sent, first, rest, sticker, stats = asyncio.run(scenario())
+    assert [m["message_text"] for _, m, _ in sent[:2]] == ["a", "b\nc\nd"]
+    assert sent[2][1]["content_type"] == "STICKER"
+    assert first.result() and all(f.result() for f in rest) and not sticker.result()
+    assert stats == {"posted": 5, "sent": 4, "coalesced": 2, "failed": 1}
+
+
+def test_outbox_rate_limits_per_peer():
+    async def scenario():
+        reliable = FakeReliable()
+        outbox = ChatOutbox(reliable, rate=20.0, burst=2)
+        for _ in range(6):
+            reliable.acks.put_nowait(True)
+        start = time.monotonic()
+        posts = [outbox.post({"content_type": "STICKER"}, addr) for addr in ("p1", "p2") for _ in range(3)]
+        await asyncio.gather(*posts)
+        outbox.close()
+        return start, reliable.sent
+
+    start, sent = asyncio.run(scenario())
+    for addr in ("p1", "p2"):
+        times = [t - start for t, _, a in sent if a == addr]
+        assert times[1] < 0.04 <= times[2]   # burst of 2, then 1 every 50 ms
@@ -0,0 +1,43 @@
+import shutil
+
+from game.pokemon_stats import DEFAULT_CSV, get_by_name, load_pokemon_stats, pokemon_to_dict
+from game.pokemon_table import PokemonRow, PokemonTable, get_pokemon_table, np
+
+
+def test_table_matches_the_dataclasses(tmp_path):
+    csv_path = str(tmp_path / "pokemon.csv")
+    shutil.copy(DEFAULT_CSV, csv_path)
+    stats = load_pokemon_stats(csv_path, use_cache=False)
+    table = PokemonTable.load(csv_path)
+
+    assert len(table) == len(stats)
+    for key, pokemon in stats.items():
+        row = table.get(key)
+        assert row.to_dict() == pokemon_to_dict(pokemon)
+        assert (row.name, row.hp, row["against_fire"]) == (pokemon.name, pokemon.hp, pokemon.against_fire)
+
+    pikachu = get_by_name(" PIKACHU ", table)
+    assert isinstance(pikachu, PokemonRow) and pikachu.type1 == "electric" and pikachu.type2 is None
+    assert get_by_name("missingno", table) is None and "Pikachu" in table
+    assert pikachu.raw["name"] == "Pikachu" and pikachu.raw["hp"] == "35"   # read from the CSV on demand
+
+
+def test_rows_are_slotted_views():
+    table = get_pokemon_table()
+    assert table is get_pokemon_table(DEFAULT_CSV)
+    row = table.get("bulbasaur")
+    assert not hasattr(row, "__dict__")
+    assert row == table.row(row.index) and [r.name for r in table][:1] == ["Bulbasaur"]
+
+
+def test_numpy_views_share_the_columns():
+    if np is None:
+        return
+    table = get_pokemon_table()
+    hp = table.stat_array("hp")
+    defense = table.defense_array()
+    i = table.index_of("charizard")
+    assert hp[i] == table.get("charizard").hp
+    assert defense.shape == (len(table), 18)
+    assert defense[i, 6] == table.get("charizard")["against_fire"]   # fire is type 6
+    assert np.shares_memory(hp, np.frombuffer(table.stats["hp"], dtype=np.int32))
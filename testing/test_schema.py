@@ -0,0 +1,62 @@
+import socket
+
+from networking.message_parser import MessageParser
+from networking.schema import REGISTRY, AttackAnnounce, CalculationReport
+from networking.udp import ReliableUDP
+
+REPORT = {
+    "message_type": "CALCULATION_REPORT",
+    "attacker": "pikachu",
+    "move_used": "tackle",
+    "remaining_health": 140,
+    "damage_dealt": 20,
+    "defender_hp_remaining": 120,
+    "status_message": "tackle dealt 20 damage!",
+    "sequence_number": 3,
+}
+
+
+def test_validators_reject_bad_messages_without_raising():
+    assert REGISTRY.validate(REPORT) is None
+    truncated = {k: v for k, v in REPORT.items() if k != "defender_hp_remaining"}
+    assert REGISTRY.validate(truncated) == "defender_hp_remaining is required"
+    assert "integer" in REGISTRY.validate({**REPORT, "damage_dealt": "20"})
+    assert "integer" in REGISTRY.validate({**REPORT, "sequence_number": -1})
+    assert "unknown" in REGISTRY.validate({"message_type": "NOPE"})
+    for message_type in ({"x": 1}, ["ATTACK_ANNOUNCE"], 5, None):
+        assert REGISTRY.validate({"message_type": message_type}) == "message_type must be a string"
+    assert REGISTRY.validate({"message_type": "ATTACK_ANNOUNCE", "sequence_number": 1,
+                              "move_name": {"move": "tackle"}}) == "move_name.move_damage is required"
+    assert REGISTRY.validate({**REPORT, "extra_field": [1]}) is None   # forward compatible
+
+
+def test_compiled_message_classes():
+    report = CalculationReport.from_dict(REPORT)
+    assert report.defender_hp_remaining == 120
+    assert report.to_dict() == REPORT
+    assert not hasattr(report, "__dict__")
+    assert CalculationReport.from_dict({**REPORT, "attacker": None}) is None
+    assert AttackAnnounce.from_dict(REPORT) is None                     # wrong type
+    assert CalculationReport.from_dict({**REPORT, "message_type": {"x": 1}}) is None
+    attack = AttackAnnounce(move_name={"move": "ember", "move_damage": 20}, sequence_number=5)
+    assert AttackAnnounce.from_dict(attack.to_dict()) == attack
+
+
+def test_transport_drops_malformed_messages():
+    parser = MessageParser()
+    a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    b = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    a.bind(("127.0.0.1", 0))
+    b.bind(("127.0.0.1", 0))
+    receiver = ReliableUDP(b, parser, schema=REGISTRY)
+    addr = b.getsockname()
+
+    a.sendto(b'{"message_type": "CALCULATION_REPORT", "sequence_number": 4}', addr)
+    a.sendto(b'[1, 2, 3]', addr)
+    a.sendto(b'{"message_type": {"x": 1}, "sequence_number": 5}', addr)
+    a.sendto(parser.encode_bytes(REPORT, "bin1")[:-3], addr)           # truncated
+    a.sendto(parser.encode_bytes(REPORT, "bin1"), addr)
+
+    msg, _ = receiver.recv(timeout=1)
+    assert msg == REPORT
+    assert receiver.session_stats()["rx_rejected"] == 3
@@ -0,0 +1,79 @@
+import asyncio
+import socket
+import time
+
+from networking.async_udp import AsyncReliableUDP
+from networking.message_parser import MessageParser
+from pokeprotocol.spectators import SpectatorRegistry
+
+
+def bound_socket():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    return s
+
+
+def text(i):
+    return {"message_type": "CHAT_MESSAGE", "sender_name": "HOST", "content_type": "TEXT",
+            "message_text": str(i), "sequence_number": 1000 + i}
+
+
+async def watch(transport, seen):
+    while True:
+        msg, addr = await transport.recv()
+        transport.send_ack(addr, msg["sequence_number"])
+        if not transport.is_duplicate(msg, addr):
+            seen.append(msg["message_text"])
+
+
+def test_fanout_to_hundreds_of_spectators_with_one_stuck():
+    async def scenario():
+        parser = MessageParser()
+        host = await AsyncReliableUDP.create(bound_socket(), parser, recv_into=True, timeout=0.3, max_retries=3)
+        registry = SpectatorRegistry(host, max_queue=16, max_in_flight=4)
+
+        spectators, tasks, seen = [], [], []
+        for _ in range(200):
+            spectator = await AsyncReliableUDP.create(bound_socket(), parser, recv_into=True)
+            spectators.append(spectator)
+            seen.append([])
+            tasks.append(asyncio.ensure_future(watch(spectator, seen[-1])))
+            registry.add(spectator.sock.getsockname(), backlog=[text(-1)])
+        stuck = bound_socket()   # never reads, never ACKs
+        stuck_addr = stuck.getsockname()
+        registry.add(stuck_addr)
+
+        # the battle loop only queues; the stuck spectator falls behind on its own queue
+        live = [s.sock.getsockname() for s in spectators]
+        for i in range(50):
+            registry.publish(text(i))
+            if i % 5 == 4:   # a turn's worth of events, then the live spectators catch up
+                while any(registry.stats(addr)["lag"] for addr in live):
+                    await asyncio.sleep(0.005)
+        stuck_stats = registry.stats(stuck_addr)
+
+        # the opponent's own messages are not held up either
+        player = await AsyncReliableUDP.create(bound_socket(), parser, recv_into=True)
+        player_task = asyncio.ensure_future(watch(player, []))
+        start = time.monotonic()
+        delivered = await host.send_reliable(text(99), player.sock.getsockname())
+        player_delay = time.monotonic() - start
+
+        await registry.flush(timeout=20)
+        totals = registry.totals()
+        for task in tasks + [player_task]:
+            task.cancel()
+        for transport in spectators + [player, host]:
+            transport.close()
+        stuck.close()
+        return registry, seen, stuck_stats, stuck_addr, delivered, player_delay, totals
+
+    registry, seen, stuck_stats, stuck_addr, delivered, player_delay, totals = asyncio.run(scenario())
+    expected = ["-1"] + [str(i) for i in range(50)]
+    assert all(s == expected for s in seen)   # everything, in order, to every live spectator
+    assert delivered and player_delay < 1.0
+
+    # 4 in flight, 16 queued, the other 30 of 50 dropped
+    assert stuck_stats["dropped"] == 30 and stuck_stats["lag"] == 20 and stuck_stats["max_lag"] == 20
+    assert stuck_addr not in registry and registry.removed == 1
+    assert totals == dict(totals, spectators=200, published=50, sent=200 * 51, dropped=0, max_lag=0)
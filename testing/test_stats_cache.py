@@ -0,0 +1,44 @@
+import os
+import shutil
+
+from game import pokemon_stats
+from game.pokemon_stats import DEFAULT_CSV, get_pokemon_stats, load_pokemon_stats
+from game.stats_cache import cache_path_for
+
+
+def fields(stats):
+    return {name: {**vars(p), "raw": None} for name, p in stats.items()}
+
+
+def test_cache_is_built_once_and_matches_the_csv(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "pokemon.csv")
+    shutil.copy(DEFAULT_CSV, csv_path)
+    parsed = load_pokemon_stats(csv_path, use_cache=False)
+
+    assert fields(load_pokemon_stats(csv_path)) == fields(parsed)   # cold: parses and compiles
+    assert os.path.exists(cache_path_for(csv_path))
+
+    def no_parsing(path):
+        raise AssertionError("CSV parsed although the cache is fresh")
+    monkeypatch.setattr(pokemon_stats, "_parse_csv", no_parsing)
+    assert fields(load_pokemon_stats(csv_path)) == fields(parsed)   # warm: from the cache
+
+    # touched but unchanged: the hash still matches
+    os.utime(csv_path, ns=(0, 0))
+    assert len(load_pokemon_stats(csv_path)) == len(parsed)
+
+
+def test_cache_is_rebuilt_when_the_csv_changes(tmp_path):
+    csv_path = str(tmp_path / "pokemon.csv")
+    shutil.copy(DEFAULT_CSV, csv_path)
+    assert load_pokemon_stats(csv_path)["pikachu"].hp == 35
+
+    with open(csv_path, encoding="utf-8") as f:
+        text = f.read()
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write(text.replace(",0.4,35,Pikachu", ",0.4,36,Pikachu"))   # same size: only the hash tells
+    assert load_pokemon_stats(csv_path)["pikachu"].hp == 36
+
+
+def test_stats_are_shared_per_process():
+    assert get_pokemon_stats() is get_pokemon_stats(DEFAULT_CSV)
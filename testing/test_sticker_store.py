@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+
+from chat.sticker_store import INDEX_FILE, StickerStore, file_digest
+
+
+def test_sticker_store_is_content_addressed(tmp_path):
+    store = StickerStore(str(tmp_path))
+    h, path = store.add_bytes(b"sticker")
+    assert store.add_bytes(b"sticker") == (h, path)
+    assert sorted(os.listdir(tmp_path)) == [h + ".bin", "index.json"]
+    assert file_digest(path) == h and store.path(h) == path
+    try:
+        store.add_bytes(b"other", expected_hash=h)
+    except ValueError:
+        pass
+    else:
+        assert False, "content with the wrong hash stored"
+    assert h in StickerStore(str(tmp_path))   # index rebuilt from the directory
+
+
+def test_sticker_store_lru_quotas(tmp_path, monkeypatch):
+    store = StickerStore(str(tmp_path), max_bytes=25, max_files=2, hot_cache_bytes=10)
+    a, _ = store.add_bytes(b"a" * 10)
+    b, _ = store.add_bytes(b"b" * 10)
+    store.path(a)                      # a is now the most recently used
+    c, _ = store.add_bytes(b"c" * 10)  # over max_files: b goes
+    assert a in store and b not in store and c in store
+    assert not os.path.exists(tmp_path / (b + ".bin")) and store.evictions == 1
+    d, _ = store.add_bytes(b"d" * 20)  # over max_bytes: a and c go
+    assert len(store) == 1 and d in store and store.total_bytes == 20
+
+    # recently shown stickers are served from the hot cache
+    os.remove(tmp_path / (d + ".bin"))
+    assert store.read(d) is None       # too big for the cache: gone with the file
+    x, path = store.add_bytes(b"x" * 5)
+    os.remove(path)
+    assert store.read(x) == b"x" * 5
+
+    # reopened from index.json, without listing the directory
+    store.flush()
+    monkeypatch.setattr(os, "scandir", None)
+    reopened = StickerStore(str(tmp_path), max_bytes=25, max_files=2)
+    assert list(reopened._index) == [x] and reopened.total_bytes == 5
+
+
+def test_sticker_store_reopens_from_index_in_lru_order(tmp_path, monkeypatch):
+    store = StickerStore(str(tmp_path), max_files=3)
+    a, _ = store.add_bytes(b"a")
+    b, _ = store.add_bytes(b"b")
+    c, _ = store.add_bytes(b"c")
+    store.path(a)                      # LRU order is now b, c, a
+    store.flush()
+    with open(tmp_path / INDEX_FILE, encoding="utf-8") as f:
+        assert [h for h, _ in json.load(f)["entries"]] == [b, c, a]
+
+    monkeypatch.setattr(os, "scandir", None)
+    reopened = StickerStore(str(tmp_path), max_files=3)
+    assert list(reopened._index) == [b, c, a] and reopened.total_bytes == 3
+    d, _ = reopened.add_bytes(b"d")    # the least recently used one goes first
+    assert b not in reopened and list(reopened._index) == [c, a, d]
+
+    # an unreadable index falls back to listing the directory
+    monkeypatch.undo()
+    (tmp_path / INDEX_FILE).write_text("{not json", encoding="utf-8")
+    rebuilt = StickerStore(str(tmp_path), max_files=3)
+    assert sorted(rebuilt._index) == sorted([c, a, d])
+
+
+def test_sticker_store_hot_cache_hits(tmp_path, monkeypatch):
+    store = StickerStore(str(tmp_path), hot_cache_bytes=10)
+    a, path_a = store.add_bytes(b"a" * 4)
+    b, _ = store.add_bytes(b"b" * 4)
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *args, **kw: (opened.append(args[0]), real_open(*args, **kw))[1])
+    assert store.read(a) == b"a" * 4 and store.read(b) == b"b" * 4
+    assert opened == []                # both served from memory
+
+    c, _ = store.add_bytes(b"c" * 4)   # over hot_cache_bytes: a, the least recently read, leaves the cache
+    assert store.stats()["hot_cache_bytes"] == 8
+    assert store.read(a) == b"a" * 4 and opened == [path_a]
+
+
+def test_sticker_store_eviction_never_deletes_a_re_added_file(tmp_path):
+    store = StickerStore(str(tmp_path), max_files=1)
+    a, _ = store.add_bytes(b"a")
+    readd = threading.Thread(target=store.add_bytes, args=(b"a",))
+
+    real_delete = store._delete
+
+    def delete(victims):
+        # another worker saves the evicted sticker again while the files are being removed
+        if victims == [a] and not readd.is_alive():
+            readd.start()
+            readd.join(0.2)
+        real_delete(victims)
+
+    store._delete = delete
+    store.add_bytes(b"b")
+    readd.join()
+    for h in store._index:
+        assert os.path.exists(store._path(h)), "index lists a deleted sticker"
+    assert a in store and file_digest(store.path(a)) == a
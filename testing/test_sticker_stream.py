@@ -0,0 +1,100 @@
+import asyncio
+import os
+import socket
+import threading
+
+from chat.chat_handler import ChatHandler
+from chat.sticker_store import file_digest
+from chat.sticker_stream import IncomingStreams
+from chat.sticker_worker import StickerWorker
+from networking.async_udp import AsyncReliableUDP
+from networking.message_parser import MessageParser
+from networking.schema import REGISTRY
+
+
+def test_incoming_sticker_out_of_order(tmp_path):
+    streams = IncomingStreams(str(tmp_path))
+    incoming = streams.start("HOST", 1, "x", "", 10)
+    assert not incoming.write(5, b"56789")
+    assert not incoming.write(5, b"56789")   # duplicate chunk is not counted twice
+    assert incoming.write(0, b"01234")       # the last chunk completes it
+    assert incoming.complete and incoming.received == 10
+    os.replace(streams.pop("HOST", 1).tmp_path, str(tmp_path / "x.bin"))
+    assert (tmp_path / "x.bin").read_bytes() == b"0123456789"
+    assert os.listdir(tmp_path) == ["x.bin"]
+
+    incoming = streams.start("HOST", 2, "y", "", 4)
+    try:
+        incoming.write(2, b"abc")
+    except ValueError:
+        pass
+    else:
+        assert False, "chunk past total_size accepted"
+    incoming.write(0, b"ab")
+    assert streams.expire(now=incoming.last_activity + streams.idle_timeout + 1) == [incoming]
+    incoming.abort()
+    assert len(streams) == 0 and os.listdir(tmp_path) == ["x.bin"]
+
+
+def test_sticker_worker_backpressure():
+    async def scenario():
+        worker = StickerWorker(max_workers=1, max_pending=1)
+        release = threading.Event()
+        results = []
+        assert worker.submit(release.wait, on_done=lambda result, error: results.append(result))
+        assert worker.full and not worker.submit(print)
+        release.set()
+        await worker.join()
+        worker.shutdown()
+        return worker, results
+
+    worker, results = asyncio.run(scenario())
+    assert results == [True] and worker.rejected == 1 and worker.completed == 1
+
+
+def test_sticker_stream_multi_megabyte(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = os.urandom(3 * 1024 * 1024 + 123)
+    (tmp_path / "big.png").write_bytes(data)
+    chunks = []
+
+    async def scenario():
+        parser = MessageParser()
+        socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+        for s in socks:
+            s.bind(("127.0.0.1", 0))
+        a_addr, b_addr = socks[0].getsockname(), socks[1].getsockname()
+        a = await AsyncReliableUDP.create(socks[0], parser, recv_into=True, schema=REGISTRY)
+        b = await AsyncReliableUDP.create(socks[1], parser, recv_into=True, schema=REGISTRY)
+        a.set_peer_codec(b_addr, "bin1")
+        sender = ChatHandler(socks[0], "HOST", b_addr, a)
+        receiver = ChatHandler(socks[1], "JOINER", a_addr, b)
+
+        async def dispatch(transport, handler):
+            while True:
+                msg, addr = await transport.recv()
+                transport.send_ack(addr, msg["sequence_number"])
+                if not transport.is_duplicate(msg, addr):
+                    if msg["content_type"] == "STICKER_STREAM_CHUNK":
+                        chunks.append(msg["offset"])
+                    handler.handle_incoming(msg)
+
+        tasks = [asyncio.ensure_future(dispatch(a, sender)), asyncio.ensure_future(dispatch(b, receiver))]
+        first = await asyncio.wait_for(sender.send_sticker_stream("big.png"), 60)
+        await receiver.worker.join()
+        sent = len(chunks)
+        again = await asyncio.wait_for(sender.send_sticker_stream("big.png", "again"), 10)
+        for task in tasks:
+            task.cancel()
+        sender.close()
+        receiver.close()
+        a.close()
+        b.close()
+        return first, again, sent
+
+    first, again, sent = asyncio.run(scenario())
+    assert first and again
+    assert sent == len(chunks) == -(-len(data) // 1024)   # the repeat sent no chunks
+    saved = sorted(os.listdir(tmp_path / "stickers_received"))
+    assert saved == [file_digest(str(tmp_path / "big.png")) + ".bin", "index.json"]
+    assert (tmp_path / "stickers_received" / saved[0]).read_bytes() == data
@@ -0,0 +1,65 @@
+from game import type_chart
+from game.damage_calculator import get_type_effectiveness, get_type_effectiveness_batch
+from game.pokemon_stats import get_pokemon_stats, pokemon_to_dict
+from game.pokemon_table import get_pokemon_table
+from game.type_chart import NO_TYPE, TYPE_NAMES, defense_vector, effectiveness, type_index
+
+
+def test_type_registry_and_chart():
+    assert len(TYPE_NAMES) == 18 and [type_index(t) for t in TYPE_NAMES] == list(range(18))
+    assert type_index("Fighting") == type_index("fight") and type_index(None) == type_index("") == NO_TYPE
+    try:
+        type_index("sound")
+        assert False, "unknown type accepted"
+    except ValueError:
+        pass
+
+    fire, water, grass, ground, flying, ghost, normal = map(type_index, ("fire", "water", "grass", "ground",
+                                                                          "flying", "ghost", "normal"))
+    assert effectiveness(water, fire) == 2.0 and effectiveness(fire, water) == 0.5
+    assert effectiveness(ground, flying) == 0.0 and effectiveness(normal, ghost) == 0.0
+    assert effectiveness(fire, NO_TYPE) == 1.0
+    assert defense_vector(grass, type_index("poison"))[fire] == 2.0   # Bulbasaur
+    assert defense_vector(grass, type_index("poison"))[water] == 0.5
+
+
+def test_fractional_and_zero_multipliers_survive_loading():
+    bulbasaur = get_pokemon_stats()["bulbasaur"]
+    charizard = get_pokemon_stats()["charizard"]
+    assert bulbasaur.against_water == 0.5 and bulbasaur.against_grass == 0.25
+    assert charizard.against_ground == 0.0 and charizard.against_rock == 4.0
+
+    table = get_pokemon_table()
+    for name in ("bulbasaur", "charizard", "gengar", "pikachu"):
+        row = table.get(name)
+        assert list(row.defense_vector) == [pokemon_to_dict(get_pokemon_stats()[name])[f]
+                                            for f in type_chart.AGAINST_FIELDS]
+
+
+def test_scalar_and_batch_effectiveness_agree(monkeypatch):
+    table = get_pokemon_table()
+    stats = get_pokemon_stats()
+    attackers = ["pikachu", "charizard", "gengar", "lucario", "sylveon", "garchomp"]
+    defenders = ["gyarados", "bulbasaur", "snorlax", "skarmory", "gengar", "dragonite"]
+
+    expected = []
+    for a, d in zip(attackers, defenders):
+        attacker, defender = pokemon_to_dict(stats[a]), pokemon_to_dict(stats[d])
+        combined = get_type_effectiveness(defender, attacker["type1"])
+        if attacker["type2"] is not None:
+            combined *= get_type_effectiveness(defender, attacker["type2"])
+        row = table.get(d)
+        t1, t2 = table.get(a).types
+        assert row.effectiveness(t1, t2) == combined
+        assert get_type_effectiveness(row, attacker["type1"]) == get_type_effectiveness(defender, t1)
+        expected.append(combined)
+
+    indexes = [table.index_of(d) for d in defenders]
+    type1s = [table.get(a).types[0] for a in attackers]
+    type2s = [table.get(a).types[1] for a in attackers]
+    # electric on water/flying; fire and flying on grass/poison; ghost on normal; dragon and ground on flying
+    assert [expected[i] for i in (0, 1, 2, 5)] == [4.0, 4.0, 0.0, 0.0]
+    assert list(get_type_effectiveness_batch(table, indexes, type1s, type2s)) == expected
+
+    monkeypatch.setattr(type_chart, "np", None)   # the plain-Python path gives the same
+    assert get_type_effectiveness_batch(table, indexes, type1s, type2s) == expected
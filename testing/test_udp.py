@@ -0,0 +1,396 @@
+import asyncio
+import socket
+import struct
+import threading
+
+from networking import bundling
+from networking.acks import AckState, acked_by
+from networking.async_udp import AsyncReliableUDP
+from networking.message_parser import MessageParser
+from networking.replay_window import PeerReplayWindows, ReplayWindow
+from networking.rtt import RttEstimator
+from networking.udp import ReliableUDP
+
+
+def make_pair(**kwargs):
+    """Two ReliableUDP endpoints bound to loopback."""
+    parser = MessageParser()
+    a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    b = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    a.bind(("127.0.0.1", 0))
+    b.bind(("127.0.0.1", 0))
+    return (
+        ReliableUDP(a, parser, **kwargs),
+        ReliableUDP(b, parser, **kwargs),
+    )
+
+
+def ack_loop(peer: ReliableUDP, count: int, received: list, drop_first=()):
+    """Receive `count` distinct messages on peer, ACKing each one."""
+    dropped = set()
+    while len(received) < count:
+        item = peer.recv(timeout=5)
+        if item is None:
+            return
+        msg, addr = item
+        seq = msg["sequence_number"]
+        if seq in drop_first and seq not in dropped:
+            dropped.add(seq)      # pretend we never saw it: no ACK
+            continue
+        peer.send_ack(addr, seq)
+        if not peer.is_duplicate(msg, addr):
+            received.append(msg)
+    peer.flush_acks()  # don't leave the last (delayed) ACK behind
+
+
+def test_window_send_delivers_all():
+    sender, receiver = make_pair(window_size=4, timeout=0.2)
+    addr = receiver.sock.getsockname()
+    received = []
+    t = threading.Thread(target=ack_loop, args=(receiver, 10, received))
+    t.start()
+
+    results = []
+    futures = [
+        sender.send({"message_type": "CHAT_MESSAGE", "n": i}, addr, callback=results.append)
+        for i in range(10)
+    ]
+    assert sender.pending_count() == 10
+    while sender.pending_count():
+        sender.poll(0.05)
+    t.join()
+
+    assert all(f.result() for f in futures)
+    assert results == [True] * 10
+    assert sorted(m["n"] for m in received) == list(range(10))
+
+
+def test_lost_message_is_retransmitted_alone():
+    sender, receiver = make_pair(window_size=4, timeout=0.1)
+    addr = receiver.sock.getsockname()
+    received = []
+    t = threading.Thread(target=ack_loop, args=(receiver, 4, received, (2,)))
+    t.start()
+
+    futures = [sender.send({"message_type": "CHAT_MESSAGE", "n": i}, addr) for i in range(4)]
+    while sender.pending_count():
+        sender.poll(0.05)
+    t.join()
+
+    assert all(f.result() for f in futures)
+    assert len(received) == 4
+
+
+def test_stop_and_wait_gives_up_without_ack():
+    sender, receiver = make_pair(window_size=1, timeout=0.05, max_retries=3)
+    ok = sender.send_reliable({"message_type": "CHAT_MESSAGE"}, receiver.sock.getsockname())
+    assert ok is False
+
+    # all three attempts reached the peer and are waiting in its inbox
+    seen = []
+    while (item := receiver.recv(timeout=0.1)) is not None:
+        seen.append(item[0]["sequence_number"])
+    assert seen == [1, 1, 1]
+
+
+def test_window_is_per_peer():
+    sender, receiver = make_pair(window_size=1, timeout=0.2, max_retries=3)
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    received = []
+    t = threading.Thread(target=ack_loop, args=(receiver, 1, received))
+    t.start()
+
+    stuck = sender.send({"message_type": "CHAT_MESSAGE", "n": 0}, silent.getsockname())
+    ok = sender.send_reliable({"message_type": "CHAT_MESSAGE", "n": 1}, receiver.sock.getsockname())
+    t.join()
+    assert ok and not stuck.done()   # not queued behind the peer that never ACKs
+    while sender.pending_count():
+        sender.poll(0.05)
+    assert stuck.result() is False
+    silent.close()
+
+
+def test_message_retried_behind_many_newer_ones_is_not_lost():
+    sender, receiver = make_pair(timeout=0.05, max_retries=8)
+    parser = sender.parser
+    drops = [3]   # seq 1 is lost three times while everything after it gets through
+    send_datagram = sender._sendto
+
+    def lossy_sendto(payload, addr):
+        if drops[0] and parser.decode_message(payload).get("sequence_number") == 1:
+            drops[0] -= 1
+            return
+        send_datagram(payload, addr)
+    sender._sendto = lossy_sendto
+
+    received = []
+    t = threading.Thread(target=ack_loop, args=(receiver, 100, received))
+    t.start()
+    futures = [sender.send({"message_type": "CHAT_MESSAGE", "n": n}, receiver.sock.getsockname())
+               for n in range(100)]
+    while sender.pending_count():
+        sender.poll(0.01)
+    t.join()
+
+    assert drops == [0] and all(f.result() for f in futures)
+    assert sorted(m["n"] for m in received) == list(range(100))   # seq 1 included, once
+
+
+def test_rtt_estimator_jacobson_karels():
+    est = RttEstimator(initial_rto=0.5, min_rto=0.01, max_rto=2.0)
+    est.on_sample(0.1)
+    assert est.srtt == 0.1 and est.rttvar == 0.05
+    assert abs(est.rto - 0.3) < 1e-9
+
+    est.on_sample(0.1)
+    assert abs(est.rttvar - 0.0375) < 1e-9
+    assert abs(est.rto - 0.25) < 1e-9
+
+    # backoff doubles and is clamped
+    assert est.on_timeout(est.rto) == 0.5
+    assert est.on_timeout(1.5) == 2.0
+    assert est.rto == 2.0
+
+
+def test_rto_adapts_to_loopback_and_ignores_retransmits():
+    sender, receiver = make_pair(timeout=0.5, min_rto=0.01)
+    addr = receiver.sock.getsockname()
+    received = []
+    t = threading.Thread(target=ack_loop, args=(receiver, 5, received))
+    t.start()
+    for i in range(5):
+        assert sender.send_reliable({"message_type": "CHAT_MESSAGE", "n": i}, addr)
+    t.join()
+
+    stats = sender.rtt_stats(addr)
+    assert stats["samples"] == 5
+    assert stats["rto"] < 0.5  # loopback: far below the initial RTO
+
+    # a message that needed a retransmission must not produce a sample
+    received.clear()
+    t = threading.Thread(target=ack_loop, args=(receiver, 1, received, (6,)))
+    t.start()
+    assert sender.send_reliable({"message_type": "CHAT_MESSAGE"}, addr)
+    t.join()
+    stats = sender.rtt_stats(addr)
+    assert stats["samples"] == 5
+    assert stats["timeouts"] == 1
+
+
+def test_replay_window_bitmap():
+    w = ReplayWindow(size=8)
+    assert w.check_and_update(1)
+    assert w.check_and_update(3)
+    assert not w.check_and_update(3)
+    assert w.check_and_update(2)          # out of order, still inside the window
+    assert not w.check_and_update(1)
+    assert w.check_and_update(20)
+    assert not w.check_and_update(12)     # fell out of the window
+    assert w.check_and_update(13)
+
+
+def test_duplicates_are_tracked_per_peer_and_idle_peers_evicted():
+    windows = PeerReplayWindows(window_size=16, idle_timeout=10)
+    assert windows.check_and_update(("a", 1), 5, now=0)
+    assert windows.check_and_update(("b", 1), 5, now=1)   # same seq, other peer
+    assert not windows.check_and_update(("a", 1), 5, now=2)
+
+    windows.check_and_update(("c", 1), 1, now=12.5)       # "a" and "b" idle > 10s
+    assert len(windows) == 1
+    assert windows.check_and_update(("a", 1), 5, now=13)
+
+
+def test_async_transport_demuxes_acks_and_keeps_other_messages():
+    async def scenario():
+        parser = MessageParser()
+        socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+        for s in socks:
+            s.bind(("127.0.0.1", 0))
+        a = await AsyncReliableUDP.create(socks[0], parser, timeout=0.2)
+        b = await AsyncReliableUDP.create(socks[1], parser, timeout=0.2)
+        a_addr, b_addr = socks[0].getsockname(), socks[1].getsockname()
+
+        async def peer_b():
+            # B answers every message with an ACK, but first pushes its own
+            # message while A is still waiting for that ACK.
+            for i in range(3):
+                msg, addr = await b.recv()
+                if i == 0:
+                    b.send_unreliable({"message_type": "DEFENSE_ANNOUNCE"}, addr)
+                b.send_ack(addr, msg["sequence_number"])
+
+        task = asyncio.get_running_loop().create_task(peer_b())
+        results = await asyncio.gather(
+            *(a.send_reliable({"message_type": "CHAT_MESSAGE", "n": i}, b_addr) for i in range(3))
+        )
+        await task
+        queued = await a.recv(timeout=1)
+        a.close()
+        b.close()
+        for s in socks:
+            s.close()
+        return results, queued
+
+    results, queued = asyncio.run(scenario())
+    assert results == [True, True, True]
+    assert queued[0]["message_type"] == "DEFENSE_ANNOUNCE"
+
+
+def test_async_close_fails_in_flight_and_backlogged_sends():
+    async def scenario():
+        parser = MessageParser()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(("127.0.0.1", 0))
+        reliable = await AsyncReliableUDP.create(sock, parser, window_size=1, timeout=5)
+        big = {"message_type": "CHAT_MESSAGE", "blob": "x" * 3000}   # fragmented
+        futures = [reliable.send({"message_type": "CHAT_MESSAGE", "n": n}, silent.getsockname())
+                   for n in range(3)] + [reliable.send(big, silent.getsockname())]
+        assert reliable.pending_count() > 1
+        reliable.close()
+        results = await asyncio.wait_for(asyncio.gather(*futures), timeout=1)
+        silent.close()
+        return results, reliable.pending_count()
+
+    results, pending = asyncio.run(scenario())
+    assert results == [False] * 4 and pending == 0
+
+
+def test_ack_state_cumulative_and_sack():
+    state = AckState()
+    for seq in (1, 2, 4, 6):
+        assert state.record(seq)
+    fields = state.fields()
+    assert fields["ack"] == 6 and fields["ack_cum"] == 2
+    assert [s for s in range(1, 8) if acked_by(s, fields)] == [1, 2, 4, 6]
+
+    state.record(3)
+    assert state.fields()["ack_cum"] == 4
+
+
+def test_acks_are_coalesced_and_piggybacked():
+    a, b = make_pair(ack_delay=0.05, ack_every=100)
+    a_addr, b_addr = a.sock.getsockname(), b.sock.getsockname()
+
+    futures = [a.send({"message_type": "CHAT_MESSAGE", "n": i}, b_addr) for i in range(5)]
+    for _ in range(5):
+        msg, addr = b.recv(timeout=1)
+        b.send_ack(addr, msg["sequence_number"])
+    # B answers with data of its own before the ACK delay runs out
+    reply = b.send({"message_type": "DEFENSE_ANNOUNCE"}, a_addr)
+
+    msg, addr = a.recv(timeout=1)
+    assert all(f.done() and f.result() for f in futures)
+    assert "ack" not in msg                   # ACK fields are stripped before delivery
+    a.send_ack(addr, msg["sequence_number"])
+    a.flush_acks()
+    while not reply.done():
+        b.poll(0.1)
+
+    stats = b.session_stats()
+    assert stats["acks_requested"] == 5
+    assert stats["ack_datagrams"] == 0
+    assert stats["acks_piggybacked"] == 1
+    assert stats["ack_datagrams_saved"] == 5
+
+
+def test_acks_are_not_held_by_backlogged_messages():
+    a, b = make_pair(ack_delay=0.05, ack_every=100, window_size=1)
+    b_addr = b.sock.getsockname()
+
+    first = a.send({"message_type": "CHAT_MESSAGE", "n": 0}, b_addr)
+    a.send_ack(b_addr, 7)
+    a.send({"message_type": "CHAT_MESSAGE", "n": 1}, b_addr)          # backlogged behind the first
+    a.send({"message_type": "CHAT_MESSAGE", "text": "x" * 3000}, b_addr)
+    assert a._acks[b_addr].pending == 1
+    assert a.session_stats()["acks_piggybacked"] == 0
+
+    a.poll(0.1)                                   # ack_delay runs out: a pure ACK goes now
+    assert a.session_stats()["ack_datagrams"] == 1
+    msg, _ = b.recv(timeout=1)
+    assert msg["n"] == 0 and not first.done()
+
+
+def test_small_messages_share_one_datagram():
+    a, b = make_pair(bundle_delay=0.05)
+    b_addr = b.sock.getsockname()
+
+    for i in range(5):
+        a.send_unreliable({"message_type": "CHAT_MESSAGE", "n": i}, b_addr)
+    assert a.session_stats()["datagrams_sent"] == 0        # waiting for the flush deadline
+    a.send_unreliable({"message_type": "ATTACK_ANNOUNCE"}, b_addr, urgent=True)
+
+    stats = a.session_stats()
+    assert stats["datagrams_sent"] == 1
+    assert stats["messages_bundled"] == 6
+
+    got = [b.recv(timeout=1)[0]["message_type"] for _ in range(6)]
+    assert got == ["CHAT_MESSAGE"] * 5 + ["ATTACK_ANNOUNCE"]
+
+    # without an urgent message the deadline flushes the bundle
+    a.send_unreliable({"message_type": "CHAT_MESSAGE"}, b_addr)
+    a.poll(0.2)
+    assert a.session_stats()["datagrams_sent"] == 2
+
+
+def test_nested_bundles_are_rejected_not_recursed():
+    a, b = make_pair()
+    parser = MessageParser()
+
+    def bundle(*parts):
+        return bundling.PREFIXED_MAGIC + b"".join(struct.pack("!H", len(p)) + p for p in parts)
+
+    nested = parser.encode_bytes({"message_type": "CHAT_MESSAGE", "n": 1})
+    for _ in range(1500):   # deeper than the recursion limit
+        nested = bundle(nested)
+    plain = parser.encode_bytes({"message_type": "CHAT_MESSAGE", "n": 2})
+    b._handle_datagram(bundle(nested, plain), a.sock.getsockname())
+
+    msg, _ = b.recv(timeout=1)
+    assert msg["n"] == 2                          # the rest of the bundle still gets through
+    assert b.recv(timeout=0.05) is None
+    assert b.session_stats()["rx_rejected"] == 1
+
+
+def test_receive_path_reuses_pooled_buffers():
+    a, b = make_pair(bundle_delay=0.05)
+    b_addr = b.sock.getsockname()
+    encoded = len(MessageParser().encode_message({"message_type": "CHAT_MESSAGE", "n": 0}))
+
+    for i in range(5):
+        a.send_unreliable({"message_type": "CHAT_MESSAGE", "n": i}, b_addr)
+    a.flush()
+    assert [b.recv(timeout=1)[0]["n"] for _ in range(5)] == list(range(5))
+
+    stats = b.session_stats()
+    assert stats["rx_messages"] == 5
+    assert stats["rx_buffer_misses"] == 0
+    # only the decoded text is allocated, not a 64 KiB buffer per datagram
+    assert stats["rx_bytes_per_message"] == encoded
+
+
+def test_async_recv_into_transport():
+    async def scenario():
+        parser = MessageParser()
+        socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+        for s in socks:
+            s.bind(("127.0.0.1", 0))
+        a = await AsyncReliableUDP.create(socks[0], parser, recv_into=True)
+        b = await AsyncReliableUDP.create(socks[1], parser, recv_into=True)
+        b_addr = socks[1].getsockname()
+
+        sent = a.send({"message_type": "CHAT_MESSAGE", "text": "x" * 3000}, b_addr)
+        msg, addr = await b.recv(timeout=2)
+        b.send_ack(addr, msg["sequence_number"])
+        b.flush_acks()
+        ok = await asyncio.wait_for(sent, 2)
+        stats = b.session_stats()
+        a.close()
+        b.close()
+        return ok, msg, stats
+
+    ok, msg, stats = asyncio.run(scenario())
+    assert ok and msg["text"] == "x" * 3000
+    assert stats["rx_buffer_misses"] == 0